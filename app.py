@@ -1,13 +1,14 @@
 import os
 import logging
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, flash, redirect, url_for
+from flask import Flask, render_template, request, flash, redirect, url_for, jsonify, session, Response, stream_with_context
+from markupsafe import Markup
 
 # Load environment variables
 load_dotenv()
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
-from datetime import datetime
+from datetime import datetime, timedelta
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -18,6 +19,8 @@ app = Flask(__name__)
 
 # Configure app
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "dev_key_123")
+# Mood history is keyed by an anonymous id in the session cookie; keep it around
+app.config["PERMANENT_SESSION_LIFETIME"] = timedelta(days=int(os.environ.get("SESSION_LIFETIME_DAYS", "365")))
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///skincare.db")
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
@@ -39,6 +42,28 @@ with app.app_context():
 
     db.create_all()
 
+    # Bring databases created by older versions up to date
+    from migrations import run_migrations
+    run_migrations()
+
+# Pick up edits to data/rules.json without a restart
+from rules import start_rules_watcher
+start_rules_watcher()
+
+# Keep live weather for the quiz cities warm in the background
+from weather_prefetch import start_prefetcher
+start_prefetcher()
+
+# Fill in the weather of logged moods off the request path
+from mood_enrichment import start_enricher
+start_enricher()
+
+# Build the in-memory product index if recommendations are served from it
+from product_index import PRODUCT_INDEX_ENABLED, product_index
+if PRODUCT_INDEX_ENABLED:
+    with app.app_context():
+        product_index.rebuild()
+
 
 @app.route("/", methods=["GET"])
 def index():
@@ -46,6 +71,35 @@ def index():
     return render_template("index.html")
 
 
+@app.route("/stats/weather", methods=["GET"])
+def weather_stats():
+    """Weather cache counters, circuit breaker state, prefetch snapshot ages and mood enrichment backlog"""
+    from weather import get_cache_stats, get_coalescing_stats, get_upstream_stats
+    from weather_prefetch import get_prefetch_stats
+    from mood_enrichment import get_enrichment_stats
+    return jsonify(
+        cache=get_cache_stats(),
+        upstream=get_upstream_stats(),
+        coalescing=get_coalescing_stats(),
+        prefetch=get_prefetch_stats(),
+        mood_enrichment=get_enrichment_stats()
+    )
+
+
+@app.route("/stats/quiz", methods=["GET"])
+def quiz_stats():
+    """Rendered quiz result cache counters"""
+    from result_cache import get_quiz_cache_stats
+    return jsonify(get_quiz_cache_stats())
+
+
+@app.route("/stats/products", methods=["GET"])
+def product_stats():
+    """Product index size, token counts and update counters"""
+    from product_index import get_product_index_stats
+    return jsonify(get_product_index_stats())
+
+
 @app.route("/quiz", methods=["GET"])
 def quiz():
     """Baumann skin type quiz with Turkish city selection"""
@@ -63,7 +117,9 @@ def quiz_result():
         WeatherData,
         TURKISH_CITIES
     )
-    from weather import get_weather_data
+    from weather_prefetch import get_city_weather
+    from climate import get_climate_weather
+    from result_cache import READINGS_SLOT, cache_version, quiz_result_cache, quiz_result_key
     
     try:
         # Collect quiz answers
@@ -75,42 +131,21 @@ def quiz_result():
         
         # Get selected city
         city = request.form.get("city", "istanbul")
-        city_data = TURKISH_CITIES.get(city, TURKISH_CITIES["istanbul"])
-        
-        # Calculate base Baumann score
-        base_score = calculate_baumann_from_quiz(answers)
+        if city not in TURKISH_CITIES:
+            city = "istanbul"
+        city_data = TURKISH_CITIES[city]
         
-        # Try to get LIVE weather data using city coordinates
-        weather_data = None
+        # Read LIVE weather from the prefetched snapshot (never blocks on the network)
         is_live = False
+        weather_data = get_city_weather(city)
+        if weather_data:
+            is_live = True
+            logger.info(f"Got live weather for {city_data['name']}: {weather_data}")
         
-        # Use city coordinates for weather
-        lat = city_data.get("lat")
-        lon = city_data.get("lon")
-        
-        if lat and lon:
-            weather_data = get_weather_data(lat, lon)
-            if weather_data:
-                is_live = True
-                logger.info(f"Got live weather for {city_data['name']}: {weather_data}")
-        
-        # If no live weather, use city seasonal defaults
+        # If no fresh snapshot, use the city's monthly climate normals
         if not weather_data:
-            import datetime
-            month = datetime.datetime.now().month
-            is_summer = month in [5, 6, 7, 8, 9]  # May-September
-            
-            weather_data = {
-                "temperature": city_data.get("avg_temp_summer" if is_summer else "avg_temp_winter", 20),
-                "humidity": city_data.get("avg_humidity", 60),
-                "uv_index": 7 if is_summer else 3,
-                "description": "Tahmini (ortalama)" if not is_live else "",
-                "location": {"city": city_data["name"], "region": "", "country": "Türkiye"}
-            }
-            logger.info(f"Using default weather for {city_data['name']}: {weather_data}")
-        
-        # Add live indicator to weather data
-        weather_data["is_live"] = is_live
+            weather_data = get_climate_weather(city)
+            logger.info(f"Using climate normals for {city_data['name']}: {dict(weather_data)}")
         
         # Create WeatherData object
         weather = WeatherData(
@@ -120,20 +155,36 @@ def quiz_result():
             city=city
         )
         
-        # Apply weather modifier to get adjusted score
-        adjusted_score = apply_weather_modifier(base_score, weather)
-        
-        # Get skincare priorities
-        priorities = get_skincare_priorities(adjusted_score, weather)
+        # Pages are cached per weather band; only the readings are rendered per request.
+        # Skip the cache while flash messages are pending, since base.html renders them.
+        readings = render_template("_weather_readings.html", weather=weather_data)
+        use_cache = not session.get("_flashes")
+        key = quiz_result_key(answers, city, weather, is_live)
+        version = cache_version()
+        page = quiz_result_cache.get(key, version) if use_cache else None
+        if page is None:
+            # Calculate base Baumann score
+            base_score = calculate_baumann_from_quiz(answers)
+            
+            # Apply weather modifier to get adjusted score
+            adjusted_score = apply_weather_modifier(base_score, weather)
+            
+            # Get skincare priorities
+            priorities = get_skincare_priorities(adjusted_score, weather)
+            
+            page = render_template("quiz_result.html",
+                base_score=base_score,
+                adjusted_score=adjusted_score,
+                weather=weather_data,
+                weather_readings=Markup(READINGS_SLOT),
+                city=city_data,
+                priorities=priorities,
+                is_live_weather=is_live
+            )
+            if use_cache:
+                quiz_result_cache.put(key, version, page)
         
-        return render_template("quiz_result.html",
-            base_score=base_score,
-            adjusted_score=adjusted_score,
-            weather=weather_data,
-            city=city_data,
-            priorities=priorities,
-            is_live_weather=is_live
-        )
+        return page.replace(READINGS_SLOT, readings, 1)
         
     except Exception as e:
         logger.error(f"Quiz error: {str(e)}", exc_info=True)
@@ -161,10 +212,10 @@ def recommend():
             flash("Please fill in all required fields", "error")
             return redirect(url_for("index"))
 
-        # Get weather data
-        from weather import get_weather_data
+        # Get weather data for the nearest reference point (climate normals if upstream is unavailable)
+        from geoindex import get_local_weather, snap_coordinates
         logger.debug("Fetching weather data")
-        weather_data = get_weather_data(latitude, longitude)
+        weather_data, is_live = get_local_weather(latitude, longitude, use_normals=True)
         if not weather_data:
             logger.error("Failed to fetch weather data")
             flash("Unable to fetch weather data. Please try again.", "error")
@@ -178,30 +229,137 @@ def recommend():
         routine = generate_routine(skin_type, sensitivity, concerns, weather_data)
         logger.debug(f"Generated routine: {routine}")
 
-        # Get product recommendations for each step in routine
-        from recommendations import get_product_recommendations
-        product_recommendations = {}
-        for step in routine:
-            category = step["step"].lower()
-            products = get_product_recommendations(
-                skin_type=skin_type,
-                concerns=concerns,
-                weather_data=weather_data,
-                category=category
-            )
-            product_recommendations[category] = products
+        # Plan the evening from today's hourly forecast (fetched once per day)
+        from weather import get_hourly_forecast
+        from skincare import generate_day_routines, EVENING_HOUR
+        forecast = get_hourly_forecast(*snap_coordinates(latitude, longitude)) if is_live else None
+        evening_routine = None
+        evening_weather = None
+        if forecast is not None:
+            evening_routine = generate_day_routines(skin_type, sensitivity, concerns, forecast)["pm"]
+            evening_weather = forecast.at_hour(EVENING_HOUR)
+
+        # Get the best-ranked products for every step in one query
+        from recommendations import get_ranked_recommendations_by_category
+        categories = list(dict.fromkeys(step["step"].lower() for step in routine + (evening_routine or [])))
+        product_recommendations = get_ranked_recommendations_by_category(
+            skin_type=skin_type,
+            concerns=concerns,
+            weather_data=weather_data,
+            categories=categories
+        )
 
         return render_template("results.html",
                             routine=routine,
                             weather=weather_data,
                             skin_type=skin_type,
-                            product_recommendations=product_recommendations)
+                            product_recommendations=product_recommendations,
+                            evening_routine=evening_routine,
+                            evening_weather=evening_weather)
 
     except Exception as e:
         logger.error(f"Error generating recommendation: {str(e)}", exc_info=True)
         flash("An error occurred. Please try again.", "error")
         return redirect(url_for("index"))
 
+@app.route("/api/recommendations", methods=["GET"])
+def api_recommendations():
+    """
+    Ranked product recommendations, one page at a time.
+
+    Query parameters: skin_type (required), concerns (repeatable), category,
+    latitude/longitude (weather fit), oily/sensitive/pigmented/wrinkle
+    (Baumann axis fit, all four), limit and cursor (from the previous page).
+    """
+    from baumann import BaumannScore
+    from recommendations import get_ranked_recommendations
+
+    skin_type = request.args.get("skin_type")
+    if not skin_type:
+        return jsonify(error="skin_type is required"), 400
+
+    try:
+        limit = int(request.args.get("limit", 10))
+        axes = [request.args.get(axis) for axis in ("oily", "sensitive", "pigmented", "wrinkle")]
+        baumann_score = BaumannScore(*map(int, axes)) if all(axes) else None
+    except ValueError:
+        return jsonify(error="limit and Baumann scores must be integers"), 400
+
+    weather_data = None
+    latitude = request.args.get("latitude")
+    longitude = request.args.get("longitude")
+    if latitude and longitude:
+        from geoindex import get_local_weather
+        weather_data, _ = get_local_weather(latitude, longitude, use_normals=True)
+
+    try:
+        page = get_ranked_recommendations(
+            skin_type=skin_type,
+            concerns=request.args.getlist("concerns"),
+            weather_data=weather_data,
+            category=request.args.get("category"),
+            baumann_score=baumann_score,
+            limit=limit,
+            cursor=request.args.get("cursor"),
+            with_attributes=True
+        )
+    except ValueError:
+        return jsonify(error="invalid cursor"), 400
+
+    return jsonify(
+        products=[dict(product.to_dict(), score=score) for product, score in page.items],
+        next_cursor=page.next_cursor
+    )
+
+
+@app.route("/api/products/search", methods=["GET"])
+def api_product_search():
+    """
+    Full-text product search, e.g. ?include=niacinamide&exclude=fragrance
+
+    include: terms that must all appear in the name, ingredients or description
+    exclude: terms that must not appear in the ingredients
+    Both are repeatable or comma-separated; each item matches as a phrase
+    ("salicylic acid") and a trailing * matches a prefix.
+    """
+    from search import search_products
+
+    include = request.args.getlist("include")
+    exclude = request.args.getlist("exclude")
+    if not include and not exclude:
+        return jsonify(error="include or exclude is required"), 400
+    try:
+        limit = int(request.args.get("limit", 20))
+    except ValueError:
+        return jsonify(error="limit must be an integer"), 400
+
+    results = search_products(include, exclude, category=request.args.get("category"), limit=limit)
+    return jsonify(products=[dict(product.to_dict(), rank=round(rank, 4)) for product, rank in results])
+
+
+@app.route("/api/routine/validate", methods=["POST"])
+def api_validate_routine():
+    """
+    Ingredient conflicts in a routine, e.g. {"product_ids": [3, 7, 12]}
+    or {"ingredients": ["Retinol, Squalane", "Glycolic Acid 7%"]} for
+    products that are not in the catalog
+    """
+    from ingredients import validate_ingredient_lists, validate_products
+
+    payload = request.get_json(silent=True) or {}
+    product_ids = payload.get("product_ids")
+    ingredient_lists = payload.get("ingredients")
+    if product_ids is not None:
+        if not isinstance(product_ids, list) or not all(isinstance(pid, int) for pid in product_ids):
+            return jsonify(error="product_ids must be a list of integers"), 400
+        return jsonify(validate_products(product_ids))
+    if ingredient_lists is not None:
+        if not isinstance(ingredient_lists, list) or not all(isinstance(text, str) for text in ingredient_lists):
+            return jsonify(error="ingredients must be a list of strings"), 400
+        return jsonify(validate_ingredient_lists(ingredient_lists))
+    return jsonify(error="product_ids or ingredients is required"), 400
+
+
 @app.route("/routine-builder")
 def routine_builder():
     """Drag and drop routine builder (TODO: implement)"""
@@ -211,9 +369,120 @@ def routine_builder():
 @app.route("/mood-tracker")
 def mood_tracker():
     logger.debug("Accessing mood tracker page")
-    from models import SkinMoodEntry
-    mood_entries = SkinMoodEntry.query.order_by(SkinMoodEntry.date.desc()).limit(7).all()
-    return render_template("mood_tracker.html", mood_entries=mood_entries)
+    from mood import current_user_id, get_mood_page
+    cursor = request.args.get("cursor")
+    try:
+        page = get_mood_page(current_user_id(), cursor=cursor)
+    except ValueError:
+        return redirect(url_for("mood_tracker"))
+    return render_template(
+        "mood_tracker.html",
+        mood_entries=page.entries,
+        next_cursor=page.next_cursor,
+        is_older_page=bool(cursor)
+    )
+
+@app.route("/api/mood/trends", methods=["GET"])
+def api_mood_trends():
+    """
+    Mood counts per day and per weather band from the rollups, e.g. ?days=30
+
+    scope: "me" (default) for the current browser's entries, "all" for everyone
+    """
+    from mood import current_user_id
+    from mood_rollups import get_mood_trends
+
+    scope = request.args.get("scope", "me")
+    if scope not in ("me", "all"):
+        return jsonify(error="scope must be 'me' or 'all'"), 400
+    try:
+        days = int(request.args.get("days", 90))
+    except ValueError:
+        return jsonify(error="days must be an integer"), 400
+
+    user_id = current_user_id() if scope == "me" else None
+    return jsonify(get_mood_trends(user_id=user_id, days=days))
+
+@app.route("/api/mood/insights", methods=["GET"])
+def api_mood_insights():
+    """
+    Weather vs mood analytics: per-mood humidity/temperature distributions,
+    correlations and threshold effects ("irritated 2.1x as often below 40% humidity")
+
+    scope: "me" (default) for the current browser's entries, "all" for everyone
+    (computed by the nightly batch only; "computed": false until its first run)
+    """
+    from mood import current_user_id
+    from mood_analytics import COHORT_KEY, get_analytics
+
+    scope = request.args.get("scope", "me")
+    if scope not in ("me", "all"):
+        return jsonify(error="scope must be 'me' or 'all'"), 400
+
+    return jsonify(get_analytics(current_user_id() if scope == "me" else COHORT_KEY))
+
+@app.route("/api/mood/entries", methods=["POST"])
+def api_ingest_mood_entries():
+    """
+    Bulk upload of mood entries for the current browser, e.g. from an offline client:
+    {"entries": [{"mood": "dry", "date": "2024-05-01", "created_at": "2024-05-01T08:30:00",
+                  "notes": "...", "latitude": 41.0, "longitude": 29.0}, ...]}
+
+    Entries may carry the weather they were logged in ("weather_temp" in °C,
+    "weather_humidity" in %). Coordinates only get the current weather
+    looked up for entries logged just now, never for backdated ones.
+    Entries are all written or, if any is invalid, none are.
+    """
+    from mood import current_user_id
+    from mood_enrichment import enricher
+    from mood_ingest import MOOD_INGEST_MAX_ENTRIES, ingest_entries
+
+    payload = request.get_json(silent=True) or {}
+    entries = payload.get("entries")
+    if not isinstance(entries, list) or not entries:
+        return jsonify(error="entries must be a non-empty list"), 400
+    if len(entries) > MOOD_INGEST_MAX_ENTRIES:
+        return jsonify(error=f"at most {MOOD_INGEST_MAX_ENTRIES} entries per request"), 400
+
+    result = ingest_entries(current_user_id(), entries)
+    if result.errors:
+        return jsonify(error="invalid entries", entries=result.errors), 400
+    enricher.notify()
+    return jsonify(inserted=len(result.ids), ids=result.ids), 201
+
+@app.route("/api/mood/export", methods=["GET"])
+def api_export_mood_history():
+    """
+    Download mood history as it is written, e.g. ?format=ndjson
+
+    format: "csv" (default) or "ndjson"
+    scope: "me" (default) for the current browser's entries, "all" for
+    every entry, which needs an "Authorization: Bearer <MOOD_EXPORT_TOKEN>" header
+    """
+    import hmac
+    from mood import current_user_id
+    from mood_export import EXPORT_FORMATS, MOOD_EXPORT_TOKEN, export_chunks
+
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify(error="format must be 'csv' or 'ndjson'"), 400
+    scope = request.args.get("scope", "me")
+    if scope not in ("me", "all"):
+        return jsonify(error="scope must be 'me' or 'all'"), 400
+
+    if scope == "all":
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not MOOD_EXPORT_TOKEN or not hmac.compare_digest(supplied, MOOD_EXPORT_TOKEN):
+            return jsonify(error="exporting every entry needs the export token"), 403
+        user_id = None
+    else:
+        user_id = current_user_id()
+
+    return Response(
+        stream_with_context(export_chunks(fmt, user_id)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename=mood-history.{fmt}"}
+    )
 
 @app.route("/log-mood", methods=["POST"])
 def log_mood():
@@ -229,25 +498,27 @@ def log_mood():
             flash("Please select a mood", "error")
             return redirect(url_for("mood_tracker"))
 
-        # Get current weather for the entry
-        latitude = request.form.get("latitude")
-        longitude = request.form.get("longitude")
-        from weather import get_weather_data
-        weather_data = get_weather_data(latitude, longitude) if latitude and longitude else None
-
-        # Create new mood entry
-        from models import SkinMoodEntry
-        entry = SkinMoodEntry(
-            mood=mood,
-            notes=notes,
-            weather_temp=weather_data["temperature"] if weather_data else None,
-            weather_humidity=weather_data["humidity"] if weather_data else None
-        )
+        # Same checks as the JSON API, so a bad form can't fail a shared group commit
+        from mood import current_user_id
+        from mood_enrichment import enricher
+        from mood_ingest import parse_entry, write_entry
+        row, error = parse_entry({
+            "mood": mood,
+            "notes": notes,
+            "latitude": request.form.get("latitude") or None,
+            "longitude": request.form.get("longitude") or None,
+        }, current_user_id())
+        if error:
+            logger.warning(f"Invalid mood form submission: {error}")
+            flash(f"Could not log your mood: {error}", "error")
+            return redirect(url_for("mood_tracker"))
 
-        db.session.add(entry)
-        db.session.commit()
+        # Create new mood entry with its rollup counts; its weather is filled in by the background enricher
+        entry_id = write_entry(row)
+        if row["latitude"] is not None:
+            enricher.notify()
 
-        logger.debug(f"Successfully logged mood entry: {entry.to_dict()}")
+        logger.debug(f"Successfully logged mood entry {entry_id}")
         flash("Successfully logged your skin mood!", "success")
 
     except Exception as e:
@@ -11,11 +11,15 @@ Weather modifiers adjust the effective skin behavior based on:
 - Humidity (low = skin acts drier, high = skin acts oilier)
 - Temperature (cold = more sensitive, hot = more oily)
 - UV Index (high = more pigmentation risk)
+
+The thresholds themselves live in data/rules.json (see rules.py).
 """
 
-from typing import Dict, Tuple, Optional
+from typing import Dict, List, Mapping, Tuple, Optional
 from dataclasses import dataclass
 
+from rules import get_rules
+
 # Turkish city climate profiles with coordinates for live weather
 TURKISH_CITIES = {
     "ankara": {
@@ -178,56 +182,27 @@ class WeatherData:
     city: Optional[str] = None
     
 
-def calculate_weather_modifier(weather: WeatherData) -> Dict[str, int]:
+def weather_bands(weather: WeatherData) -> Tuple[int, int, int]:
+    """(humidity band, temperature band, UV band) identifying every weather-dependent rule outcome"""
+    return get_rules().weather_band(weather.humidity, weather.temperature, weather.uv_index)
+
+
+def lookup_weather_modifier(weather: WeatherData) -> Tuple[int, int, int, int]:
+    """Axis modifiers in AXES order, read from the compiled modifier table"""
+    return get_rules().weather_modifier(weather.humidity, weather.temperature, weather.uv_index)
+
+
+def calculate_weather_modifier(weather: WeatherData) -> Mapping[str, int]:
     """
     Calculate how weather shifts each Baumann axis.
-    Returns modifier values (-30 to +30) for each axis.
+    Returns modifier values (-30 to +30) for each axis as a shared read-only mapping.
     """
-    modifiers = {
-        "oily": 0,
-        "sensitive": 0,
-        "pigmented": 0,
-        "wrinkle": 0
-    }
-    
-    # HUMIDITY affects oiliness
-    # Low humidity (<40%) = skin acts drier (-20)
-    # High humidity (>70%) = skin acts oilier (+20)
-    if weather.humidity < 30:
-        modifiers["oily"] = -25
-    elif weather.humidity < 40:
-        modifiers["oily"] = -15
-    elif weather.humidity > 80:
-        modifiers["oily"] = +20
-    elif weather.humidity > 70:
-        modifiers["oily"] = +10
-    
-    # TEMPERATURE affects sensitivity and oiliness
-    # Cold (<10°C) = more sensitive, less oily
-    # Hot (>30°C) = more oily, more sensitive (heat rash)
-    if weather.temperature < 5:
-        modifiers["sensitive"] += 15
-        modifiers["oily"] -= 10
-    elif weather.temperature < 10:
-        modifiers["sensitive"] += 10
-        modifiers["oily"] -= 5
-    elif weather.temperature > 35:
-        modifiers["oily"] += 15
-        modifiers["sensitive"] += 10
-    elif weather.temperature > 30:
-        modifiers["oily"] += 10
-        modifiers["sensitive"] += 5
-    
-    # UV INDEX affects pigmentation risk
-    # High UV = increased pigmentation risk
-    if weather.uv_index >= 8:
-        modifiers["pigmented"] = +25
-    elif weather.uv_index >= 6:
-        modifiers["pigmented"] = +15
-    elif weather.uv_index >= 3:
-        modifiers["pigmented"] = +5
-    
-    return modifiers
+    return get_rules().weather_modifier_map(weather.humidity, weather.temperature, weather.uv_index)
+
+
+def dump_modifier_table() -> List[Dict]:
+    """Every weather band triple with its modifiers, for auditing"""
+    return get_rules().dump_modifier_table()
 
 
 def apply_weather_modifier(base_score: BaumannScore, weather: WeatherData) -> BaumannScore:
@@ -235,14 +210,14 @@ def apply_weather_modifier(base_score: BaumannScore, weather: WeatherData) -> Ba
     Apply weather modifiers to get the EFFECTIVE skin type.
     This is what your skin ACTS like in current conditions.
     """
-    modifiers = calculate_weather_modifier(weather)
+    oily, sensitive, pigmented, wrinkle = lookup_weather_modifier(weather)
     
     # Apply modifiers and clamp to 0-100
     adjusted = BaumannScore(
-        oily=max(0, min(100, base_score.oily + modifiers["oily"])),
-        sensitive=max(0, min(100, base_score.sensitive + modifiers["sensitive"])),
-        pigmented=max(0, min(100, base_score.pigmented + modifiers["pigmented"])),
-        wrinkle=base_score.wrinkle + modifiers["wrinkle"]  # wrinkle less affected by weather
+        oily=max(0, min(100, base_score.oily + oily)),
+        sensitive=max(0, min(100, base_score.sensitive + sensitive)),
+        pigmented=max(0, min(100, base_score.pigmented + pigmented)),
+        wrinkle=base_score.wrinkle + wrinkle  # wrinkle less affected by weather
     )
     
     return adjusted
@@ -359,59 +334,19 @@ def calculate_baumann_from_quiz(answers: Dict[int, int]) -> BaumannScore:
 def get_skincare_priorities(adjusted_score: BaumannScore, weather: WeatherData) -> list:
     """
     Get prioritized skincare concerns based on adjusted skin type.
+    Results are shared read-only mappings from the compiled rules.
     """
-    priorities = []
-    
-    # Oily/Dry axis
-    if adjusted_score.oily >= 70:
-        priorities.append({
-            "concern": "excess_oil",
-            "priority": "high",
-            "recommendation_tr": "Yağ kontrolü ve gözenek temizliği öncelikli",
-            "recommendation_en": "Focus on oil control and pore cleansing"
-        })
-    elif adjusted_score.oily <= 30:
-        priorities.append({
-            "concern": "dryness",
-            "priority": "high", 
-            "recommendation_tr": "Yoğun nemlendirme ve bariyer onarımı",
-            "recommendation_en": "Intense hydration and barrier repair"
-        })
-    
-    # Sensitivity
-    if adjusted_score.sensitive >= 70:
-        priorities.append({
-            "concern": "sensitivity",
-            "priority": "high",
-            "recommendation_tr": "Yatıştırıcı ve parfümsüz ürünler kullanın",
-            "recommendation_en": "Use soothing, fragrance-free products"
-        })
-    
-    # Pigmentation (especially if high UV)
-    if adjusted_score.pigmented >= 60 or weather.uv_index >= 5:
-        priorities.append({
-            "concern": "pigmentation",
-            "priority": "high" if weather.uv_index >= 6 else "medium",
-            "recommendation_tr": "Güneş koruması ve leke karşıtı aktifler",
-            "recommendation_en": "Sun protection and anti-spot actives"
-        })
-    
-    # Wrinkle
-    if adjusted_score.wrinkle >= 60:
-        priorities.append({
-            "concern": "aging",
-            "priority": "medium",
-            "recommendation_tr": "Anti-aging aktifler ve antioksidanlar",
-            "recommendation_en": "Anti-aging actives and antioxidants"
-        })
-    
-    # Weather-specific
-    if weather.humidity < 40:
-        priorities.append({
-            "concern": "dehydration",
-            "priority": "high",
-            "recommendation_tr": "Hava çok kuru - ekstra nemlendirme gerekli",
-            "recommendation_en": "Air is very dry - extra hydration needed"
-        })
-    
-    return priorities
+    return get_rules().priorities(
+        adjusted_score.oily, adjusted_score.sensitive, adjusted_score.pigmented, adjusted_score.wrinkle,
+        weather.humidity, weather.temperature, weather.uv_index
+    )
+
+
+if __name__ == "__main__":
+    import csv
+    import sys
+
+    rows = dump_modifier_table()
+    writer = csv.DictWriter(sys.stdout, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
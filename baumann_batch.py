@@ -0,0 +1,202 @@
+"""
+Vectorized Baumann scoring for re-scoring many stored profiles at once.
+
+Mirrors the scalar functions in `baumann.py` over NumPy arrays:
+
+- `calculate_baumann_batch`   <- calculate_baumann_from_quiz
+- `calculate_weather_modifier_batch` <- calculate_weather_modifier
+- `apply_weather_modifier_batch`     <- apply_weather_modifier
+- `baumann_codes`             <- BaumannScore.get_code
+
+Score arrays have shape (..., 4) with columns in `AXES` order. Weather
+modifiers are read from the same compiled rules table as the scalar
+path, so results match the scalar functions exactly; run `python baumann_batch.py` to
+check that against random and threshold-boundary inputs.
+"""
+
+import time
+import random
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from rules import AXES, get_rules
+from baumann import (
+    BAUMANN_QUIZ,
+    BaumannScore,
+    WeatherData,
+    apply_weather_modifier,
+    calculate_baumann_from_quiz,
+    calculate_weather_modifier,
+)
+
+# Column j of an answers matrix holds the score for BAUMANN_QUIZ[j]
+QUESTION_IDS = tuple(q["id"] for q in BAUMANN_QUIZ)
+_AXIS_MASK = np.array(
+    [[q["axis"] == axis for axis in AXES] for q in BAUMANN_QUIZ],
+    dtype=np.float64,
+)  # (questions, axes)
+
+
+def answers_to_matrix(answers_list: Iterable[Dict[int, int]]) -> np.ndarray:
+    """Stack quiz answer dicts into an (n, questions) float array; NaN marks unanswered"""
+    rows = [[answers.get(q_id, np.nan) for q_id in QUESTION_IDS] for answers in answers_list]
+    return np.array(rows, dtype=np.float64).reshape(-1, len(QUESTION_IDS))
+
+
+def calculate_baumann_batch(answers: np.ndarray) -> np.ndarray:
+    """Base axis scores (n, 4) from an (n, questions) answers matrix"""
+    answers = np.asarray(answers, dtype=np.float64)
+    answered = ~np.isnan(answers)
+    totals = np.where(answered, answers, 0.0) @ _AXIS_MASK
+    counts = answered.astype(np.float64) @ _AXIS_MASK
+    with np.errstate(invalid="ignore", divide="ignore"):
+        averages = np.trunc(totals / counts)
+    return np.where(counts > 0, averages, 50).astype(np.int64)
+
+
+def _bands(values: np.ndarray, field_bands) -> np.ndarray:
+    """Vectorized FieldBands.band"""
+    lower = np.asarray(field_bands.lower, dtype=np.float64)
+    upper = np.asarray(field_bands.upper, dtype=np.float64)
+    return np.searchsorted(lower, values, side="right") + np.searchsorted(upper, values, side="left")
+
+
+def calculate_weather_modifier_batch(humidity, temperature, uv_index) -> np.ndarray:
+    """Axis modifiers (n, 4) for broadcastable humidity, temperature and UV arrays"""
+    humidity, temperature, uv_index = np.broadcast_arrays(
+        np.asarray(humidity, dtype=np.float64),
+        np.asarray(temperature, dtype=np.float64),
+        np.asarray(uv_index, dtype=np.float64),
+    )
+
+    rules = get_rules()
+    table = np.asarray(rules.modifier_table, dtype=np.int64)  # (humidity, temperature, uv, axes)
+    h, t, u = (_bands(values, bands) for values, bands in zip((humidity, temperature, uv_index), rules.weather_bands))
+    return table[h, t, u]
+
+
+def apply_weather_modifier_batch(base_scores: np.ndarray, modifiers: np.ndarray) -> np.ndarray:
+    """Adjusted scores; oily/sensitive/pigmented are clamped to 0-100, wrinkle is not"""
+    adjusted = np.asarray(base_scores, dtype=np.int64) + np.asarray(modifiers, dtype=np.int64)
+    adjusted[..., :3] = np.clip(adjusted[..., :3], 0, 100)
+    return adjusted
+
+
+def baumann_codes(scores: np.ndarray) -> np.ndarray:
+    """4-letter Baumann codes for a (..., 4) score array"""
+    scores = np.asarray(scores)
+    high = scores >= 50
+    code = np.where(high[..., 0], "O", "D")
+    code = np.char.add(code, np.where(high[..., 1], "S", "R"))
+    code = np.char.add(code, np.where(high[..., 2], "P", "N"))
+    return np.char.add(code, np.where(high[..., 3], "W", "T"))
+
+
+def score_batch(answers: np.ndarray, humidity, temperature, uv_index) -> Dict[str, np.ndarray]:
+    """
+    Score every profile against one weather reading per profile (or one shared reading).
+
+    Returns base and adjusted (n, 4) score arrays and their codes.
+    """
+    base = calculate_baumann_batch(answers)
+    modifiers = calculate_weather_modifier_batch(humidity, temperature, uv_index)
+    adjusted = apply_weather_modifier_batch(base, modifiers)
+    return {
+        "base_scores": base,
+        "adjusted_scores": adjusted,
+        "base_codes": baumann_codes(base),
+        "adjusted_codes": baumann_codes(adjusted),
+    }
+
+
+def score_against_cities(base_scores: np.ndarray, humidity, temperature, uv_index) -> np.ndarray:
+    """Adjusted scores (cities, n, 4) for n base profiles under each city's weather"""
+    modifiers = calculate_weather_modifier_batch(humidity, temperature, uv_index)
+    return apply_weather_modifier_batch(np.asarray(base_scores)[np.newaxis, :, :], modifiers[:, np.newaxis, :])
+
+
+def _scalar_reference(answers: Dict[int, int], weather: WeatherData) -> List:
+    base = calculate_baumann_from_quiz(answers)
+    modifiers = calculate_weather_modifier(weather)
+    adjusted = apply_weather_modifier(base, weather)
+
+    def as_row(score: BaumannScore) -> List[int]:
+        return [getattr(score, axis) for axis in AXES]
+
+    return [as_row(base), [modifiers[axis] for axis in AXES], as_row(adjusted), base.get_code(), adjusted.get_code()]
+
+
+def verify_equivalence(samples: int = 20000, seed: int = 7) -> int:
+    """Compare the batch functions with the scalar ones; returns the number of mismatches"""
+    rng = random.Random(seed)
+    # Values on and around every threshold, plus arbitrary ones
+    humidity_values = [0, 29, 29.5, 30, 39, 40, 70, 70.5, 71, 80, 81, 100]
+    temperature_values = [-15, 4.9, 5, 9.9, 10, 30, 30.1, 35, 35.1, 45]
+    uv_values = [0, 2.9, 3, 5.9, 6, 7.9, 8, 11]
+
+    answers_list, weather_list = [], []
+    for _ in range(samples):
+        answers = {}
+        for q in BAUMANN_QUIZ:
+            if rng.random() < 0.9:
+                answers[q["id"]] = rng.choice([a["score"] for a in q["answers"]] + [0, 100])
+        answers_list.append(answers)
+        weather_list.append(WeatherData(
+            humidity=rng.choice(humidity_values + [rng.uniform(0, 100)]),
+            temperature=rng.choice(temperature_values + [rng.uniform(-20, 45)]),
+            uv_index=rng.choice(uv_values + [rng.uniform(0, 12)]),
+        ))
+
+    matrix = answers_to_matrix(answers_list)
+    humidity = np.array([w.humidity for w in weather_list])
+    temperature = np.array([w.temperature for w in weather_list])
+    uv_index = np.array([w.uv_index for w in weather_list])
+    result = score_batch(matrix, humidity, temperature, uv_index)
+    modifiers = calculate_weather_modifier_batch(humidity, temperature, uv_index)
+
+    mismatches = 0
+    for i, (answers, weather) in enumerate(zip(answers_list, weather_list)):
+        base, mods, adjusted, base_code, adjusted_code = _scalar_reference(answers, weather)
+        if (
+            result["base_scores"][i].tolist() != base
+            or modifiers[i].tolist() != mods
+            or result["adjusted_scores"][i].tolist() != adjusted
+            or result["base_codes"][i] != base_code
+            or result["adjusted_codes"][i] != adjusted_code
+        ):
+            mismatches += 1
+    return mismatches
+
+
+def benchmark(profiles: int = 500000, seed: int = 7) -> Dict:
+    """Time a full re-score of `profiles` users against every quiz city"""
+    from baumann import TURKISH_CITIES
+
+    rng = np.random.default_rng(seed)
+    choices = [np.array([a["score"] for a in q["answers"]]) for q in BAUMANN_QUIZ]
+    answers = np.stack([rng.choice(c, size=profiles) for c in choices], axis=1).astype(np.float64)
+    cities = list(TURKISH_CITIES.values())
+
+    start = time.perf_counter()
+    base = calculate_baumann_batch(answers)
+    adjusted = score_against_cities(
+        base,
+        [c["avg_humidity"] for c in cities],
+        [c["avg_temp_summer"] for c in cities],
+        [7] * len(cities),
+    )
+    codes = baumann_codes(adjusted)
+    seconds = time.perf_counter() - start
+    return {
+        "profiles": profiles,
+        "cities": len(cities),
+        "seconds": round(seconds, 3),
+        "scores_per_second": int(profiles * len(cities) / seconds),
+        "shape": codes.shape,
+    }
+
+
+if __name__ == "__main__":
+    print(f"Equivalence mismatches: {verify_equivalence()}")
+    print(f"Benchmark: {benchmark()}")
@@ -0,0 +1,222 @@
+"""
+Streaming product catalog import from CSV or JSONL feeds.
+
+Rows are parsed lazily and upserted by product name, which is unique,
+in batches: one SELECT on the name index finds the existing names in a
+batch, new products go in with a single multi-row INSERT ... RETURNING,
+existing ones with one bulk UPDATE by primary key, and their attribute
+rows are replaced in bulk.
+Memory stays bounded by the batch size regardless of the feed size.
+
+    python catalog_import.py feed.csv [feed2.jsonl.gz ...] [--batch-size 5000] [--dry-run]
+
+Feed columns: name, category, skin_types, concerns, ingredients,
+description, weather_conditions. List fields may be comma-separated
+strings or (in JSONL) arrays.
+"""
+
+import os
+import io
+import csv
+import sys
+import gzip
+import json
+import time
+import logging
+import argparse
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "5000"))
+# Log progress every this many rows
+IMPORT_PROGRESS_EVERY = 100000
+
+PRODUCT_FIELDS = ("name", "category", "skin_types", "concerns", "ingredients", "description", "weather_conditions")
+LIST_FIELDS = ("skin_types", "concerns", "weather_conditions")
+# Limits of the Product string columns
+FIELD_LENGTHS = {"name": 100, "category": 50, "skin_types": 100, "concerns": 200, "weather_conditions": 100}
+
+
+class ImportStats(NamedTuple):
+    rows: int
+    inserted: int
+    updated: int
+    skipped: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> int:
+        return int(self.rows / self.seconds) if self.seconds > 0 else 0
+
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def iter_feed(path: str) -> Iterator[Dict]:
+    """Raw rows of a .csv or .jsonl/.ndjson feed (optionally .gz), one at a time"""
+    name = path[:-3] if path.endswith(".gz") else path
+    with _open_text(path) as f:
+        if name.endswith(".csv"):
+            yield from csv.DictReader(f)
+        elif name.endswith((".jsonl", ".ndjson")):
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    logger.warning(f"{path}:{line_number}: invalid JSON ({e.msg})")
+                    yield {}
+        else:
+            raise ValueError(f"Unsupported feed format: {path}")
+
+
+def normalize_row(raw: Dict) -> Optional[Dict]:
+    """Product column values from a feed row, or None if it lacks a name, category or skin types"""
+    row = {}
+    for field in PRODUCT_FIELDS:
+        value = raw.get(field)
+        if isinstance(value, (list, tuple)):
+            value = ",".join(str(v).strip() for v in value if str(v).strip())
+        elif value is not None:
+            value = str(value).strip()
+        if field in LIST_FIELDS and value:
+            value = ",".join(part.strip() for part in value.split(",") if part.strip())
+        if field in FIELD_LENGTHS and value:
+            value = value[:FIELD_LENGTHS[field]]
+        row[field] = value or None
+
+    if not row["name"] or not row["category"] or not row["skin_types"]:
+        return None
+    return row
+
+
+def _attribute_rows(product_id: int, row: Dict) -> List[Dict]:
+    from models import ATTRIBUTE_COLUMNS, split_attribute_values
+
+    return [
+        {"product_id": product_id, "kind": kind, "value": token, "position": position}
+        for column, kind in ATTRIBUTE_COLUMNS.items()
+        for position, token in enumerate(split_attribute_values(row[column]))
+    ]
+
+
+def _upsert_batch(connection, batch: Dict[str, Dict], update_existing: bool = True) -> Tuple[int, int]:
+    """Upsert one batch keyed by name (or only insert the new names); returns (inserted, updated)"""
+    from sqlalchemy import bindparam, select
+    from models import Product, ProductAttribute
+
+    # Core statements on the tables: the ORM bulk paths cost more than the database here
+    products = Product.__table__
+    attribute_table = ProductAttribute.__table__
+
+    existing = dict(connection.execute(
+        select(products.c.name, products.c.id).where(products.c.name.in_(list(batch)))
+    ).all())
+
+    attributes = []
+    new_rows = [row for name, row in batch.items() if name not in existing]
+    if new_rows:
+        now = datetime.utcnow()
+        inserted = connection.execute(
+            products.insert().returning(products.c.id, products.c.name),
+            [dict(row, created_at=now) for row in new_rows],
+        ).all()
+        for product_id, name in inserted:
+            attributes.extend(_attribute_rows(product_id, batch[name]))
+
+    if existing and update_existing:
+        connection.execute(
+            products.update().where(products.c.id == bindparam("product_id")).values(
+                {field: bindparam(field) for field in PRODUCT_FIELDS}
+            ),
+            [dict(batch[name], product_id=product_id) for name, product_id in existing.items()],
+        )
+        connection.execute(attribute_table.delete().where(attribute_table.c.product_id.in_(list(existing.values()))))
+        for name, product_id in existing.items():
+            attributes.extend(_attribute_rows(product_id, batch[name]))
+
+    if attributes:
+        connection.execute(attribute_table.insert(), attributes)
+    return len(new_rows), len(existing) if update_existing else 0
+
+
+def import_products(rows: Iterable[Dict], batch_size: int = IMPORT_BATCH_SIZE, dry_run: bool = False,
+                    update_existing: bool = True) -> ImportStats:
+    """
+    Upsert products by name from raw feed rows, committing every batch.
+    Later rows with the same name win; with update_existing=False products
+    that already exist are left as they are. A dry run only parses and
+    validates. Needs an app context.
+    """
+    from app import db
+    from ingredients import ingredient_cache
+    from product_index import product_index
+
+    start = time.perf_counter()
+    total = inserted = updated = skipped = 0
+    batch = {}
+
+    def flush():
+        nonlocal inserted, updated
+        if not batch:
+            return
+        if not dry_run:
+            new, changed = _upsert_batch(db.session.connection(), batch, update_existing)
+            db.session.commit()
+            inserted += new
+            updated += changed
+        batch.clear()
+
+    for raw in rows:
+        total += 1
+        row = normalize_row(raw)
+        if row is None:
+            skipped += 1
+        else:
+            batch[row["name"]] = row
+            if len(batch) >= batch_size:
+                flush()
+        if total % IMPORT_PROGRESS_EVERY == 0:
+            elapsed = time.perf_counter() - start
+            logger.info(f"Imported {total} rows ({int(total / elapsed)} rows/s)")
+    flush()
+
+    if not dry_run and (inserted or updated):
+        # Bulk statements bypass the ORM events that keep the in-memory caches current
+        product_index.invalidate()
+        ingredient_cache.invalidate()
+    return ImportStats(total, inserted, updated, skipped, time.perf_counter() - start)
+
+
+def import_feed(path: str, batch_size: int = IMPORT_BATCH_SIZE, dry_run: bool = False) -> ImportStats:
+    return import_products(iter_feed(path), batch_size=batch_size, dry_run=dry_run)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import products from CSV/JSONL feeds")
+    parser.add_argument("feeds", nargs="+", help=".csv, .jsonl or .ndjson files, optionally gzipped")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="parse and validate without writing")
+    args = parser.parse_args(argv)
+
+    from app import app
+
+    with app.app_context():
+        for path in args.feeds:
+            stats = import_feed(path, batch_size=args.batch_size, dry_run=args.dry_run)
+            print(
+                f"{path}: {stats.rows} rows, {stats.inserted} inserted, {stats.updated} updated, "
+                f"{stats.skipped} skipped in {stats.seconds:.1f}s ({stats.rows_per_second} rows/s)"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+Monthly climate normals for the quiz cities.
+
+The bundled table (data/climate_normals.csv) holds mean temperature,
+humidity and UV index per city and month. It is loaded once into
+contiguous arrays indexed by `city_index * 12 + (month - 1)`, and the
+fallback weather dict for every slot is built up front so a lookup is a
+single index with no per-request allocation.
+"""
+
+import os
+import csv
+import logging
+from array import array
+from datetime import datetime
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from baumann import TURKISH_CITIES
+
+logger = logging.getLogger(__name__)
+
+CLIMATE_NORMALS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "climate_normals.csv")
+
+MONTHS = 12
+
+
+class ClimateNormals:
+    """Per-city monthly normals held in flat arrays"""
+
+    def __init__(self, cities):
+        self.cities = tuple(cities)
+        self.city_index = {key: i for i, key in enumerate(self.cities)}
+        size = len(self.cities) * MONTHS
+        self.temperature = array("f", [0.0]) * size
+        self.humidity = array("B", [0]) * size
+        self.uv_index = array("f", [0.0]) * size
+        self.weather = ()
+
+    def slot(self, city: str, month: int) -> Optional[int]:
+        index = self.city_index.get(city)
+        if index is None or not 1 <= month <= MONTHS:
+            return None
+        return index * MONTHS + month - 1
+
+    def build_weather(self):
+        """Precompute the read-only fallback weather dict for every slot"""
+        weather = []
+        for i, key in enumerate(self.cities):
+            location = MappingProxyType({"city": TURKISH_CITIES[key]["name"], "region": "", "country": "Türkiye"})
+            for month in range(MONTHS):
+                slot = i * MONTHS + month
+                weather.append(MappingProxyType({
+                    "temperature": round(self.temperature[slot]),
+                    "humidity": self.humidity[slot],
+                    "uv_index": round(self.uv_index[slot], 1),
+                    "description": "Tahmini (ortalama)",
+                    "location": location,
+                }))
+        self.weather = tuple(weather)
+
+
+def load_climate_normals(path: str = CLIMATE_NORMALS_PATH) -> ClimateNormals:
+    """Load the normals table; cities missing from the file keep zeroed slots"""
+    normals = ClimateNormals(TURKISH_CITIES)
+    loaded = 0
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            slot = normals.slot(row["city"], int(row["month"]))
+            if slot is None:
+                logger.warning(f"Skipping unknown climate normal row: {row}")
+                continue
+            normals.temperature[slot] = float(row["temperature"])
+            normals.humidity[slot] = int(row["humidity"])
+            normals.uv_index[slot] = float(row["uv_index"])
+            loaded += 1
+
+    if loaded != len(normals.cities) * MONTHS:
+        logger.warning(f"Climate normals incomplete: {loaded} of {len(normals.cities) * MONTHS} rows loaded")
+
+    normals.build_weather()
+    return normals
+
+
+climate_normals = load_climate_normals()
+
+
+def get_climate_weather(city: str, month: int = None) -> Optional[Mapping]:
+    """Read-only normal weather for a city and month (default: current month)"""
+    slot = climate_normals.slot(city, month or datetime.now().month)
+    return climate_normals.weather[slot] if slot is not None else None
@@ -0,0 +1,243 @@
+"""
+Nearest-reference-point lookup for raw browser coordinates.
+
+/recommend and /log-mood receive arbitrary latitude/longitude, so every
+user would otherwise land in their own weather cache cell. Coordinates
+are snapped to the nearest reference point (the quiz cities, plus an
+optional denser grid) using a KD-tree over unit-sphere vectors, which
+makes the euclidean nearest neighbour the great-circle nearest one.
+"""
+
+import os
+import math
+import time
+import random
+import logging
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from baumann import TURKISH_CITIES
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+
+# Optional grid of extra reference points over Türkiye (0 disables it)
+GEO_GRID_STEP_DEG = float(os.environ.get("GEO_GRID_STEP_DEG", "0"))
+GEO_GRID_BOUNDS = (35.8, 25.6, 42.2, 44.9)  # min lat, min lon, max lat, max lon
+# Coordinates farther than this from every reference point are not snapped
+GEO_MAX_DISTANCE_KM = float(os.environ.get("GEO_MAX_DISTANCE_KM", "150"))
+
+
+class ReferencePoint(NamedTuple):
+    key: str
+    lat: float
+    lon: float
+    city: str  # nearest TURKISH_CITIES key, used for climate normals
+
+
+def _to_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    lat_r = math.radians(lat)
+    lon_r = math.radians(lon)
+    return (math.cos(lat_r) * math.cos(lon_r), math.cos(lat_r) * math.sin(lon_r), math.sin(lat_r))
+
+
+def _chord_to_km(chord_sq: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(chord_sq) / 2))
+
+
+class _Node:
+    __slots__ = ("vector", "index", "axis", "left", "right")
+
+    def __init__(self, vector, index, axis, left, right):
+        self.vector = vector
+        self.index = index
+        self.axis = axis
+        self.left = left
+        self.right = right
+
+
+class GeoIndex:
+    """Static KD-tree over reference points"""
+
+    def __init__(self, points: List[ReferencePoint]):
+        self.points = tuple(points)
+        items = [(_to_vector(p.lat, p.lon), i) for i, p in enumerate(self.points)]
+        self._root = self._build(items, 0)
+
+    def _build(self, items, depth) -> Optional[_Node]:
+        if not items:
+            return None
+        axis = depth % 3
+        items.sort(key=lambda item: item[0][axis])
+        mid = len(items) // 2
+        vector, index = items[mid]
+        return _Node(
+            vector,
+            index,
+            axis,
+            self._build(items[:mid], depth + 1),
+            self._build(items[mid + 1:], depth + 1),
+        )
+
+    def nearest(self, lat: float, lon: float) -> Tuple[Optional[ReferencePoint], float]:
+        """Nearest reference point and its great-circle distance in km"""
+        target = _to_vector(lat, lon)
+        best_index = None
+        best_dist = math.inf
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            dx = node.vector[0] - target[0]
+            dy = node.vector[1] - target[1]
+            dz = node.vector[2] - target[2]
+            dist = dx * dx + dy * dy + dz * dz
+            if dist < best_dist:
+                best_dist = dist
+                best_index = node.index
+
+            diff = target[node.axis] - node.vector[node.axis]
+            near, far = (node.left, node.right) if diff < 0 else (node.right, node.left)
+            if diff * diff < best_dist:
+                stack.append(far)
+            stack.append(near)
+
+        if best_index is None:
+            return None, math.inf
+        return self.points[best_index], _chord_to_km(best_dist)
+
+    def nearest_brute_force(self, lat: float, lon: float) -> Tuple[Optional[ReferencePoint], float]:
+        """Linear scan used to check the tree"""
+        target = _to_vector(lat, lon)
+        best = None
+        best_dist = math.inf
+        for point in self.points:
+            v = _to_vector(point.lat, point.lon)
+            dist = (v[0] - target[0]) ** 2 + (v[1] - target[1]) ** 2 + (v[2] - target[2]) ** 2
+            if dist < best_dist:
+                best, best_dist = point, dist
+        return best, _chord_to_km(best_dist)
+
+
+def build_reference_points(grid_step: float = GEO_GRID_STEP_DEG) -> List[ReferencePoint]:
+    """The quiz cities plus, if `grid_step` > 0, a lat/lon grid over Türkiye"""
+    points = [ReferencePoint(key, city["lat"], city["lon"], key) for key, city in TURKISH_CITIES.items()]
+    if grid_step <= 0:
+        return points
+
+    city_index = GeoIndex(points)
+    min_lat, min_lon, max_lat, max_lon = GEO_GRID_BOUNDS
+    lat_steps = int((max_lat - min_lat) / grid_step)
+    lon_steps = int((max_lon - min_lon) / grid_step)
+    for i in range(lat_steps + 1):
+        lat = round(min_lat + i * grid_step, 4)
+        for j in range(lon_steps + 1):
+            lon = round(min_lon + j * grid_step, 4)
+            city, _ = city_index.nearest(lat, lon)
+            points.append(ReferencePoint(f"grid:{lat}:{lon}", lat, lon, city.key))
+    return points
+
+
+geo_index = GeoIndex(build_reference_points())
+
+
+def parse_point(lat, lon) -> Optional[Tuple[float, float]]:
+    """Coordinates as floats, or None unless both are finite and in range"""
+    try:
+        lat = float(lat)
+        lon = float(lon)
+    except (TypeError, ValueError):
+        return None
+    # NaN fails both comparisons, infinities the bounds
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def resolve_point(lat, lon) -> Optional[ReferencePoint]:
+    """Snap coordinates to the nearest reference point, or None if invalid or too far away"""
+    coordinates = parse_point(lat, lon)
+    if coordinates is None:
+        return None
+
+    point, distance = geo_index.nearest(*coordinates)
+    if point is None or distance > GEO_MAX_DISTANCE_KM:
+        return None
+    return point
+
+
+def snap_coordinates(lat, lon) -> Tuple:
+    """Coordinates of the nearest reference point, or the input unchanged if none applies"""
+    point = resolve_point(lat, lon)
+    return (point.lat, point.lon) if point is not None else (lat, lon)
+
+
+def get_local_weather(lat, lon, use_normals: bool = False) -> Tuple[Optional[Dict], bool]:
+    """
+    Weather for raw coordinates, shared across everyone near the same reference point.
+
+    Returns (weather_data, is_live), or (None, False) for invalid
+    coordinates. Quiz cities are served from the prefetched snapshot first;
+    if `use_normals` is set and no live weather is available, the nearest
+    city's climate normals are returned instead.
+    """
+    from weather import copy_weather, get_weather_data
+    from weather_prefetch import get_city_weather
+
+    coordinates = parse_point(lat, lon)
+    if coordinates is None:
+        return None, False
+    point = resolve_point(*coordinates)
+    if point is None:
+        weather_data = get_weather_data(*coordinates)
+        return weather_data, weather_data is not None
+
+    weather_data = get_city_weather(point.key) if point.key == point.city else None
+    if weather_data is None:
+        weather_data = get_weather_data(point.lat, point.lon)
+    if weather_data is not None:
+        return weather_data, True
+
+    if use_normals:
+        from climate import get_climate_weather
+        normals = get_climate_weather(point.city)
+        if normals is not None:
+            return copy_weather(normals), False
+    return None, False
+
+
+def benchmark(queries: int = 100000, grid_step: float = 0.25, seed: int = 42) -> Dict:
+    """Compare KD-tree lookups against a linear scan for accuracy and latency"""
+    index = GeoIndex(build_reference_points(grid_step))
+    rng = random.Random(seed)
+    min_lat, min_lon, max_lat, max_lon = GEO_GRID_BOUNDS
+    coords = [(rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon)) for _ in range(queries)]
+
+    start = time.perf_counter()
+    tree_results = [index.nearest(lat, lon) for lat, lon in coords]
+    tree_seconds = time.perf_counter() - start
+
+    sample = coords[:min(queries, 2000)]
+    start = time.perf_counter()
+    brute_results = [index.nearest_brute_force(lat, lon) for lat, lon in sample]
+    brute_seconds = time.perf_counter() - start
+
+    mismatches = sum(
+        1 for tree, brute in zip(tree_results, brute_results)
+        if abs(tree[1] - brute[1]) > 1e-6
+    )
+    return {
+        "reference_points": len(index.points),
+        "queries": queries,
+        "tree_us_per_query": round(tree_seconds / queries * 1e6, 2),
+        "brute_force_us_per_query": round(brute_seconds / len(sample) * 1e6, 2),
+        "checked": len(sample),
+        "mismatches": mismatches,
+        "max_snap_km": round(max(distance for _, distance in tree_results), 2),
+    }
+
+
+if __name__ == "__main__":
+    for step in (0, 0.5, 0.25, 0.1):
+        print(f"grid_step={step}: {benchmark(grid_step=step)}")
@@ -0,0 +1,292 @@
+"""
+Ingredient conflict checks for routines.
+
+data/ingredients.json maps ingredient aliases ("L-Ascorbic Acid",
+"salicylic acid") to a small vocabulary of actives and lists the pairs
+of actives that shouldn't be combined. At load, each active gets a bit
+and a conflict mask (the bits of everything it clashes with). Each
+product's ingredient list is parsed once into an active bitset and the
+OR of its actives' conflict masks, so validating a routine is one AND
+per product pair.
+"""
+
+import os
+import re
+import json
+import time
+import random
+import logging
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from product_index import bit_positions
+
+logger = logging.getLogger(__name__)
+
+INGREDIENTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "ingredients.json")
+
+SEVERITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+# "Salicylic Acid 2%", "Retinol (0.3%)" -> "salicylic acid", "retinol"
+_NOISE = re.compile(r"\([^)]*\)|\d+(?:[.,]\d+)?\s*%")
+_SEPARATORS = re.compile(r"[,;/\n]")
+
+
+class Conflict(NamedTuple):
+    first: str
+    second: str
+    severity: str
+    reason: str
+
+
+class IngredientVocabulary:
+    """Actives, their aliases and the pairwise conflict matrix as bit masks"""
+
+    def __init__(self, spec: Dict):
+        self.names = tuple(spec["ingredients"])
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.aliases = {}
+        for name, aliases in spec["ingredients"].items():
+            for alias in [name] + list(aliases):
+                self.aliases[self._clean(alias)] = self.index[name]
+
+        self.conflict_masks = [0] * len(self.names)
+        self.conflicts = {}  # (i, j) with i < j -> Conflict
+        for entry in spec.get("conflicts", []):
+            first, second = entry["pair"]
+            if first not in self.index or second not in self.index:
+                raise ValueError(f"Unknown ingredient in conflict {entry['pair']}")
+            if entry.get("severity") not in SEVERITY_ORDER:
+                raise ValueError(f"Invalid severity in conflict {entry['pair']}")
+            i, j = sorted((self.index[first], self.index[second]))
+            self.conflict_masks[i] |= 1 << j
+            self.conflict_masks[j] |= 1 << i
+            self.conflicts[(i, j)] = Conflict(self.names[i], self.names[j], entry["severity"], entry["reason"])
+
+    @staticmethod
+    def _clean(text: str) -> str:
+        return " ".join(_NOISE.sub(" ", text).lower().split())
+
+    def bits(self, ingredients: Optional[str]) -> int:
+        """Active bitset of a free-text ingredient list"""
+        bits = 0
+        for part in _SEPARATORS.split(ingredients or ""):
+            i = self.aliases.get(self._clean(part))
+            if i is not None:
+                bits |= 1 << i
+        return bits
+
+    def mask(self, bits: int) -> int:
+        """Bits of every active that conflicts with one in `bits`"""
+        mask = 0
+        for i in bit_positions(bits):
+            mask |= self.conflict_masks[i]
+        return mask
+
+    def describe(self, bits: int) -> List[str]:
+        return [self.names[i] for i in bit_positions(bits)]
+
+    def pair_conflicts(self, bits_a: int, mask_a: int, bits_b: int) -> List[Conflict]:
+        """Conflicts between two products; mask_a is `mask(bits_a)`"""
+        clash = mask_a & bits_b
+        if not clash:
+            return []
+        # A pair can clash both ways (aha+bha in each product); report it once
+        pairs = set()
+        for j in bit_positions(clash):
+            for i in bit_positions(bits_a & self.conflict_masks[j]):
+                pairs.add((min(i, j), max(i, j)))
+        return [self.conflicts[pair] for pair in sorted(pairs)]
+
+
+def load_vocabulary(path: str = INGREDIENTS_PATH) -> IngredientVocabulary:
+    with open(path, encoding="utf-8") as f:
+        return IngredientVocabulary(json.load(f))
+
+
+vocabulary = load_vocabulary()
+
+
+class ProfiledItem(NamedTuple):
+    key: object  # product id or position in the request
+    bits: int
+    mask: int
+
+
+def profile(key, ingredients: Optional[str]) -> ProfiledItem:
+    bits = vocabulary.bits(ingredients)
+    return ProfiledItem(key, bits, vocabulary.mask(bits))
+
+
+def find_conflicts(items: Sequence[ProfiledItem]) -> List[Dict]:
+    """
+    Conflicting active pairs across items, most severe first. Two actives
+    clashing inside one item are reported with that item's key twice.
+    """
+    found = []
+    for a in range(len(items)):
+        first = items[a]
+        if not first.mask:
+            continue
+        for b in range(a, len(items)):
+            second = items[b]
+            for conflict in vocabulary.pair_conflicts(first.bits, first.mask, second.bits):
+                found.append({
+                    "items": [first.key, second.key],
+                    "ingredients": [conflict.first, conflict.second],
+                    "severity": conflict.severity,
+                    "reason": conflict.reason,
+                })
+    found.sort(key=lambda c: SEVERITY_ORDER[c["severity"]])
+    return found
+
+
+class ProductIngredientCache:
+    """Product id -> ProfiledItem, filled on demand and dropped on product writes"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, product_ids: Iterable[int]) -> Dict[int, ProfiledItem]:
+        """Profiles for the ids that exist; missing ones are loaded in one query (needs an app context)"""
+        product_ids = list(dict.fromkeys(product_ids))
+        with self._lock:
+            found = {pid: self._entries[pid] for pid in product_ids if pid in self._entries}
+            self.hits += len(found)
+            missing = [pid for pid in product_ids if pid not in found]
+            self.misses += len(missing)
+        if missing:
+            from app import db
+            from models import Product
+
+            rows = db.session.execute(
+                db.select(Product.id, Product.ingredients).where(Product.id.in_(missing))
+            ).all()
+            loaded = {pid: profile(pid, ingredients) for pid, ingredients in rows}
+            with self._lock:
+                self._entries.update(loaded)
+            found.update(loaded)
+        return found
+
+    def invalidate(self, product_ids: Optional[Iterable[int]] = None):
+        with self._lock:
+            if product_ids is None:
+                self._entries.clear()
+            else:
+                for pid in product_ids:
+                    self._entries.pop(pid, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"products": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+ingredient_cache = ProductIngredientCache()
+
+
+def validate_products(product_ids: List[int]) -> Dict:
+    """Conflicts between the products of a routine, in routine order (needs an app context)"""
+    profiles = ingredient_cache.get_many(product_ids)
+    items = [profiles[pid] for pid in dict.fromkeys(product_ids) if pid in profiles]
+    return {
+        "conflicts": find_conflicts(items),
+        "actives": {str(item.key): vocabulary.describe(item.bits) for item in items},
+        "unknown_products": [pid for pid in product_ids if pid not in profiles],
+    }
+
+
+def validate_ingredient_lists(ingredient_lists: List[str]) -> Dict:
+    """Conflicts between free-text ingredient lists; items are referred to by position"""
+    items = [profile(i, text) for i, text in enumerate(ingredient_lists)]
+    return {
+        "conflicts": find_conflicts(items),
+        "actives": {str(item.key): vocabulary.describe(item.bits) for item in items},
+    }
+
+
+# Drop cached profiles of products whose ingredients change
+
+@event.listens_for(Session, "after_flush")
+def _collect_ingredient_changes(session, flush_context):
+    from models import Product
+
+    changed = session.info.setdefault("ingredient_changes", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Product) and obj.id is not None:
+            changed.add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_ingredient_changes(session):
+    changed = session.info.pop("ingredient_changes", None)
+    if changed:
+        ingredient_cache.invalidate(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_ingredient_changes(session):
+    session.info.pop("ingredient_changes", None)
+
+
+def _naive_conflicts(ingredient_lists: List[str], spec: Dict) -> List[Tuple[int, int, str, str]]:
+    """Reference check that re-parses every pair of products (and each product alone), as done before the matrix"""
+    alias_to_name = {}
+    for name, aliases in spec["ingredients"].items():
+        for alias in [name] + aliases:
+            alias_to_name[IngredientVocabulary._clean(alias)] = name
+    found = []
+    for a in range(len(ingredient_lists)):
+        for b in range(a, len(ingredient_lists)):
+            actives_a = {alias_to_name.get(IngredientVocabulary._clean(p)) for p in _SEPARATORS.split(ingredient_lists[a])}
+            actives_b = {alias_to_name.get(IngredientVocabulary._clean(p)) for p in _SEPARATORS.split(ingredient_lists[b])}
+            for entry in spec["conflicts"]:
+                x, y = entry["pair"]
+                if (x in actives_a and y in actives_b) or (y in actives_a and x in actives_b):
+                    found.append((a, b, *sorted((x, y))))
+    return found
+
+
+def benchmark(routines: int = 5000, routine_size: int = 10, seed: int = 11) -> Dict:
+    """Validate random routines with the matrix and with pairwise re-parsing"""
+    with open(INGREDIENTS_PATH, encoding="utf-8") as f:
+        spec = json.load(f)
+    rng = random.Random(seed)
+    aliases = [alias for values in spec["ingredients"].values() for alias in values]
+    fillers = ["Glycerin", "Aqua", "Hyaluronic Acid", "Ceramides", "Squalane", "Panthenol", "Aloe Vera", "Shea Butter"]
+    catalog = [
+        ", ".join(rng.sample(fillers, 4) + [a.title() for a in rng.sample(aliases, rng.randint(0, 2))])
+        for _ in range(2000)
+    ]
+    profiles = [profile(i, text) for i, text in enumerate(catalog)]
+    workload = [rng.sample(range(len(catalog)), routine_size) for _ in range(routines)]
+
+    start = time.perf_counter()
+    matrix_results = [find_conflicts([profiles[i] for i in routine]) for routine in workload]
+    matrix_seconds = time.perf_counter() - start
+
+    sample = workload[:500]
+    start = time.perf_counter()
+    naive_results = [_naive_conflicts([catalog[i] for i in routine], spec) for routine in sample]
+    naive_seconds = time.perf_counter() - start
+
+    mismatches = 0
+    for routine, matrix, naive in zip(sample, matrix_results, naive_results):
+        got = sorted((routine.index(c["items"][0]), routine.index(c["items"][1]), *sorted(c["ingredients"])) for c in matrix)
+        mismatches += got != sorted(naive)
+    return {
+        "routine_size": routine_size,
+        "matrix_us_per_routine": round(matrix_seconds / routines * 1e6, 1),
+        "pairwise_parse_us_per_routine": round(naive_seconds / len(sample) * 1e6, 1),
+        "checked": len(sample),
+        "mismatches": mismatches,
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
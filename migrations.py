@@ -0,0 +1,178 @@
+"""
+Schema migrations for databases created before a model change.
+
+`db.create_all()` creates missing tables but never alters existing
+ones, so each migration here brings an older database up to date and is
+safe to run repeatedly. app.py runs them at startup; they can also be
+run by hand:
+
+    python migrations.py          # apply migrations
+    python migrations.py check    # verify recommendation queries use the indexes
+"""
+
+import sys
+import logging
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = 1000
+
+
+def migrate_product_names() -> int:
+    """
+    Make product names unique and add their unique index. Duplicates from
+    before the index get their id appended, keeping the oldest product's
+    name as is. Returns the number of products renamed. Needs an app context.
+    """
+    from sqlalchemy import inspect
+    from app import db
+    from models import Product
+
+    index = next(index for index in Product.__table__.indexes if index.name == "ix_product_name")
+    if index.name in {i["name"] for i in inspect(db.engine).get_indexes("product")}:
+        return 0
+
+    duplicates = db.session.execute(
+        db.select(Product.id, Product.name)
+        .where(Product.name.in_(db.select(Product.name).group_by(Product.name).having(db.func.count() > 1)))
+        .order_by(Product.name, Product.id)
+    ).all()
+    max_length = Product.__table__.c.name.type.length
+    renamed = 0
+    previous = None
+    for product_id, name in duplicates:
+        if name == previous:
+            suffix = f" (#{product_id})"
+            db.session.execute(
+                db.update(Product).where(Product.id == product_id)
+                .values(name=name[:max_length - len(suffix)] + suffix)
+            )
+            renamed += 1
+        previous = name
+    db.session.commit()
+    if renamed:
+        logger.warning(f"Renamed {renamed} products with duplicate names before adding the unique name index")
+
+    index.create(db.engine)
+    return renamed
+
+
+def migrate_product_attributes(batch_size: int = MIGRATION_BATCH_SIZE) -> int:
+    """
+    Fill `product_attribute` from the comma-separated Product columns for
+    products that have no attribute rows yet, and add the category index.
+    Returns the number of products converted. Needs an app context.
+    """
+    from app import db
+    from models import Product, ProductAttribute, sync_product_attributes
+
+    for index in Product.__table__.indexes | ProductAttribute.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+
+    converted = 0
+    last_id = 0
+    while True:
+        ids = db.session.execute(
+            db.select(Product.id)
+            .where(Product.id > last_id, ~db.exists().where(ProductAttribute.product_id == Product.id))
+            .order_by(Product.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        for product in Product.query.filter(Product.id.in_(ids)).all():
+            sync_product_attributes(product)
+        db.session.commit()
+        converted += len(ids)
+        last_id = ids[-1]
+
+    if converted:
+        logger.info(f"Converted attributes of {converted} products")
+    return converted
+
+
+def migrate_search_index():
+    """Create the full-text search table and triggers (SQLite) or tsvector column (PostgreSQL)"""
+    from app import db
+    from search import ensure_search_index
+
+    with db.engine.begin() as connection:
+        if ensure_search_index(connection):
+            logger.info("Built the product full-text search index")
+
+
+def migrate_mood_entries():
+    """Add the `user_id` column and history index to `skin_mood_entry`"""
+    from sqlalchemy import inspect
+    from app import db
+    from models import SkinMoodEntry
+
+    columns = {column["name"] for column in inspect(db.engine).get_columns("skin_mood_entry")}
+    if "user_id" not in columns:
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql("ALTER TABLE skin_mood_entry ADD COLUMN user_id VARCHAR(36)")
+        logger.info("Added user_id to skin_mood_entry; existing entries stay unassigned")
+    for index in SkinMoodEntry.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+
+
+def check_mood_rollups():
+    """
+    Warn when the mood rollups are empty but entries exist. The backfill
+    scans every entry and blocks mood logging while it runs, so it is left
+    to `python mood_rollups.py rebuild` rather than run at startup.
+    """
+    from app import db
+    from models import MoodRollup, SkinMoodEntry
+
+    if db.session.query(MoodRollup.day).first() is None and db.session.query(SkinMoodEntry.id).first() is not None:
+        logger.warning("Mood rollups are empty; run `python mood_rollups.py rebuild` to backfill them")
+    db.session.rollback()
+
+
+def run_migrations():
+    migrate_product_names()
+    migrate_product_attributes()
+    migrate_search_index()
+    migrate_mood_entries()
+    check_mood_rollups()
+
+
+def explain_recommendation_query(skin_type="oily", concerns=("acne",), weather_conditions=("hot", "humid"), category="treat") -> List[str]:
+    """Query plan lines for a typical recommendation query (SQLite or PostgreSQL)"""
+    from app import db
+    from recommendations import build_recommendation_query
+
+    statement = build_recommendation_query(skin_type, list(concerns), list(weather_conditions), category).statement
+    compiled = statement.compile(db.engine, compile_kwargs={"literal_binds": True})
+    prefix = "EXPLAIN QUERY PLAN" if db.engine.dialect.name == "sqlite" else "EXPLAIN"
+    rows = db.session.execute(db.text(f"{prefix} {compiled}")).all()
+    return [str(row[-1]) for row in rows]
+
+
+def check_query_plans() -> List[str]:
+    """
+    Raise AssertionError unless recommendation lookups are served by the
+    attribute and category indexes. Returns the plan that was checked.
+
+    On PostgreSQL a small table may still be planned as a sequential scan;
+    run this against a representative catalog (or after ANALYZE).
+    """
+    plan = explain_recommendation_query()
+    text = "\n".join(plan)
+    for index_name in ("ix_product_attribute_kind_value_product", "ix_product_category"):
+        assert index_name in text, f"{index_name} not used:\n{text}"
+    return plan
+
+
+if __name__ == "__main__":
+    from app import app
+
+    with app.app_context():
+        if sys.argv[1:] == ["check"]:
+            print("\n".join(check_query_plans()))
+            print("OK: recommendation queries use the attribute and category indexes")
+        else:
+            run_migrations()
+            print("Migrations applied")
@@ -1,15 +1,23 @@
 from datetime import datetime
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
 from app import db
 
 class SkinMoodEntry(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.Date, nullable=False, default=datetime.utcnow().date)
+    user_id = db.Column(db.String(36))  # anonymous per-browser id; NULL for entries logged before users existed
+    date = db.Column(db.Date, nullable=False, default=lambda: datetime.utcnow().date())
     mood = db.Column(db.String(20), nullable=False)  # e.g., 'happy', 'dry', 'irritated'
     notes = db.Column(db.Text)
     weather_temp = db.Column(db.Float)
     weather_humidity = db.Column(db.Integer)
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
+    __table_args__ = (
+        # Serves a user's history newest first and its keyset pages; id breaks ties
+        db.Index('ix_skin_mood_entry_user_date_created', 'user_id', 'date', 'created_at', 'id'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -21,10 +29,74 @@ class SkinMoodEntry(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
+class MoodWeatherTask(db.Model):
+    """A mood entry still waiting for its weather readings (processed by mood_enrichment)"""
+    entry_id = db.Column(db.Integer, db.ForeignKey('skin_mood_entry.id', ondelete='CASCADE'), primary_key=True)
+    cell = db.Column(db.String(40), nullable=False)  # entries in the same cell share one weather lookup
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class MoodRollup(db.Model):
+    """Mood entry count per day, mood and weather band across all users (maintained by mood_rollups)"""
+    day = db.Column(db.Date, primary_key=True)
+    mood = db.Column(db.String(20), primary_key=True)
+    temperature_band = db.Column(db.String(10), primary_key=True)  # 'cold', 'mild', 'hot' or 'unknown'
+    humidity_band = db.Column(db.String(10), primary_key=True)  # 'dry', 'normal', 'humid' or 'unknown'
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class UserMoodRollup(db.Model):
+    """Mood entry count per user, day, mood and weather band (maintained by mood_rollups)"""
+    user_id = db.Column(db.String(36), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    mood = db.Column(db.String(20), primary_key=True)
+    temperature_band = db.Column(db.String(10), primary_key=True)
+    humidity_band = db.Column(db.String(10), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class MoodAnalytics(db.Model):
+    """Cached weather-mood analytics for a user, or '*' for everyone (maintained by mood_analytics)"""
+    user_id = db.Column(db.String(36), primary_key=True)
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    entries = db.Column(db.Integer, nullable=False)
+    result = db.Column(db.Text, nullable=False)  # JSON
+
+class WeatherObservation(db.Model):
+    """Weather observation for a grid cell, shared by all worker processes"""
+    id = db.Column(db.Integer, primary_key=True)
+    cell = db.Column(db.String(40), nullable=False)  # e.g. '0.1:410:290' (cell size:lat index:lon index)
+    observed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    temperature = db.Column(db.Integer, nullable=False)  # rounded °C, as served by get_weather_data
+    humidity = db.Column(db.Integer, nullable=False)
+    uv_index = db.Column(db.Float)
+    description = db.Column(db.String(100))
+    city = db.Column(db.String(100))
+    region = db.Column(db.String(100))
+    country = db.Column(db.String(100))
+
+    __table_args__ = (
+        db.Index('ix_weather_observation_cell_observed_at', 'cell', 'observed_at'),
+    )
+
+    def to_weather(self):
+        return {
+            'temperature': self.temperature,
+            'humidity': self.humidity,
+            'description': self.description,
+            'uv_index': self.uv_index,
+            'location': {
+                'city': self.city,
+                'region': self.region,
+                'country': self.country
+            }
+        }
+
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    category = db.Column(db.String(50), nullable=False)  # e.g., 'cleanser', 'moisturizer', 'sunscreen'
+    name = db.Column(db.String(100), nullable=False, unique=True, index=True)  # catalog imports upsert by name
+    category = db.Column(db.String(50), nullable=False, index=True)  # e.g., 'cleanser', 'moisturizer', 'sunscreen'
     skin_types = db.Column(db.String(100), nullable=False)  # comma-separated list: 'oily,combination'
     concerns = db.Column(db.String(200))  # comma-separated list: 'acne,aging'
     ingredients = db.Column(db.Text)
@@ -32,15 +104,83 @@ class Product(db.Model):
     weather_conditions = db.Column(db.String(100))  # e.g., 'humid,dry,hot,cold'
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
+    # One row per skin type / concern / weather condition, kept in sync with the columns above
+    attributes = db.relationship(
+        'ProductAttribute',
+        cascade='all, delete-orphan',
+        lazy='selectin',
+        order_by='(ProductAttribute.kind, ProductAttribute.position)',
+        back_populates='product'
+    )
+
+    def attribute_values(self, kind):
+        return [a.value for a in self.attributes if a.kind == kind]
+
     def to_dict(self):
         return {
             'id': self.id,
             'name': self.name,
             'category': self.category,
-            'skin_types': self.skin_types.split(','),
-            'concerns': self.concerns.split(',') if self.concerns else [],
+            'skin_types': self.attribute_values('skin_type'),
+            'concerns': self.attribute_values('concern'),
             'ingredients': self.ingredients,
             'description': self.description,
-            'weather_conditions': self.weather_conditions.split(',') if self.weather_conditions else [],
+            'weather_conditions': self.attribute_values('weather_condition'),
             'created_at': self.created_at.isoformat()
-        }
\ No newline at end of file
+        }
+
+class ProductAttribute(db.Model):
+    """A single skin type, concern or weather condition of a product"""
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), primary_key=True)
+    kind = db.Column(db.String(20), primary_key=True)  # 'skin_type', 'concern' or 'weather_condition'
+    value = db.Column(db.String(50), primary_key=True)  # lower-cased token, 'all' matches everything
+    position = db.Column(db.SmallInteger, nullable=False, default=0)  # order in the source list
+
+    product = db.relationship('Product', back_populates='attributes')
+
+    __table_args__ = (
+        # Serves "products with kind=value" lookups without touching the table
+        db.Index('ix_product_attribute_kind_value_product', 'kind', 'value', 'product_id'),
+    )
+
+# Product column -> ProductAttribute.kind
+ATTRIBUTE_COLUMNS = {
+    'skin_types': 'skin_type',
+    'concerns': 'concern',
+    'weather_conditions': 'weather_condition',
+}
+
+def split_attribute_values(value):
+    """Distinct, lower-cased tokens of a comma-separated column, in order"""
+    tokens = []
+    for part in (value or '').split(','):
+        token = part.strip().lower()
+        if token and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+def sync_product_attributes(product, columns=ATTRIBUTE_COLUMNS):
+    """Rebuild the attribute rows of `product` for the given comma-separated columns"""
+    for column in columns:
+        kind = ATTRIBUTE_COLUMNS[column]
+        existing = {a.value: a for a in product.attributes if a.kind == kind}
+        rows = []
+        for position, token in enumerate(split_attribute_values(getattr(product, column))):
+            # Reuse unchanged rows; deleting and re-adding the same key in one flush conflicts
+            row = existing.get(token) or ProductAttribute(kind=kind, value=token)
+            row.position = position
+            rows.append(row)
+        product.attributes = [a for a in product.attributes if a.kind != kind] + rows
+
+@event.listens_for(Session, 'before_flush')
+def _sync_product_attributes(session, flush_context, instances):
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Product):
+            continue
+        if obj in session.new:
+            sync_product_attributes(obj)
+            continue
+        state = inspect(obj)
+        changed = [column for column in ATTRIBUTE_COLUMNS if state.attrs[column].history.has_changes()]
+        if changed:
+            sync_product_attributes(obj, changed)
\ No newline at end of file
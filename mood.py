@@ -0,0 +1,147 @@
+"""
+Per-user skin mood history.
+
+There are no accounts: each browser gets an anonymous id in its session
+cookie the first time it opens the tracker, and entries are stored under
+it. History is read newest first from the (user_id, date, created_at, id)
+index with keyset pagination, so a page costs the same regardless of how
+many entries the table or the user has.
+"""
+
+import os
+import sys
+import time
+import uuid
+import random
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MOOD_HISTORY_PAGE_SIZE = int(os.environ.get("MOOD_HISTORY_PAGE_SIZE", "7"))
+MOOD_HISTORY_MAX_PAGE_SIZE = 100
+
+USER_SESSION_KEY = "user_id"
+
+
+def current_user_id(create: bool = True) -> Optional[str]:
+    """Anonymous id of the browser from the session, assigned on first use (needs a request context)"""
+    from flask import session
+
+    user_id = session.get(USER_SESSION_KEY)
+    if user_id is None and create:
+        user_id = str(uuid.uuid4())
+        session[USER_SESSION_KEY] = user_id
+        session.permanent = True
+    return user_id
+
+
+class MoodPage(NamedTuple):
+    entries: List  # SkinMoodEntry, newest first
+    next_cursor: Optional[str]  # None on the last page
+
+
+def encode_cursor(entry) -> str:
+    return f"{entry.date.isoformat()}_{entry.created_at.isoformat()}_{entry.id}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[date, datetime, int]]:
+    """(date, created_at, id) from a cursor string; raises ValueError if malformed"""
+    if not cursor:
+        return None
+    day, created_at, entry_id = cursor.split("_")
+    return date.fromisoformat(day), datetime.fromisoformat(created_at), int(entry_id)
+
+
+def get_mood_page(user_id: str, limit: int = MOOD_HISTORY_PAGE_SIZE, cursor: Optional[str] = None) -> MoodPage:
+    """
+    One page of a user's entries, newest first, starting after `cursor`.
+    Raises ValueError for a malformed cursor. Needs an app context.
+    """
+    from app import db
+    from models import SkinMoodEntry
+
+    limit = max(1, min(limit, MOOD_HISTORY_MAX_PAGE_SIZE))
+    order = (SkinMoodEntry.date, SkinMoodEntry.created_at, SkinMoodEntry.id)
+    query = db.select(SkinMoodEntry).where(SkinMoodEntry.user_id == user_id)
+    after = decode_cursor(cursor)
+    if after is not None:
+        query = query.where(db.tuple_(*order) < after)
+    query = query.order_by(*(column.desc() for column in order)).limit(limit + 1)
+
+    entries = db.session.execute(query).scalars().all()
+    next_cursor = encode_cursor(entries[limit - 1]) if len(entries) > limit else None
+    return MoodPage(entries[:limit], next_cursor)
+
+
+def benchmark(sizes=(100000, 1000000), users: int = 20000, pages: int = 200, seed: int = 3) -> Dict:
+    """
+    Time the first and a deep history page for random users as the table
+    grows, against the old unindexed whole-table ORDER BY date
+    """
+    import tempfile
+    from sqlalchemy import create_engine, select, tuple_
+    from app import db  # noqa: F401 - loads models through the app
+    from models import SkinMoodEntry
+
+    rng = random.Random(seed)
+    table = SkinMoodEntry.__table__
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'mood.db')}")
+    table.create(engine)
+    user_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(users)]
+    order = (table.c.date, table.c.created_at, table.c.id)
+    start_day = datetime(2020, 1, 1)
+
+    def page(conn, user_id, after=None):
+        query = select(table).where(table.c.user_id == user_id)
+        if after is not None:
+            query = query.where(tuple_(*order) < after)
+        return conn.execute(query.order_by(*(c.desc() for c in order)).limit(MOOD_HISTORY_PAGE_SIZE + 1)).all()
+
+    def timed(fn):
+        timings = []
+        for _ in range(pages):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        return round(timings[len(timings) // 2] * 1e3, 3)
+
+    results = []
+    rows = 0
+    with engine.connect() as conn:
+        for size in sorted(sizes):
+            batch = []
+            while rows < size:
+                rows += 1
+                created = start_day + timedelta(seconds=rng.randrange(5 * 365 * 86400))
+                batch.append({
+                    "id": rows, "user_id": rng.choice(user_ids), "date": created.date(), "mood": "happy",
+                    "created_at": created, "weather_temp": 20.0, "weather_humidity": 50,
+                })
+                if len(batch) == 50000 or rows == size:
+                    conn.execute(table.insert(), batch)
+                    conn.commit()
+                    batch = []
+
+            def deep_page():
+                # A cursor somewhere in the middle of a user's history
+                point = start_day + timedelta(seconds=rng.randrange(5 * 365 * 86400))
+                page(conn, rng.choice(user_ids), (point.date(), point, sys.maxsize))
+
+            results.append({
+                "rows": size,
+                "first_page_ms": timed(lambda: page(conn, rng.choice(user_ids))),
+                "cursor_page_ms": timed(deep_page),
+                "unindexed_global_ms": timed(
+                    lambda: conn.execute(select(table).order_by(table.c.date.desc()).limit(MOOD_HISTORY_PAGE_SIZE)).all()
+                ),
+            })
+    engine.dispose()
+    return {"users": users, "results": results}
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or (100000, 1000000)
+    print(benchmark(sizes))
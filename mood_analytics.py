@@ -0,0 +1,497 @@
+"""
+Weather vs mood analytics ("your skin gets irritated below 40% humidity").
+
+A history of (user, mood, temperature, humidity) rows is turned into
+NumPy arrays and reduced, for every user at once, to additive counts:
+entries per mood, and entries with a reading per mood and reading bin.
+From those come, per user and mood:
+
+- how often the mood occurs in each humidity/temperature bin (P(mood | bin))
+- the average reading and the point-biserial correlation with the reading
+- the threshold where the mood is most over-represented on one side
+  (e.g. 2.1x as often below 40% humidity), given enough entries each side
+
+Results are stored as JSON in `mood_analytics`, computed on first read and
+dropped whenever the user logs a mood or an entry gets its weather. The
+nightly batch recomputes every user in chunks, plus the all-users cohort
+(stored as '*', only refreshed by the batch):
+
+    python mood_analytics.py nightly   # recompute everyone
+    python mood_analytics.py           # check against a per-user loop and time a synthetic batch
+"""
+
+import sys
+import json
+import time
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Entries with a reading needed on each side of a threshold, and with the mood on its side
+MOOD_ANALYTICS_MIN_SUPPORT = 5
+MOOD_ANALYTICS_MIN_MOOD_ENTRIES = 3
+# Smallest over-representation reported as an insight
+MOOD_ANALYTICS_MIN_LIFT = 1.5
+MOOD_ANALYTICS_CHUNK_USERS = 5000
+
+COHORT_KEY = "*"
+
+# Reading column, bin edges (also the candidate thresholds) and label suffix per variable
+VARIABLES = {
+    "humidity": ("weather_humidity", np.arange(20.0, 85.0, 5.0), "% humidity"),
+    "temperature": ("weather_temp", np.arange(-5.0, 40.0, 5.0), "°C"),
+}
+
+
+class MoodHistory(NamedTuple):
+    user_ids: List[str]  # group index -> user id
+    moods: List[str]  # mood code -> mood
+    group: np.ndarray  # (n,) group index per entry
+    mood: np.ndarray  # (n,) mood code per entry
+    readings: Dict[str, np.ndarray]  # variable -> (n,) readings, NaN if missing
+
+
+class MoodStats(NamedTuple):
+    """Additive per-group counts; stats of disjoint groups can be summed"""
+    counts: np.ndarray  # (G, M) entries per mood
+    bins: Dict[str, np.ndarray]  # variable -> (G, M, K + 1) entries with a reading per mood and bin
+    sums: Dict[str, np.ndarray]  # variable -> (G, M) sum of readings per mood
+    squares: Dict[str, np.ndarray]  # variable -> (G,) sum of squared readings
+
+
+def history_from_rows(rows: Sequence[Tuple]) -> MoodHistory:
+    """History from (user_id, mood, weather_temp, weather_humidity) rows"""
+    if not rows:
+        return MoodHistory([], [], np.zeros(0, np.int64), np.zeros(0, np.int64), {v: np.zeros(0) for v in VARIABLES})
+    user_col, mood_col, temp_col, humidity_col = zip(*rows)
+    user_ids, group = np.unique(np.array(user_col, dtype=object), return_inverse=True)
+    moods, mood = np.unique(np.array(mood_col, dtype=object), return_inverse=True)
+    # None becomes NaN in a float array
+    readings = {
+        "humidity": np.array(humidity_col, dtype=np.float64),
+        "temperature": np.array(temp_col, dtype=np.float64),
+    }
+    return MoodHistory(list(user_ids), list(moods), group.ravel(), mood.ravel(), readings)
+
+
+def accumulate(history: MoodHistory) -> MoodStats:
+    """Per-user counts for every user in the history at once"""
+    groups, moods = len(history.user_ids), len(history.moods)
+    cell = history.group * moods + history.mood
+    counts = np.bincount(cell, minlength=groups * moods).reshape(groups, moods)
+
+    bins, sums, squares = {}, {}, {}
+    for variable, (_, edges, _) in VARIABLES.items():
+        values = history.readings[variable]
+        valid = ~np.isnan(values)
+        v = values[valid]
+        width = len(edges) + 1
+        # Bin b holds edges[b - 1] <= v < edges[b]
+        index = cell[valid] * width + np.searchsorted(edges, v, side="right")
+        bins[variable] = np.bincount(index, minlength=groups * moods * width).reshape(groups, moods, width)
+        sums[variable] = np.bincount(cell[valid], weights=v, minlength=groups * moods).reshape(groups, moods)
+        squares[variable] = np.bincount(history.group[valid], weights=v * v, minlength=groups)
+    return MoodStats(counts, bins, sums, squares)
+
+
+def combine(stats: MoodStats) -> MoodStats:
+    """All groups as one"""
+    return MoodStats(
+        stats.counts.sum(0, keepdims=True),
+        {v: a.sum(0, keepdims=True) for v, a in stats.bins.items()},
+        {v: a.sum(0, keepdims=True) for v, a in stats.sums.items()},
+        {v: a.sum(0, keepdims=True) for v, a in stats.squares.items()},
+    )
+
+
+def merge(a: Optional[Tuple[MoodStats, List[str]]], b: Tuple[MoodStats, List[str]]) -> Tuple[MoodStats, List[str]]:
+    """Sum two single-group stats whose mood vocabularies may differ"""
+    if a is None:
+        return b
+    moods = sorted(set(a[1]) | set(b[1]))
+    position = {mood: i for i, mood in enumerate(moods)}
+
+    def widen(stats, names):
+        index = [position[name] for name in names]
+
+        def pad(array):
+            out = np.zeros(array.shape[:1] + (len(moods),) + array.shape[2:], dtype=array.dtype)
+            out[:, index] = array
+            return out
+
+        return MoodStats(
+            pad(stats.counts),
+            {v: pad(x) for v, x in stats.bins.items()},
+            {v: pad(x) for v, x in stats.sums.items()},
+            stats.squares,
+        )
+
+    wa, wb = widen(*a), widen(*b)
+    return MoodStats(
+        wa.counts + wb.counts,
+        {v: wa.bins[v] + wb.bins[v] for v in VARIABLES},
+        {v: wa.sums[v] + wb.sums[v] for v in VARIABLES},
+        {v: wa.squares[v] + wb.squares[v] for v in VARIABLES},
+    ), moods
+
+
+def _thresholds(bins: np.ndarray, edges: np.ndarray) -> Dict[str, np.ndarray]:
+    """Best threshold per (group, mood): the edge and side where the mood is most over-represented"""
+    k = len(edges)
+    below = np.cumsum(bins, axis=2)[..., :k].astype(np.float64)  # (G, M, K) mood entries below each edge
+    per_mood = bins.sum(2).astype(np.float64)[..., None]
+    above = per_mood - below
+    below_all = below.sum(1, keepdims=True)  # (G, 1, K)
+    above_all = per_mood.sum(1, keepdims=True) - below_all
+
+    # Smoothed rates keep one or two lucky entries from producing huge lifts
+    rate_below = (below + 0.5) / (below_all + 1)
+    rate_above = (above + 0.5) / (above_all + 1)
+    enough = (below_all >= MOOD_ANALYTICS_MIN_SUPPORT) & (above_all >= MOOD_ANALYTICS_MIN_SUPPORT)
+    lifts = np.stack([
+        np.where(enough & (below >= MOOD_ANALYTICS_MIN_MOOD_ENTRIES), rate_below / rate_above, 0.0),
+        np.where(enough & (above >= MOOD_ANALYTICS_MIN_MOOD_ENTRIES), rate_above / rate_below, 0.0),
+    ], axis=2)  # (G, M, 2, K): side 0 = below, 1 = above
+
+    flat = lifts.reshape(lifts.shape[0], lifts.shape[1], -1)
+    best = flat.argmax(axis=2)
+    side, edge = np.divmod(best, k)
+    g, m = np.indices(best.shape)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        inside = np.where(side == 0, below[g, m, edge], above[g, m, edge])
+        inside_all = np.where(side == 0, below_all[g, 0, edge], above_all[g, 0, edge])
+        outside = per_mood[..., 0] - inside
+        outside_all = below_all[g, 0, edge] + above_all[g, 0, edge] - inside_all
+        return {
+            "lift": flat[g, m, best],
+            "side": side,
+            "threshold": edges[edge],
+            "entries": inside,
+            "rate_inside": inside / inside_all,
+            "rate_outside": outside / outside_all,
+        }
+
+
+def finalize(stats: MoodStats) -> Dict:
+    """Derived (G, M, ...) arrays: shares, conditional distributions, means, correlations, thresholds"""
+    counts = stats.counts.astype(np.float64)
+    derived = {"counts": stats.counts, "variables": {}}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        derived["share"] = counts / counts.sum(1, keepdims=True)
+        for variable, (_, edges, _) in VARIABLES.items():
+            bins = stats.bins[variable].astype(np.float64)
+            n_mood = bins.sum(2)  # (G, M) entries with a reading
+            n = n_mood.sum(1)  # (G,)
+            total = stats.sums[variable].sum(1)
+            mean = total / n
+            std = np.sqrt(np.clip(stats.squares[variable] / n - mean ** 2, 0, None))
+            mean_mood = stats.sums[variable] / n_mood
+            mean_rest = (total[:, None] - stats.sums[variable]) / (n[:, None] - n_mood)
+            p = n_mood / n[:, None]
+            correlation = (mean_mood - mean_rest) / std[:, None] * np.sqrt(p * (1 - p))
+            derived["variables"][variable] = {
+                "bin_entries": bins.sum(1),  # (G, K + 1)
+                "conditional": bins / bins.sum(1, keepdims=True),  # (G, M, K + 1) P(mood | bin)
+                "mean": mean_mood,
+                "correlation": correlation,
+                "best": _thresholds(stats.bins[variable], edges),
+            }
+    return derived
+
+
+def _values(array: np.ndarray, digits: int) -> list:
+    """Rounded floats with NaN and infinities as None"""
+    return [v if np.isfinite(v) else None for v in np.round(array, digits).tolist()]
+
+
+def _bin_label(edges: np.ndarray, b: int) -> str:
+    if b == 0:
+        return f"<{edges[0]:g}"
+    if b == len(edges):
+        return f">={edges[-1]:g}"
+    return f"{edges[b - 1]:g}-{edges[b]:g}"
+
+
+BIN_LABELS = {variable: [_bin_label(edges, b) for b in range(len(edges) + 1)] for variable, (_, edges, _) in VARIABLES.items()}
+
+
+def summarize(derived: Dict, moods: List[str], g: int) -> Dict:
+    """JSON-ready analytics of group g"""
+    # Pull the group's slices out as Python lists once; per-element numpy access dominates otherwise
+    counts = derived["counts"][g].tolist()
+    share = _values(derived["share"][g], 3)
+    present = [m for m in range(len(moods)) if counts[m]]
+    result = {"entries": sum(counts), "moods": {}, "distributions": {}, "insights": []}
+    for m in present:
+        result["moods"][moods[m]] = {"count": counts[m], "share": share[m]}
+
+    for variable, (_, _, unit) in VARIABLES.items():
+        data = derived["variables"][variable]
+        best = data["best"]
+        mean = _values(data["mean"][g], 1)
+        correlation = _values(data["correlation"][g], 3)
+        lift = best["lift"][g].tolist()
+        side = best["side"][g].tolist()
+        threshold = best["threshold"][g].tolist()
+        entries = best["entries"][g].tolist()
+        rate_inside = _values(best["rate_inside"][g], 3)
+        rate_outside = _values(best["rate_outside"][g], 3)
+        for m in present:
+            stats = {"mean": mean[m], "correlation": correlation[m]}
+            if lift[m] >= MOOD_ANALYTICS_MIN_LIFT:
+                where = "below" if side[m] == 0 else "above"
+                effect = {
+                    "variable": variable,
+                    "side": where,
+                    "threshold": threshold[m],
+                    "lift": round(lift[m], 2),
+                    "entries": int(entries[m]),
+                    "rate_inside": rate_inside[m],
+                    "rate_outside": rate_outside[m],
+                }
+                stats["threshold_effect"] = effect
+                result["insights"].append(dict(
+                    effect,
+                    mood=moods[m],
+                    text=f"Your skin is {moods[m]} {lift[m]:.1f}x as often {where} {threshold[m]:g}{unit}"
+                ))
+            result["moods"][moods[m]][variable] = stats
+
+        bin_entries = data["bin_entries"][g].tolist()
+        conditional = np.round(data["conditional"][g], 3).tolist()  # (M, K + 1)
+        result["distributions"][variable] = [
+            {
+                "bin": label,
+                "entries": int(bin_entries[b]),
+                "moods": {moods[m]: conditional[m][b] for m in present},
+            }
+            for b, label in enumerate(BIN_LABELS[variable]) if bin_entries[b]
+        ]
+    result["insights"].sort(key=lambda insight: -insight["lift"])
+    return result
+
+
+def _empty_result(computed: bool = True) -> Dict:
+    result = {"entries": 0, "moods": {}, "distributions": {}, "insights": []}
+    if not computed:
+        result["computed"] = False
+    return result
+
+
+def analyze_rows(rows: Sequence[Tuple]) -> Dict[str, Dict]:
+    """{user_id: analytics} for (user_id, mood, weather_temp, weather_humidity) rows"""
+    if not rows:
+        return {}
+    history = history_from_rows(rows)
+    derived = finalize(accumulate(history))
+    return {user_id: summarize(derived, history.moods, g) for g, user_id in enumerate(history.user_ids)}
+
+
+def _history_query(db, user_ids: Optional[Tuple[str, str]] = None):
+    from models import SkinMoodEntry
+
+    table = SkinMoodEntry.__table__
+    query = db.select(table.c.user_id, table.c.mood, table.c.weather_temp, table.c.weather_humidity)
+    if user_ids is None:
+        return query.where(table.c.user_id.isnot(None))
+    first, last = user_ids
+    return query.where(table.c.user_id >= first, table.c.user_id <= last)
+
+
+def _store(connection, results: Dict[str, Dict]):
+    from models import MoodAnalytics
+
+    table = MoodAnalytics.__table__
+    now = datetime.utcnow()
+    rows = [
+        {"user_id": user_id, "computed_at": now, "entries": result["entries"], "result": json.dumps(result)}
+        for user_id, result in results.items()
+    ]
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        # Upsert, so two requests missing the cache for the same user don't collide on the key
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table)
+        connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=["user_id"],
+                set_={column: statement.excluded[column] for column in ("computed_at", "entries", "result")}
+            ),
+            rows,
+        )
+        return
+
+    connection.execute(table.delete().where(table.c.user_id.in_(list(results))))
+    connection.execute(table.insert(), rows)
+
+
+def invalidate_analytics(connection, user_ids: Iterable[Optional[str]]):
+    """Drop cached analytics of users whose entries changed, in the writer's transaction"""
+    from models import MoodAnalytics
+
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if user_ids:
+        table = MoodAnalytics.__table__
+        connection.execute(table.delete().where(table.c.user_id.in_(user_ids)))
+
+
+def get_analytics(user_id: str) -> Dict:
+    """
+    Cached analytics for a user, computed and stored on a miss, or for
+    COHORT_KEY, everyone. The cohort is only computed by the nightly batch;
+    before its first run the result is empty with "computed": False.
+    Needs an app context.
+    """
+    from app import db
+    from models import MoodAnalytics
+
+    cached = db.session.get(MoodAnalytics, user_id)
+    if cached is not None:
+        return json.loads(cached.result)
+
+    if user_id == COHORT_KEY:
+        # Recomputing everyone inside a request would be far too slow
+        return _empty_result(computed=False)
+    rows = db.session.execute(_history_query(db, (user_id, user_id))).all()
+    result = analyze_rows(rows).get(user_id) or _empty_result()
+    # A mood logged while this was computed may be missed until the next log or nightly run
+    _store(db.session.connection(), {user_id: result})
+    db.session.commit()
+    return result
+
+
+def recompute_all(chunk_users: int = MOOD_ANALYTICS_CHUNK_USERS) -> Dict[str, Dict]:
+    """
+    Nightly batch: recompute and store every user's analytics, chunk by
+    chunk of users, and the all-users cohort. Returns {COHORT_KEY: cohort}.
+    Needs an app context.
+    """
+    from app import db
+    from models import SkinMoodEntry
+
+    table = SkinMoodEntry.__table__
+    user_ids = db.session.execute(
+        db.select(table.c.user_id).where(table.c.user_id.isnot(None)).distinct().order_by(table.c.user_id)
+    ).scalars().all()
+    db.session.rollback()
+
+    cohort = None
+    users = 0
+    for start in range(0, len(user_ids), chunk_users):
+        chunk = user_ids[start:start + chunk_users]
+        rows = db.session.execute(_history_query(db, (chunk[0], chunk[-1]))).all()
+        history = history_from_rows(rows)
+        stats = accumulate(history)
+        derived = finalize(stats)
+        _store(db.session.connection(), {
+            user_id: summarize(derived, history.moods, g) for g, user_id in enumerate(history.user_ids)
+        })
+        db.session.commit()
+        users += len(history.user_ids)
+        cohort = merge(cohort, (combine(stats), history.moods))
+
+    result = summarize(finalize(cohort[0]), cohort[1], 0) if cohort else _empty_result()
+    _store(db.session.connection(), {COHORT_KEY: result})
+    db.session.commit()
+    logger.info(f"Recomputed mood analytics for {users} users")
+    return {COHORT_KEY: result}
+
+
+def _reference(rows: Sequence[Tuple], user_id: str) -> Dict:
+    """Per-user loop version of the correlation and best threshold, for checking"""
+    mine = [row for row in rows if row[0] == user_id]
+    moods = sorted({row[1] for row in mine})
+    out = {}
+    for variable, (_, edges, _) in VARIABLES.items():
+        values = np.array([row[3] if variable == "humidity" else row[2] for row in mine], dtype=np.float64)
+        labels = np.array([row[1] for row in mine], dtype=object)
+        valid = ~np.isnan(values)
+        values, labels = values[valid], labels[valid]
+        for mood in moods:
+            indicator = (labels == mood).astype(np.float64)
+            r = np.corrcoef(indicator, values)[0, 1] if indicator.std() > 0 and values.std() > 0 else np.nan
+            best = 0.0
+            for t in edges:
+                for side in (values < t, values >= t):
+                    inside, outside = side.sum(), (~side).sum()
+                    hits_in, hits_out = indicator[side].sum(), indicator[~side].sum()
+                    if inside < MOOD_ANALYTICS_MIN_SUPPORT or outside < MOOD_ANALYTICS_MIN_SUPPORT:
+                        continue
+                    if hits_in < MOOD_ANALYTICS_MIN_MOOD_ENTRIES:
+                        continue
+                    best = max(best, ((hits_in + 0.5) / (inside + 1)) / ((hits_out + 0.5) / (outside + 1)))
+            out[(mood, variable)] = (r, best)
+    return out
+
+
+def synthetic_rows(users: int, per_user: int, seed: int = 1) -> List[Tuple]:
+    """Entries where 'irritated' is planted below 40% humidity and 'oily' above 28°C"""
+    rng = np.random.default_rng(seed)
+    n = users * per_user
+    user = np.repeat(np.arange(users), per_user)
+    humidity = rng.uniform(15, 95, n).round()
+    temperature = rng.uniform(-5, 38, n).round(1)
+    mood = rng.choice(np.array(["happy", "dry", "oily", "irritated"], dtype=object), n, p=[0.4, 0.2, 0.2, 0.2])
+    mood[(humidity < 40) & (rng.random(n) < 0.4)] = "irritated"
+    mood[(temperature > 28) & (rng.random(n) < 0.4)] = "oily"
+    missing = rng.random(n) < 0.1
+    return [
+        (f"user-{u:06d}", m, None if miss else float(t), None if miss else float(h))
+        for u, m, t, h, miss in zip(user, mood, temperature, humidity, missing)
+    ]
+
+
+def benchmark(users: int = 100000, per_user: int = 60, check_users: int = 50) -> Dict:
+    """Check against the per-user loop, then time accumulate/finalize/summarize for a synthetic user base"""
+    rows = synthetic_rows(check_users, per_user)
+    results = analyze_rows(rows)
+    mismatches = 0
+    for user_id, result in results.items():
+        for (mood, variable), (r, lift) in _reference(rows, user_id).items():
+            stats = result["moods"][mood][variable]
+            got_r = stats["correlation"]
+            if (got_r is None) != bool(np.isnan(r)) or (got_r is not None and abs(got_r - r) > 1e-3):
+                mismatches += 1
+            got_lift = stats.get("threshold_effect", {}).get("lift", 0.0)
+            if (lift >= MOOD_ANALYTICS_MIN_LIFT or got_lift) and abs(got_lift - lift) > 0.01:
+                mismatches += 1
+
+    rows = synthetic_rows(users, per_user, seed=2)
+    start = time.perf_counter()
+    history = history_from_rows(rows)
+    arrays_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    derived = finalize(accumulate(history))
+    vector_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    summaries = [json.dumps(summarize(derived, history.moods, g)) for g in range(len(history.user_ids))]
+    summarize_seconds = time.perf_counter() - start
+    return {
+        "checked_users": check_users,
+        "mismatches": mismatches,
+        "users": users,
+        "entries": len(rows),
+        "to_arrays_seconds": round(arrays_seconds, 2),
+        "vectorized_seconds": round(vector_seconds, 2),
+        "summarize_json_seconds": round(summarize_seconds, 2),
+        "avg_json_bytes": int(sum(map(len, summaries)) / len(summaries)),
+    }
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["nightly"]:
+        from app import app
+
+        with app.app_context():
+            start = time.perf_counter()
+            recompute_all()
+            print(f"Recomputed mood analytics in {time.perf_counter() - start:.1f}s")
+    else:
+        print(benchmark())
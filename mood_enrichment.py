@@ -0,0 +1,291 @@
+"""
+Background weather enrichment of mood entries.
+
+Logging a mood only inserts the entry plus a `mood_weather_task` row
+with its coordinates (see mood_ingest). A daemon thread picks tasks up
+in batches, groups them by location cell (the geoindex reference point,
+or the weather cache cell for coordinates far from every point), looks
+each cell up once on a small thread pool and fills in the entries'
+weather fields, moving their rollup counts out of the "unknown" bands. Tasks live in the
+database, so anything pending when a process stops is picked up at the
+next start; failed lookups are retried with backoff. Current weather
+only describes an entry's conditions shortly after it was logged, so
+tasks older than MOOD_ENRICH_MAX_AGE are dropped and their entries stay
+without weather.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MOOD_ENRICH_WORKERS = int(os.environ.get("MOOD_ENRICH_WORKERS", "4"))
+MOOD_ENRICH_BATCH_SIZE = int(os.environ.get("MOOD_ENRICH_BATCH_SIZE", "500"))
+MOOD_ENRICH_INTERVAL = float(os.environ.get("MOOD_ENRICH_INTERVAL", "30"))
+MOOD_ENRICH_MAX_ATTEMPTS = int(os.environ.get("MOOD_ENRICH_MAX_ATTEMPTS", "5"))
+# Oldest task, in seconds, still given the current weather
+MOOD_ENRICH_MAX_AGE = float(os.environ.get("MOOD_ENRICH_MAX_AGE", "1800"))
+# First retry delay in seconds, doubled per attempt
+MOOD_ENRICH_RETRY_DELAY = 60
+
+
+def location_cell(lat: float, lon: float) -> str:
+    """Key shared by every coordinate that resolves to the same weather lookup"""
+    from geoindex import resolve_point
+    from weather import cell_key
+
+    point = resolve_point(lat, lon)
+    if point is not None:
+        return f"point:{point.key}"
+    i, j = cell_key(lat, lon)
+    return f"cell:{i}:{j}"
+
+
+def parse_coordinates(latitude, longitude) -> Optional[Tuple[float, float]]:
+    from geoindex import parse_point
+
+    return parse_point(latitude, longitude)
+
+
+def is_recent(created_at: datetime, day: date, now: Optional[datetime] = None) -> bool:
+    """Whether the current weather can stand for an entry logged at `created_at` on `day`"""
+    now = now or datetime.utcnow()
+    return abs((now - created_at).total_seconds()) <= MOOD_ENRICH_MAX_AGE and abs((day - now.date()).days) <= 1
+
+
+def weather_task_row(entry_id: int, latitude, longitude) -> Optional[Dict]:
+    """`mood_weather_task` values for an entry, or None if there is nothing to look up"""
+    from weather import is_api_key_configured
+
+    coordinates = parse_coordinates(latitude, longitude)
+    if coordinates is None or not is_api_key_configured():
+        return None
+    lat, lon = coordinates
+    now = datetime.utcnow()
+    return {
+        "entry_id": entry_id, "cell": location_cell(lat, lon), "latitude": lat, "longitude": lon,
+        "attempts": 0, "next_attempt_at": now, "created_at": now,
+    }
+
+
+def _lookup(lat: float, lon: float) -> Optional[Dict]:
+    from geoindex import get_local_weather
+
+    try:
+        return get_local_weather(lat, lon)[0]
+    except Exception as e:
+        logger.error(f"Mood weather lookup error for ({lat}, {lon}): {str(e)}")
+        return None
+
+
+class MoodWeatherEnricher:
+    """Drains pending weather tasks on a thread, one lookup per location cell per batch"""
+
+    def __init__(self, workers: int, batch_size: int, interval: float):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.interval = interval
+        self.enriched = 0
+        self.lookups = 0
+        self.retried = 0
+        self.dropped = 0
+        self.expired = 0
+        self._last_run = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the worker thread once per process"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="mood-weather")
+            self._thread = threading.Thread(target=self._run, name="mood-enrichment", daemon=True)
+            self._thread.start()
+            logger.info(f"Mood weather enrichment started with {self.workers} lookup threads")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def notify(self):
+        """Process pending tasks now instead of at the next interval"""
+        self._wake.set()
+
+    def _run(self):
+        from app import app
+
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                with app.app_context():
+                    # Keep going while batches come back full
+                    while self.process_pending() >= self.batch_size and not self._stop.is_set():
+                        pass
+            except Exception as e:
+                logger.error(f"Mood weather enrichment error: {str(e)}", exc_info=True)
+            self._last_run = time.time()
+            self._wake.wait(self.interval)
+
+    def process_pending(self, now: Optional[datetime] = None) -> int:
+        """Handle one batch of due tasks; returns how many were taken. Needs an app context."""
+        from app import db
+        from models import MoodWeatherTask
+
+        now = now or datetime.utcnow()
+        tasks = db.session.execute(
+            db.select(MoodWeatherTask.entry_id, MoodWeatherTask.cell, MoodWeatherTask.latitude,
+                      MoodWeatherTask.longitude, MoodWeatherTask.attempts, MoodWeatherTask.created_at)
+            .where(MoodWeatherTask.next_attempt_at <= now)
+            .order_by(MoodWeatherTask.next_attempt_at, MoodWeatherTask.entry_id)
+            .limit(self.batch_size)
+        ).all()
+        db.session.rollback()  # don't hold the read transaction during lookups
+        if not tasks:
+            return 0
+
+        # Weather looked up now would be wrong for entries logged long ago
+        oldest = now - timedelta(seconds=MOOD_ENRICH_MAX_AGE)
+        stale = [task.entry_id for task in tasks if task.created_at < oldest]
+        if stale:
+            self._expire(stale)
+
+        by_cell = defaultdict(list)
+        for task in tasks:
+            if task.created_at >= oldest:
+                by_cell[task.cell].append(task)
+        cells = list(by_cell)
+        pool = self._pool or ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            results = list(pool.map(lambda cell: _lookup(by_cell[cell][0].latitude, by_cell[cell][0].longitude), cells))
+        finally:
+            if pool is not self._pool:
+                pool.shutdown()
+        self.lookups += len(cells)
+
+        failed = []
+        for cell, weather in zip(cells, results):
+            if weather:
+                self.enriched += self._apply(by_cell[cell], weather)
+            else:
+                failed.extend(by_cell[cell])
+        if failed:
+            self._reschedule(failed, now)
+        db.session.commit()
+        return len(tasks)
+
+    def _apply(self, tasks: List, weather: Dict) -> int:
+        """Fill in the weather of the tasks' entries and move their rollup counts"""
+        from app import db
+        from models import MoodWeatherTask, SkinMoodEntry
+        from mood_analytics import invalidate_analytics
+        from mood_rollups import record_entries
+
+        connection = db.session.connection()
+        task_table = MoodWeatherTask.__table__
+        entries = SkinMoodEntry.__table__
+        # Deleting the task claims the entry, so another process can't count it twice
+        claimed = connection.execute(
+            task_table.delete()
+            .where(task_table.c.entry_id.in_([task.entry_id for task in tasks]))
+            .returning(task_table.c.entry_id)
+        ).scalars().all()
+        if not claimed:
+            return 0
+
+        old_rows = connection.execute(
+            db.select(entries.c.user_id, entries.c.date, entries.c.mood, entries.c.weather_temp, entries.c.weather_humidity)
+            .where(entries.c.id.in_(claimed))
+        ).mappings().all()
+        temperature, humidity = weather["temperature"], weather["humidity"]
+        connection.execute(
+            entries.update().where(entries.c.id.in_(claimed)).values(weather_temp=temperature, weather_humidity=humidity)
+        )
+        record_entries(connection, old_rows, delta=-1)
+        record_entries(connection, [dict(row, weather_temp=temperature, weather_humidity=humidity) for row in old_rows])
+        invalidate_analytics(connection, {row["user_id"] for row in old_rows})
+        return len(claimed)
+
+    def _expire(self, entry_ids: List[int]):
+        """Drop tasks too old for the current weather to apply; their entries keep no weather"""
+        from app import db
+        from models import MoodWeatherTask
+
+        task_table = MoodWeatherTask.__table__
+        db.session.execute(task_table.delete().where(task_table.c.entry_id.in_(entry_ids)))
+        self.expired += len(entry_ids)
+        logger.warning(f"Expired weather tasks of {len(entry_ids)} mood entries older than {MOOD_ENRICH_MAX_AGE:g}s")
+
+    def _reschedule(self, tasks: List, now: datetime):
+        """Back off failed tasks; give up on those out of attempts"""
+        from app import db
+        from models import MoodWeatherTask
+
+        task_table = MoodWeatherTask.__table__
+        give_up = [task.entry_id for task in tasks if task.attempts + 1 >= MOOD_ENRICH_MAX_ATTEMPTS]
+        if give_up:
+            db.session.execute(task_table.delete().where(task_table.c.entry_id.in_(give_up)))
+            self.dropped += len(give_up)
+            logger.warning(f"Gave up on weather for {len(give_up)} mood entries")
+
+        by_attempts = defaultdict(list)
+        for task in tasks:
+            if task.entry_id not in give_up:
+                by_attempts[task.attempts + 1].append(task.entry_id)
+        for attempts, ids in by_attempts.items():
+            db.session.execute(
+                task_table.update().where(task_table.c.entry_id.in_(ids)).values(
+                    attempts=attempts,
+                    next_attempt_at=now + timedelta(seconds=MOOD_ENRICH_RETRY_DELAY * 2 ** (attempts - 1))
+                )
+            )
+            self.retried += len(ids)
+
+    def stats(self) -> Dict:
+        from app import app
+        from models import MoodWeatherTask
+
+        with app.app_context():
+            pending = MoodWeatherTask.query.count()
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "pending": pending,
+            "enriched": self.enriched,
+            "lookups": self.lookups,
+            "retried": self.retried,
+            "dropped": self.dropped,
+            "expired": self.expired,
+            "last_run_age": round(time.time() - self._last_run, 1) if self._last_run else None,
+        }
+
+
+enricher = MoodWeatherEnricher(
+    workers=MOOD_ENRICH_WORKERS,
+    batch_size=MOOD_ENRICH_BATCH_SIZE,
+    interval=MOOD_ENRICH_INTERVAL,
+)
+
+
+def start_enricher():
+    """Start the background worker when live weather is configured"""
+    from weather import is_api_key_configured
+
+    if not is_api_key_configured():
+        logger.warning("WeatherAPI key not configured - mood weather enrichment not started")
+        return
+    enricher.start()
+
+
+def get_enrichment_stats() -> Dict:
+    """Pending tasks, lookups per cell and retry counters"""
+    return enricher.stats()
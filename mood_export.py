@@ -0,0 +1,128 @@
+"""
+Streaming export of mood history as CSV or NDJSON.
+
+Entries are read in keyset-paginated batches (by id for the whole table,
+by the (user_id, date, created_at, id) index for one user) and each batch
+is serialized to one text chunk, so memory stays bounded by the batch
+size however long the history is. Each batch is its own short read, so
+an export never holds a transaction open against writers.
+
+    python mood_export.py [--format csv|ndjson] [--user ID] [--output history.csv.gz]
+"""
+
+import io
+import os
+import csv
+import sys
+import gzip
+import json
+import argparse
+import logging
+from datetime import date, datetime
+from typing import Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MOOD_EXPORT_BATCH_SIZE = int(os.environ.get("MOOD_EXPORT_BATCH_SIZE", "2000"))
+# Bearer token for exporting every user's entries over HTTP; unset disables it (the CLI always can)
+MOOD_EXPORT_TOKEN = os.environ.get("MOOD_EXPORT_TOKEN", "")
+
+EXPORT_COLUMNS = ("id", "user_id", "date", "mood", "notes", "weather_temp", "weather_humidity", "created_at")
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def iter_entry_batches(connection, user_id: Optional[str] = None, batch_size: int = MOOD_EXPORT_BATCH_SIZE) -> Iterator[list]:
+    """Lists of entry rows (EXPORT_COLUMNS order), oldest first for a user or by id for everyone"""
+    from sqlalchemy import select, tuple_
+    from models import SkinMoodEntry
+
+    table = SkinMoodEntry.__table__
+    columns = [table.c[name] for name in EXPORT_COLUMNS]
+    if user_id is None:
+        order = (table.c.id,)
+        base = select(*columns)
+    else:
+        order = (table.c.date, table.c.created_at, table.c.id)
+        base = select(*columns).where(table.c.user_id == user_id)
+    positions = [EXPORT_COLUMNS.index(column.name) for column in order]
+
+    after: Optional[Tuple] = None
+    while True:
+        query = base
+        if after is not None:
+            query = query.where(tuple_(*order) > after)
+        rows = connection.execute(query.order_by(*order).limit(batch_size)).all()
+        # End the read transaction between batches
+        connection.rollback()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        after = tuple(rows[-1][i] for i in positions)
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def csv_chunks(batches) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(batches) -> Iterator[str]:
+    for rows in batches:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, map(_json_value, row))), ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+
+def export_chunks(fmt: str, user_id: Optional[str] = None, batch_size: int = MOOD_EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """Text chunks of the export, one per batch. Needs an app context while iterated."""
+    from app import db
+
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    with db.engine.connect() as connection:
+        batches = iter_entry_batches(connection, user_id, batch_size)
+        yield from (csv_chunks if fmt == "csv" else ndjson_chunks)(batches)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Export mood history as CSV or NDJSON")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--user", help="only this user id (default: every entry)")
+    parser.add_argument("--output", default="-", help="file path, optionally .gz (default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=MOOD_EXPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    from app import app
+
+    if args.output == "-":
+        out = sys.stdout
+    elif args.output.endswith(".gz"):
+        out = gzip.open(args.output, "wt", encoding="utf-8", newline="")
+    else:
+        out = open(args.output, "w", encoding="utf-8", newline="")
+    try:
+        with app.app_context():
+            for chunk in export_chunks(args.format, args.user, args.batch_size):
+                out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,344 @@
+"""
+Write path for mood entries.
+
+All writes go through `insert_entries`, which inserts entries with one
+executemany, queues weather tasks for those just logged with coordinates
+and no readings of their own (backdated entries keep what the client
+sent, or nothing), updates the rollups and drops the users' cached
+analytics, all in the caller's transaction. Two ways in:
+
+- bulk: `ingest_entries` validates a list (e.g. a mobile client syncing
+  offline entries) and writes it in executemany batches, one commit;
+- single: `write_entry` commits one entry on its own or, with
+  MOOD_GROUP_COMMIT_ENABLED, hands it to a writer thread that coalesces
+  concurrent entries arriving within MOOD_GROUP_COMMIT_WINDOW_MS into one
+  transaction, so a burst of logs costs one commit (one fsync on SQLite).
+
+    python mood_ingest.py    # entries/sec for each path on a temporary SQLite file
+"""
+
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MOOD_INGEST_MAX_ENTRIES = int(os.environ.get("MOOD_INGEST_MAX_ENTRIES", "1000"))
+MOOD_INGEST_BATCH_SIZE = 500
+MOOD_GROUP_COMMIT_ENABLED = os.environ.get("MOOD_GROUP_COMMIT_ENABLED", "0") == "1"
+MOOD_GROUP_COMMIT_WINDOW_MS = float(os.environ.get("MOOD_GROUP_COMMIT_WINDOW_MS", "5"))
+MOOD_GROUP_COMMIT_MAX_BATCH = 256
+# Longest a request waits for its group commit
+MOOD_WRITE_TIMEOUT = 10.0
+
+MOOD_MAX_LENGTH = 20  # SkinMoodEntry.mood
+
+
+class IngestResult(NamedTuple):
+    ids: List[int]
+    errors: List[Dict]  # [{"index": i, "error": message}]; nothing is written if any
+
+
+def entry_values(user_id: Optional[str], mood: str, notes: Optional[str] = None, day: Optional[date] = None,
+                 created_at: Optional[datetime] = None, latitude=None, longitude=None,
+                 weather_temp: Optional[float] = None, weather_humidity: Optional[int] = None) -> Dict:
+    """A row for `insert_entries`; weather not given is left to the enricher for entries logged now"""
+    created_at = created_at or datetime.utcnow()
+    return {
+        "user_id": user_id,
+        "date": day or created_at.date(),
+        "mood": mood,
+        "notes": notes,
+        "weather_temp": weather_temp,
+        "weather_humidity": weather_humidity,
+        "created_at": created_at,
+        "latitude": latitude,
+        "longitude": longitude,
+    }
+
+
+def insert_entries(connection, rows: List[Dict]) -> List[int]:
+    """
+    Insert entry rows (see `entry_values`) with their weather tasks and
+    rollup counts on `connection`, without committing. Returns the new ids
+    in row order.
+    """
+    from models import MoodWeatherTask, SkinMoodEntry
+    from mood_analytics import invalidate_analytics
+    from mood_enrichment import is_recent, weather_task_row
+    from mood_rollups import record_entries
+
+    entries = SkinMoodEntry.__table__
+    columns = [column.name for column in entries.columns if column.name != "id"]
+    ids = connection.execute(
+        entries.insert().returning(entries.c.id, sort_by_parameter_order=True),
+        [{column: row[column] for column in columns} for row in rows],
+    ).scalars().all()
+
+    # Today's weather would be wrong for backdated entries and redundant for ones with readings
+    now = datetime.utcnow()
+    tasks = [
+        weather_task_row(entry_id, row["latitude"], row["longitude"])
+        for entry_id, row in zip(ids, rows)
+        if row["weather_temp"] is None and row["weather_humidity"] is None
+        and is_recent(row["created_at"], row["date"], now)
+    ]
+    tasks = [task for task in tasks if task is not None]
+    if tasks:
+        connection.execute(MoodWeatherTask.__table__.insert(), tasks)
+    record_entries(connection, rows)
+    invalidate_analytics(connection, {row["user_id"] for row in rows})
+    return ids
+
+
+def _is_number(value, low: float, high: float) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and low <= value <= high
+
+
+def parse_entry(raw, user_id: Optional[str]) -> Tuple[Optional[Dict], Optional[str]]:
+    """(row, None) for a valid JSON entry, else (None, error)"""
+    from mood_enrichment import parse_coordinates
+
+    if not isinstance(raw, dict):
+        return None, "entry must be an object"
+    mood = raw.get("mood")
+    if not isinstance(mood, str) or not mood.strip() or len(mood.strip()) > MOOD_MAX_LENGTH:
+        return None, f"mood must be a non-empty string of at most {MOOD_MAX_LENGTH} characters"
+    notes = raw.get("notes")
+    if notes is not None and not isinstance(notes, str):
+        return None, "notes must be a string"
+    try:
+        created_at = datetime.fromisoformat(raw["created_at"]) if raw.get("created_at") else None
+        day = date.fromisoformat(raw["date"]) if raw.get("date") else None
+    except (TypeError, ValueError):
+        return None, "date and created_at must be ISO 8601 strings"
+    if created_at is not None and created_at.tzinfo is not None:
+        return None, "created_at must be a naive UTC timestamp"
+    weather_temp, weather_humidity = raw.get("weather_temp"), raw.get("weather_humidity")
+    if weather_temp is not None and not _is_number(weather_temp, -90, 60):
+        return None, "weather_temp must be a number of °C"
+    if weather_humidity is not None and not _is_number(weather_humidity, 0, 100):
+        return None, "weather_humidity must be a percentage"
+    latitude, longitude = raw.get("latitude"), raw.get("longitude")
+    if latitude is not None or longitude is not None:
+        coordinates = parse_coordinates(latitude, longitude)
+        if coordinates is None:
+            return None, "latitude and longitude must be valid coordinates"
+        latitude, longitude = coordinates
+    return entry_values(
+        user_id, mood.strip(), notes or None, day=day, created_at=created_at,
+        latitude=latitude, longitude=longitude,
+        weather_temp=None if weather_temp is None else float(weather_temp),
+        weather_humidity=None if weather_humidity is None else round(weather_humidity)
+    ), None
+
+
+def ingest_entries(user_id: Optional[str], raw_entries: List) -> IngestResult:
+    """Validate and insert a list of JSON entries in one transaction. Needs an app context."""
+    from app import db
+
+    rows = []
+    errors = []
+    for index, raw in enumerate(raw_entries):
+        row, error = parse_entry(raw, user_id)
+        if error:
+            errors.append({"index": index, "error": error})
+        else:
+            rows.append(row)
+    if errors or not rows:
+        return IngestResult([], errors)
+
+    connection = db.session.connection()
+    ids = []
+    for start in range(0, len(rows), MOOD_INGEST_BATCH_SIZE):
+        ids.extend(insert_entries(connection, rows[start:start + MOOD_INGEST_BATCH_SIZE]))
+    db.session.commit()
+    return IngestResult(ids, [])
+
+
+@contextmanager
+def _app_transaction():
+    from app import app, db
+
+    with app.app_context():
+        with db.engine.begin() as connection:
+            yield connection
+
+
+class GroupCommitWriter:
+    """
+    Writes entries submitted from many threads in shared transactions.
+    The first entry of a group waits at most `window` seconds for others.
+    """
+
+    def __init__(self, window: float, max_batch: int, transaction: Callable = _app_transaction):
+        self.window = window
+        self.max_batch = max_batch
+        self.transaction = transaction
+        self.commits = 0
+        self.entries = 0
+        self.largest_batch = 0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="mood-group-commit", daemon=True)
+                self._thread.start()
+
+    def submit(self, row: Dict) -> Future:
+        """Future resolving to the new entry id once its group is committed"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((row, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch: List[Tuple[Dict, Future]]):
+        # Entries whose caller gave up while queued are dropped, not written
+        batch = [(row, future) for row, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            with self.transaction() as connection:
+                ids = insert_entries(connection, [row for row, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                logger.error(f"Writing a mood entry failed: {str(e)}")
+                batch[0][1].set_exception(e)
+                return
+            # One bad entry must not fail everyone else's, so retry each on its own
+            logger.warning(f"Group commit of {len(batch)} mood entries failed ({e}); writing them one by one")
+            for row, future in batch:
+                self._write_one(row, future)
+            return
+        self.commits += 1
+        self.entries += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for (_, future), entry_id in zip(batch, ids):
+            future.set_result(entry_id)
+
+    def _write_one(self, row: Dict, future: Future):
+        try:
+            with self.transaction() as connection:
+                entry_id = insert_entries(connection, [row])[0]
+        except Exception as e:
+            logger.error(f"Writing a mood entry failed: {str(e)}")
+            future.set_exception(e)
+            return
+        self.commits += 1
+        self.entries += 1
+        future.set_result(entry_id)
+
+    def stats(self) -> Dict:
+        return {
+            "commits": self.commits,
+            "entries": self.entries,
+            "largest_batch": self.largest_batch,
+            "queued": self._queue.qsize(),
+        }
+
+
+group_writer = GroupCommitWriter(
+    window=MOOD_GROUP_COMMIT_WINDOW_MS / 1000,
+    max_batch=MOOD_GROUP_COMMIT_MAX_BATCH,
+)
+
+
+def write_entry(row: Dict) -> int:
+    """
+    Insert one entry and commit it (grouped with concurrent ones if enabled);
+    returns its id. With group commit, a TimeoutError after
+    MOOD_WRITE_TIMEOUT means the entry was not written if it was still
+    queued, but it may still be committed if its group was already writing.
+    """
+    if MOOD_GROUP_COMMIT_ENABLED:
+        future = group_writer.submit(row)
+        try:
+            return future.result(timeout=MOOD_WRITE_TIMEOUT)
+        except TimeoutError:
+            if not future.cancel():
+                logger.warning("Timed out waiting for a mood entry already being written; it may still be committed")
+            raise
+
+    from app import db
+
+    entry_id = insert_entries(db.session.connection(), [row])[0]
+    db.session.commit()
+    return entry_id
+
+
+def benchmark(entries: int = 4000, threads: int = 16) -> Dict:
+    """Entries/sec for commit-per-entry, group commit and bulk ingestion on a temporary SQLite file"""
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from sqlalchemy import create_engine
+    from app import db  # noqa: F401 - loads models through the app
+    from models import MoodAnalytics, MoodRollup, MoodWeatherTask, SkinMoodEntry, UserMoodRollup
+
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ingest.db')}", pool_size=threads + 1,
+                           connect_args={"timeout": 60})
+    for model in (SkinMoodEntry, MoodWeatherTask, MoodRollup, UserMoodRollup, MoodAnalytics):
+        model.__table__.create(engine)
+    rows = [entry_values(f"user-{i % 50}", ["happy", "dry", "oily", "irritated"][i % 4], "note") for i in range(entries)]
+
+    def rate(seconds):
+        return int(entries / seconds)
+
+    def single(row):
+        with engine.begin() as connection:
+            insert_entries(connection, [row])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(single, rows))
+    per_entry = rate(time.perf_counter() - start)
+
+    writer = GroupCommitWriter(MOOD_GROUP_COMMIT_WINDOW_MS / 1000, MOOD_GROUP_COMMIT_MAX_BATCH, engine.begin)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(lambda row: writer.submit(row).result(), rows))
+    grouped = rate(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with engine.begin() as connection:
+        for offset in range(0, entries, MOOD_INGEST_BATCH_SIZE):
+            insert_entries(connection, rows[offset:offset + MOOD_INGEST_BATCH_SIZE])
+    bulk = rate(time.perf_counter() - start)
+
+    engine.dispose()
+    return {
+        "entries": entries,
+        "threads": threads,
+        "commit_per_entry_per_sec": per_entry,
+        "group_commit_per_sec": grouped,
+        "group_commits": writer.commits,
+        "bulk_per_sec": bulk,
+    }
+
+
+if __name__ == "__main__":
+    print(benchmark())
@@ -0,0 +1,267 @@
+"""
+Pre-aggregated mood vs weather counts.
+
+Every logged mood entry adds one to its (day, mood, temperature band,
+humidity band) row in `mood_rollup` and to the same row under its user
+in `user_mood_rollup`, in the transaction that inserts the entry. Trend
+views read a few hundred of these rows instead of scanning entries.
+
+    python mood_rollups.py rebuild    # recompute both tables from skin_mood_entry
+    python mood_rollups.py            # benchmark rollup reads against scanning entries
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_REBUILD_BATCH_SIZE = 10000
+MOOD_TRENDS_MAX_DAYS = 366
+
+UNKNOWN_BAND = "unknown"
+
+
+# Same thresholds as the product weather conditions (recommendations.get_weather_condition)
+def temperature_band(temperature: Optional[float]) -> str:
+    if temperature is None:
+        return UNKNOWN_BAND
+    if temperature > 25:
+        return "hot"
+    if temperature < 15:
+        return "cold"
+    return "mild"
+
+
+def humidity_band(humidity: Optional[float]) -> str:
+    if humidity is None:
+        return UNKNOWN_BAND
+    if humidity > 70:
+        return "humid"
+    if humidity < 40:
+        return "dry"
+    return "normal"
+
+
+def _upsert_counts(connection, table, key_columns: Tuple[str, ...], counts: Counter):
+    """Add counts to existing rows, inserting the missing ones"""
+    rows = [dict(zip(key_columns, key), count=count) for key, count in counts.items()]
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        statement = insert(table)
+        connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=list(key_columns),
+                set_={"count": table.c.count + statement.excluded.count}
+            ),
+            rows,
+        )
+        return
+
+    from sqlalchemy import and_
+    for row in rows:
+        match = and_(*(table.c[column] == row[column] for column in key_columns))
+        updated = connection.execute(table.update().where(match).values(count=table.c.count + row["count"]))
+        if updated.rowcount == 0:
+            connection.execute(table.insert(), row)
+
+
+def record_entries(connection, rows: Iterable[Dict], delta: int = 1) -> int:
+    """
+    Count entries (dicts with user_id, date, mood, weather_temp and
+    weather_humidity) into both rollup tables; delta=-1 takes them back out.
+    Run it on the connection of the transaction that writes the entries.
+    Returns the number of entries.
+    """
+    from models import MoodRollup, UserMoodRollup
+
+    totals = Counter()
+    per_user = Counter()
+    entries = 0
+    for row in rows:
+        entries += 1
+        key = (row["date"], row["mood"], temperature_band(row["weather_temp"]), humidity_band(row["weather_humidity"]))
+        totals[key] += delta
+        if row["user_id"] is not None:
+            per_user[(row["user_id"],) + key] += delta
+
+    key_columns = ("day", "mood", "temperature_band", "humidity_band")
+    if totals:
+        _upsert_counts(connection, MoodRollup.__table__, key_columns, totals)
+    if per_user:
+        _upsert_counts(connection, UserMoodRollup.__table__, ("user_id",) + key_columns, per_user)
+    return entries
+
+
+def rebuild_rollups(batch_size: int = ROLLUP_REBUILD_BATCH_SIZE) -> int:
+    """
+    Recompute both rollup tables from all mood entries in one transaction,
+    reading entries in batches. Writers to skin_mood_entry (logging, the
+    weather enricher) wait until it commits, so none is counted twice or
+    lost, and concurrent rebuilds run one after the other. Returns the
+    number of entries counted. Needs an app context.
+    """
+    from app import db
+    from models import MoodRollup, SkinMoodEntry, UserMoodRollup
+
+    entries = SkinMoodEntry.__table__
+    counted = 0
+    last_id = 0
+    try:
+        connection = db.session.connection()
+        if connection.dialect.name == "postgresql":
+            # Conflicts with inserts, updates and itself, but not with reads
+            connection.exec_driver_sql("LOCK TABLE skin_mood_entry IN SHARE ROW EXCLUSIVE MODE")
+        # On SQLite the delete takes the database write lock for the rest of the transaction
+        connection.execute(MoodRollup.__table__.delete())
+        connection.execute(UserMoodRollup.__table__.delete())
+        while True:
+            rows = connection.execute(
+                db.select(entries.c.id, entries.c.user_id, entries.c.date, entries.c.mood,
+                          entries.c.weather_temp, entries.c.weather_humidity)
+                .where(entries.c.id > last_id)
+                .order_by(entries.c.id)
+                .limit(batch_size)
+            ).mappings().all()
+            if not rows:
+                break
+            counted += record_entries(connection, rows)
+            last_id = rows[-1]["id"]
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    logger.info(f"Rebuilt mood rollups from {counted} entries")
+    return counted
+
+
+def get_mood_trends(user_id: Optional[str] = None, days: int = 90, today: Optional[date] = None) -> Dict:
+    """
+    Mood counts per day and per weather band over the last `days` days,
+    for one user or (user_id None) everyone. Needs an app context.
+    """
+    from app import db
+    from models import MoodRollup, UserMoodRollup
+
+    days = max(1, min(days, MOOD_TRENDS_MAX_DAYS))
+    since = (today or datetime.utcnow().date()) - timedelta(days=days - 1)
+    table = MoodRollup if user_id is None else UserMoodRollup
+    query = (
+        db.select(table.day, table.mood, table.temperature_band, table.humidity_band, table.count)
+        .where(table.day >= since, table.count > 0)
+    )
+    if user_id is not None:
+        query = query.where(UserMoodRollup.user_id == user_id)
+
+    daily = Counter()
+    by_weather = Counter()
+    for day, mood, temp_band, humid_band, count in db.session.execute(query):
+        daily[(day, mood)] += count
+        by_weather[(mood, temp_band, humid_band)] += count
+
+    return {
+        "since": since.isoformat(),
+        "daily": [
+            {"day": day.isoformat(), "mood": mood, "count": count}
+            for (day, mood), count in sorted(daily.items())
+        ],
+        "by_weather": [
+            {"mood": mood, "temperature_band": temp_band, "humidity_band": humid_band, "count": count}
+            for (mood, temp_band, humid_band), count in sorted(by_weather.items())
+        ],
+    }
+
+
+def benchmark(entries: int = 500000, users: int = 5000, days: int = 90, runs: int = 20, seed: int = 9) -> Dict:
+    """
+    Mood-by-weather counts over the last `days` days from the rollups
+    versus aggregating the raw entries, on a temporary SQLite database
+    """
+    import tempfile
+    from sqlalchemy import case, create_engine, func, select
+    from app import db  # noqa: F401 - loads models through the app
+    from models import MoodRollup, SkinMoodEntry, UserMoodRollup
+
+    rng = random.Random(seed)
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'rollups.db')}")
+    for model in (SkinMoodEntry, MoodRollup, UserMoodRollup):
+        model.__table__.create(engine)
+    table = SkinMoodEntry.__table__
+    user_ids = [f"user-{i}" for i in range(users)]
+    first_day = date(2024, 1, 1)
+
+    with engine.begin() as conn:
+        batch = []
+        for i in range(1, entries + 1):
+            day = first_day + timedelta(days=rng.randrange(730))
+            batch.append({
+                "id": i, "user_id": rng.choice(user_ids), "date": day,
+                "mood": rng.choice(["happy", "dry", "oily", "irritated"]),
+                "weather_temp": rng.uniform(-5, 38), "weather_humidity": rng.randint(15, 95),
+                "created_at": datetime.combine(day, datetime.min.time()),
+            })
+            if len(batch) == 20000 or i == entries:
+                conn.execute(table.insert(), batch)
+                record_entries(conn, batch)
+                batch = []
+
+    since = first_day + timedelta(days=730 - days)
+    temp = table.c.weather_temp
+    humid = table.c.weather_humidity
+    temp_band = case((temp.is_(None), UNKNOWN_BAND), (temp > 25, "hot"), (temp < 15, "cold"), else_="mild")
+    humid_band = case((humid.is_(None), UNKNOWN_BAND), (humid > 70, "humid"), (humid < 40, "dry"), else_="normal")
+    scan = (
+        select(table.c.mood, temp_band, humid_band, func.count())
+        .where(table.c.date >= since)
+        .group_by(table.c.mood, temp_band, humid_band)
+    )
+    rollup = MoodRollup.__table__
+    rollup_query = select(rollup).where(rollup.c.day >= since)
+
+    def timed(statement):
+        timings = []
+        with engine.connect() as conn:
+            for _ in range(runs):
+                start = time.perf_counter()
+                rows = conn.execute(statement).all()
+                timings.append(time.perf_counter() - start)
+        timings.sort()
+        return round(timings[len(timings) // 2] * 1e3, 2), len(rows)
+
+    with engine.begin() as conn:
+        start = time.perf_counter()
+        for _ in range(1000):
+            record_entries(conn, [{"user_id": rng.choice(user_ids), "date": since, "mood": "dry",
+                                   "weather_temp": 20.0, "weather_humidity": 50}])
+        update_ms = (time.perf_counter() - start) / 1000 * 1e3
+
+    scan_ms, _ = timed(scan)
+    rollup_ms, rollup_rows = timed(rollup_query)
+    engine.dispose()
+    return {
+        "entries": entries,
+        "days": days,
+        "entry_scan_ms": scan_ms,
+        "rollup_read_ms": rollup_ms,
+        "rollup_rows_read": rollup_rows,
+        "rollup_update_ms_per_entry": round(update_ms, 3),
+    }
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["rebuild"]:
+        from app import app
+
+        with app.app_context():
+            print(f"Rebuilt rollups from {rebuild_rollups()} entries")
+    else:
+        print(benchmark())
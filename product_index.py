@@ -0,0 +1,422 @@
+"""
+In-memory inverted index over the product catalog.
+
+Every product gets a bit position; each indexed token (category, skin
+type, concern, weather condition) maps to an int bitset of the products
+carrying it. A recommendation lookup is then a handful of bitwise
+AND/ORs instead of `LIKE '%x%'` scans, and comma-separated values are
+matched as whole tokens ("sensitive" no longer matches inside longer
+words). The catalog value "all" matches every skin type, concern or
+weather condition.
+
+Recommendations run as indexed joins over `product_attribute` by
+default; set PRODUCT_INDEX_ENABLED to serve them from this index, which
+avoids the database round trip per lookup on large catalogs.
+
+The index is built on first use (app.py warms it at startup) and
+updated incrementally from committed ORM writes to `Product`. Writes made
+by other processes or through bulk `UPDATE`s are not seen by the event
+hooks; the index is rebuilt every PRODUCT_INDEX_REFRESH_INTERVAL
+seconds to pick those up, or call `product_index.invalidate()`.
+"""
+
+import os
+import re
+import time
+import heapq
+import random
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Serve recommendations from this index instead of indexed SQL joins
+PRODUCT_INDEX_ENABLED = os.environ.get("PRODUCT_INDEX_ENABLED", "0").lower() in ("1", "true", "yes")
+PRODUCT_INDEX_REFRESH_INTERVAL = float(os.environ.get("PRODUCT_INDEX_REFRESH_INTERVAL", "300"))  # 0 = never
+
+# Comma-separated Product columns indexed as token sets
+TOKEN_FIELDS = ("skin_types", "concerns", "weather_conditions")
+# Indexed field -> ProductAttribute.kind, for attribute-keyed ranking weights
+FIELD_KINDS = {"skin_types": "skin_type", "concerns": "concern", "weather_conditions": "weather_condition"}
+WILDCARD = "all"
+
+_ONE = re.compile("1")
+
+
+def tokenize(value: Optional[str]) -> frozenset:
+    """Whole, lower-cased tokens of a comma-separated catalog value"""
+    if not value:
+        return frozenset()
+    return frozenset(token for token in (part.strip().lower() for part in value.split(",")) if token)
+
+
+def bit_positions(bits: int) -> List[int]:
+    """Positions of the set bits, lowest first"""
+    if bits.bit_count() < 32:
+        positions = []
+        while bits:
+            low = bits & -bits
+            positions.append(low.bit_length() - 1)
+            bits ^= low
+        return positions
+    return [m.start() for m in _ONE.finditer(format(bits, "b")[::-1])]
+
+
+def _bitset(positions: Iterable[int], size: int) -> int:
+    buffer = bytearray((size + 7) // 8)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, "little")
+
+
+class ProductIndex:
+    """Token -> product bitset postings for category and the comma-separated Product fields"""
+
+    def __init__(self, refresh_interval: float = PRODUCT_INDEX_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._reset()
+        self._built_at = None
+        self._changed = set()  # product ids committed since the last sync
+        self.builds = 0
+        self.updates = 0
+        self.lookups = 0
+
+    def _reset(self):
+        self._slots = {}  # product id -> bit position
+        self._ids = []  # bit position -> product id, None when free
+        self._entries = []  # bit position -> ((field, token), ...) for removal
+        self._free = []
+        self._postings = {field: {} for field in ("category",) + TOKEN_FIELDS}
+
+    # Maintenance
+
+    def _add(self, product_id, category, skin_types, concerns, weather_conditions):
+        if self._free:
+            position = self._free.pop()
+            self._ids[position] = product_id
+        else:
+            position = len(self._ids)
+            self._ids.append(product_id)
+            self._entries.append(())
+        self._slots[product_id] = position
+
+        bit = 1 << position
+        entries = [("category", category)]
+        for field, value in zip(TOKEN_FIELDS, (skin_types, concerns, weather_conditions)):
+            entries.extend((field, token) for token in tokenize(value))
+        for field, token in entries:
+            postings = self._postings[field]
+            postings[token] = postings.get(token, 0) | bit
+        self._entries[position] = tuple(entries)
+
+    def _remove(self, product_id):
+        position = self._slots.pop(product_id, None)
+        if position is None:
+            return
+        mask = ~(1 << position)
+        for field, token in self._entries[position]:
+            postings = self._postings[field]
+            remaining = postings[token] & mask
+            if remaining:
+                postings[token] = remaining
+            else:
+                del postings[token]
+        self._ids[position] = None
+        self._entries[position] = ()
+        self._free.append(position)
+
+    def load(self, rows: Iterable[Sequence]):
+        """Replace the index with (id, category, skin_types, concerns, weather_conditions) rows"""
+        # Collect positions per token first; OR-ing bits into growing ints one product at a time is quadratic
+        positions = {field: {} for field in ("category",) + TOKEN_FIELDS}
+        ids, entries = [], []
+        for product_id, category, *values in rows:
+            position = len(ids)
+            ids.append(product_id)
+            product_entries = [("category", category)]
+            for field, value in zip(TOKEN_FIELDS, values):
+                product_entries.extend((field, token) for token in tokenize(value))
+            for field, token in product_entries:
+                positions[field].setdefault(token, []).append(position)
+            entries.append(tuple(product_entries))
+
+        with self._lock:
+            self._reset()
+            self._ids = ids
+            self._entries = entries
+            self._slots = {product_id: position for position, product_id in enumerate(ids)}
+            for field, tokens in positions.items():
+                self._postings[field] = {token: _bitset(members, len(ids)) for token, members in tokens.items()}
+            self._built_at = time.monotonic()
+            self.builds += 1
+
+    def rebuild(self):
+        """Rebuild from the Product table (needs an app context)"""
+        from app import db
+        from models import Product
+
+        start = time.perf_counter()
+        rows = db.session.execute(
+            db.select(Product.id, Product.category, Product.skin_types, Product.concerns, Product.weather_conditions)
+            .execution_options(yield_per=5000)
+        )
+        self.load(rows)
+        logger.info(f"Built product index over {len(self._slots)} products in {time.perf_counter() - start:.3f}s")
+
+    def mark_changed(self, product_ids: Iterable[int]):
+        """Record committed inserts, updates or deletes; applied on the next lookup"""
+        with self._lock:
+            # Nothing to patch until the index is built; the build reads the current rows
+            if self._built_at is not None:
+                self._changed.update(product_ids)
+
+    def invalidate(self):
+        """Force a full rebuild on the next lookup"""
+        with self._lock:
+            self._built_at = None
+
+    def _sync(self):
+        """Bring the index up to date before a lookup (needs an app context)"""
+        with self._lock:
+            stale = self._built_at is None or (
+                self.refresh_interval > 0 and time.monotonic() - self._built_at > self.refresh_interval
+            )
+            changed = set() if stale else self._changed
+            self._changed = set()
+        if stale:
+            self.rebuild()
+            return
+        if not changed:
+            return
+
+        from app import db
+        from models import Product
+
+        rows = db.session.execute(
+            db.select(Product.id, Product.category, Product.skin_types, Product.concerns, Product.weather_conditions)
+            .where(Product.id.in_(changed))
+        ).all()
+        with self._lock:
+            for product_id in changed:
+                self._remove(product_id)
+            for row in rows:
+                self._add(*row)
+            self.updates += len(changed)
+
+    # Lookups
+
+    def _any(self, field: str, tokens: Iterable[str]) -> int:
+        postings = self._postings[field]
+        bits = postings.get(WILDCARD, 0)
+        for token in tokens:
+            bits |= postings.get(token.strip().lower(), 0)
+        return bits
+
+    def match_ids(
+        self,
+        skin_type: Optional[str] = None,
+        category: Optional[str] = None,
+        weather_conditions: Optional[List[str]] = None,
+        concerns: Optional[List[str]] = None,
+        categories: Optional[List[str]] = None,
+    ) -> List[int]:
+        """
+        Ids of products for a skin type, in a category (or any of
+        `categories`, if given), suiting any of the
+        weather conditions and addressing any of the concerns. Empty or
+        None arguments don't filter. Ids are returned in ascending order.
+        """
+        with self._lock:
+            self.lookups += 1
+            bits = (1 << len(self._ids)) - 1
+            if skin_type:
+                bits &= self._any("skin_types", [skin_type])
+            if category:
+                bits &= self._postings["category"].get(category, 0)
+            if categories is not None:
+                postings = self._postings["category"]
+                any_category = 0
+                for name in categories:
+                    any_category |= postings.get(name, 0)
+                bits &= any_category
+            if weather_conditions:
+                bits &= self._any("weather_conditions", weather_conditions)
+            if concerns:
+                bits &= self._any("concerns", concerns)
+            ids = self._ids
+            return sorted(ids[position] for position in bit_positions(bits) if ids[position] is not None)
+
+    def top_ids(
+        self,
+        weights: Dict[Tuple[str, str], int],
+        limit: int,
+        skin_type: Optional[str] = None,
+        categories: Optional[List[str]] = None,
+        after: Optional[Tuple[int, int]] = None,
+    ) -> List[Tuple[int, int]]:
+        """
+        Up to `limit` (score, product id) pairs for a skin type and any of
+        `categories`, best score first (ties by id). A product scores the
+        sum of `weights[(kind, token)]` over its tokens; `after` is the last
+        (score, id) of the previous page. Only a `limit`-sized heap is kept.
+        """
+        with self._lock:
+            self.lookups += 1
+            bits = (1 << len(self._ids)) - 1
+            if skin_type:
+                bits &= self._any("skin_types", [skin_type])
+            if categories is not None:
+                postings = self._postings["category"]
+                any_category = 0
+                for name in categories:
+                    any_category |= postings.get(name, 0)
+                bits &= any_category
+            ids, entries = self._ids, self._entries
+
+            def candidates():
+                for position in bit_positions(bits):
+                    product_id = ids[position]
+                    if product_id is None:
+                        continue
+                    score = 0
+                    for field, token in entries[position]:
+                        score += weights.get((FIELD_KINDS.get(field), token), 0)
+                    if after is not None and (score > after[0] or (score == after[0] and product_id <= after[1])):
+                        continue
+                    yield -score, product_id
+
+            return [(-negative, product_id) for negative, product_id in heapq.nsmallest(limit, candidates())]
+
+    def match_top(self, **kwargs) -> List[Tuple[int, int]]:
+        """`top_ids` after syncing pending writes (needs an app context)"""
+        self._sync()
+        return self.top_ids(**kwargs)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "products": len(self._slots),
+                "tokens": {field: len(postings) for field, postings in self._postings.items()},
+                "pending_changes": len(self._changed),
+                "age": round(time.monotonic() - self._built_at, 1) if self._built_at is not None else None,
+                "builds": self.builds,
+                "incremental_updates": self.updates,
+                "lookups": self.lookups,
+            }
+
+
+product_index = ProductIndex()
+
+
+def get_product_index_stats() -> Dict:
+    return product_index.stats()
+
+
+# Keep the index in step with ORM writes. Ids are collected per session at
+# flush time (new rows have their primary key by then) and handed to the
+# index only once the transaction commits.
+
+@event.listens_for(Session, "after_flush")
+def _collect_product_changes(session, flush_context):
+    from models import Product
+
+    changed = session.info.setdefault("product_index_changes", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Product) and obj.id is not None:
+            changed.add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_product_changes(session):
+    changed = session.info.pop("product_index_changes", None)
+    if changed:
+        product_index.mark_changed(changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_product_changes(session):
+    session.info.pop("product_index_changes", None)
+
+
+def _synthetic_catalog(size: int, seed: int):
+    rng = random.Random(seed)
+    categories = ["cleanse", "tone", "treat", "moisturize", "protect"]
+    skin_types = ["oily", "dry", "combination", "normal", "sensitive"]
+    concerns = ["acne", "aging", "dryness", "sensitive", "pigmentation", "redness", "pores"]
+    conditions = ["hot", "cold", "humid", "dry"]
+
+    def pick(values):
+        if rng.random() < 0.1:
+            return WILDCARD
+        return ",".join(rng.sample(values, rng.randint(1, 3)))
+
+    return [
+        (i, rng.choice(categories), pick(skin_types), pick(concerns), pick(conditions))
+        for i in range(1, size + 1)
+    ]
+
+
+def benchmark(size: int = 100000, queries: int = 200, seed: int = 3) -> Dict:
+    """Compare index lookups with the equivalent whole-token scan in SQLite"""
+    catalog = _synthetic_catalog(size, seed)
+    index = ProductIndex(refresh_interval=0)
+    start = time.perf_counter()
+    index.load(catalog)
+    build_seconds = time.perf_counter() - start
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE product (id INTEGER PRIMARY KEY, category TEXT, skin_types TEXT, concerns TEXT, weather_conditions TEXT)")
+    conn.executemany("INSERT INTO product VALUES (?, ?, ?, ?, ?)", catalog)
+
+    def token_clause(column, tokens):
+        # ',' || column || ',' LIKE '%,token,%' is the whole-token form of the old contains() filter
+        terms = [WILDCARD] + list(tokens)
+        return "(" + " OR ".join(f"(',' || {column} || ',') LIKE ?" for _ in terms) + ")", [f"%,{t},%" for t in terms]
+
+    rng = random.Random(seed)
+    workload = [
+        {
+            "skin_type": rng.choice(["oily", "dry", "combination", "normal"]),
+            "category": rng.choice(["cleanse", "tone", "treat", "moisturize", "protect"]),
+            "weather_conditions": rng.sample(["hot", "cold", "humid", "dry"], rng.randint(0, 2)),
+            "concerns": rng.sample(["acne", "aging", "dryness", "pigmentation"], rng.randint(0, 2)),
+        }
+        for _ in range(queries)
+    ]
+
+    start = time.perf_counter()
+    index_results = [index.match_ids(**q) for q in workload]
+    index_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scan_results = []
+    for q in workload:
+        clauses, params = ["category = ?"], [q["category"]]
+        for column, tokens in (("skin_types", [q["skin_type"]]), ("weather_conditions", q["weather_conditions"]), ("concerns", q["concerns"])):
+            if tokens:
+                clause, values = token_clause(column, tokens)
+                clauses.append(clause)
+                params.extend(values)
+        sql = f"SELECT id FROM product WHERE {' AND '.join(clauses)} ORDER BY id"
+        scan_results.append([row[0] for row in conn.execute(sql, params)])
+    scan_seconds = time.perf_counter() - start
+
+    return {
+        "products": size,
+        "build_seconds": round(build_seconds, 3),
+        "index_ms_per_query": round(index_seconds / queries * 1e3, 3),
+        "sqlite_scan_ms_per_query": round(scan_seconds / queries * 1e3, 3),
+        "mean_matches": round(sum(len(r) for r in index_results) / queries, 1),
+        "mismatches": sum(1 for a, b in zip(index_results, scan_results) if a != b),
+    }
+
+
+if __name__ == "__main__":
+    for size in (1000, 10000, 100000):
+        print(benchmark(size))
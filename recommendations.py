@@ -1,10 +1,37 @@
-from models import Product
+from models import Product, ProductAttribute
+from product_index import PRODUCT_INDEX_ENABLED, WILDCARD, product_index
 from app import db
-from typing import List, Dict
+from typing import List, Dict, NamedTuple, Optional, Tuple
+from sqlalchemy.orm import lazyload, selectinload
+import os
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Product ids loaded per IN (...) query
+LOAD_BATCH_SIZE = 500
+
+# Ranked mode: points per matching attribute. Integer points keep scores
+# exact, so (score, id) works as a pagination cursor.
+RANK_WEIGHTS = {
+    'skin_type': 40,        # exact skin type
+    'skin_type_all': 20,    # product made for all skin types
+    'concern': 25,          # per matching concern
+    'weather': 15,          # per matching weather condition
+    'weather_all': 5,       # product suits any weather
+}
+# Up to this many points per Baumann axis, scaled by how far the score is from 50
+BAUMANN_AXIS_WEIGHT = 20
+# Attribute a product needs to suit the high (and low) end of each Baumann axis
+BAUMANN_AXIS_ATTRIBUTES = {
+    'oily': (('skin_type', 'oily'), ('skin_type', 'dry')),
+    'sensitive': (('concern', 'sensitive'), None),
+    'pigmented': (('concern', 'pigmentation'), None),
+    'wrinkle': (('concern', 'aging'), None),
+}
+RECOMMENDATIONS_PER_STEP = int(os.environ.get("RECOMMENDATIONS_PER_STEP", "3"))
+RECOMMENDATIONS_MAX_PAGE_SIZE = 50
+
 def get_weather_condition(weather_data: Dict) -> List[str]:
     """Determine weather conditions based on temperature and humidity"""
     conditions = []
@@ -24,61 +51,220 @@ def get_weather_condition(weather_data: Dict) -> List[str]:
 
     return conditions
 
-def get_product_recommendations(
+def _has_attribute(kind: str, values: List[str]):
+    """Product has any of `values` (or 'all') for an attribute kind; a semi-join on the attribute index"""
+    tokens = sorted({value.strip().lower() for value in values} | {WILDCARD})
+    return Product.id.in_(
+        db.select(ProductAttribute.product_id)
+        .where(ProductAttribute.kind == kind, ProductAttribute.value.in_(tokens))
+    )
+
+def build_recommendation_query(
+    skin_type: Optional[str],
+    concerns: Optional[List[str]],
+    weather_conditions: Optional[List[str]],
+    category: Optional[str] = None,
+    categories: Optional[List[str]] = None
+):
+    """Product query for a skin type, category (or any of `categories`), any weather condition and any concern"""
+    # Attribute rows are loaded only if a caller touches them (to_dict), keeping this one round trip
+    query = Product.query.options(lazyload(Product.attributes))
+    if skin_type:
+        query = query.filter(_has_attribute('skin_type', [skin_type]))
+    if category:
+        query = query.filter(Product.category == category)
+    if categories is not None:
+        query = query.filter(Product.category.in_(categories))
+    if weather_conditions:
+        query = query.filter(_has_attribute('weather_condition', weather_conditions))
+    if concerns:
+        query = query.filter(_has_attribute('concern', concerns))
+    return query.order_by(Product.id)
+
+
+class RankedPage(NamedTuple):
+    items: List[Tuple[Product, int]]  # (product, score), best first
+    next_cursor: Optional[str]  # None on the last page
+
+
+def encode_cursor(score: int, product_id: int) -> str:
+    return f"{score}:{product_id}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[int, int]]:
+    """(score, id) from a cursor string; raises ValueError if malformed"""
+    if not cursor:
+        return None
+    score, product_id = cursor.split(":")
+    return int(score), int(product_id)
+
+
+def rank_weights(
+    skin_type: Optional[str],
+    concerns: Optional[List[str]],
+    weather_conditions: Optional[List[str]],
+    baumann_score=None
+) -> Dict[Tuple[str, str], int]:
+    """Points per (attribute kind, value) for the ranked mode"""
+    weights = {}
+
+    def add(key, points):
+        if points:
+            weights[key] = weights.get(key, 0) + points
+
+    if skin_type:
+        add(('skin_type', skin_type.strip().lower()), RANK_WEIGHTS['skin_type'])
+        add(('skin_type', WILDCARD), RANK_WEIGHTS['skin_type_all'])
+    for concern in set(c.strip().lower() for c in concerns or []):
+        add(('concern', concern), RANK_WEIGHTS['concern'])
+    for condition in set(weather_conditions or []):
+        add(('weather_condition', condition), RANK_WEIGHTS['weather'])
+    if weather_conditions:
+        add(('weather_condition', WILDCARD), RANK_WEIGHTS['weather_all'])
+    if baumann_score is not None:
+        for axis, (high, low) in BAUMANN_AXIS_ATTRIBUTES.items():
+            value = getattr(baumann_score, axis)
+            key = high if value >= 50 else low
+            if key is not None:
+                add(key, round(BAUMANN_AXIS_WEIGHT * abs(value - 50) / 50))
+    return weights
+
+
+def _score_column(weights: Dict[Tuple[str, str], int]):
+    """Per-product score subquery summing the weights of matching attribute rows"""
+    if not weights:
+        return None
+    matches = [
+        (db.and_(ProductAttribute.kind == kind, ProductAttribute.value == value), points)
+        for (kind, value), points in weights.items()
+    ]
+    return (
+        db.select(
+            ProductAttribute.product_id.label('product_id'),
+            db.func.sum(db.case(*matches, else_=0)).label('score')
+        )
+        .where(db.or_(*(condition for condition, _ in matches)))
+        .group_by(ProductAttribute.product_id)
+        .subquery()
+    )
+
+
+def _ranked_query(skin_type, weights, categories=None, with_attributes=False):
+    """(Product, score) query for a skin type, scored by `weights`, unordered"""
+    scores = _score_column(weights)
+    score = db.func.coalesce(scores.c.score, 0) if scores is not None else db.literal(0)
+    query = db.session.query(Product, score.label('score')).options(
+        selectinload(Product.attributes) if with_attributes else lazyload(Product.attributes)
+    )
+    if scores is not None:
+        query = query.outerjoin(scores, scores.c.product_id == Product.id)
+    if skin_type:
+        query = query.filter(_has_attribute('skin_type', [skin_type]))
+    if categories is not None:
+        query = query.filter(Product.category.in_(categories))
+    return query, score
+
+
+def _load_ranked(ranked: List[Tuple[int, int]], with_attributes=False) -> List[Tuple[Product, int]]:
+    """Products for (score, id) pairs from the in-memory index, in the same order"""
+    ids = [product_id for _, product_id in ranked]
+    loaded = {}
+    for start in range(0, len(ids), LOAD_BATCH_SIZE):
+        query = Product.query.options(
+            selectinload(Product.attributes) if with_attributes else lazyload(Product.attributes)
+        )
+        for product in query.filter(Product.id.in_(ids[start:start + LOAD_BATCH_SIZE])):
+            loaded[product.id] = product
+    return [(loaded[product_id], score) for score, product_id in ranked if product_id in loaded]
+
+
+def get_ranked_recommendations(
     skin_type: str,
     concerns: List[str],
-    weather_data: Dict,
-    category: str = None
-) -> List[Product]:
+    weather_data: Optional[Dict],
+    category: Optional[str] = None,
+    baumann_score=None,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    with_attributes: bool = False
+) -> RankedPage:
     """
-    Get personalized product recommendations based on user's skin profile and weather
+    One page of products for a skin type (and category), ranked by weighted
+    matches: skin type, concern overlap, weather fit and Baumann axis fit.
 
-    Args:
-        skin_type: User's skin type (e.g., 'oily', 'dry')
-        concerns: List of skin concerns (e.g., ['acne', 'aging'])
-        weather_data: Current weather conditions
-        category: Optional product category filter
-
-    Returns:
-        List of recommended products
+    Concerns and weather only affect the ranking, they don't exclude
+    products. The top `limit` are selected with ORDER BY/LIMIT (or a heap
+    over the in-memory index); pass the returned `next_cursor` to get the
+    next page. Raises ValueError for a malformed cursor.
     """
-    try:
-        logger.debug(f"Getting recommendations for skin_type={skin_type}, concerns={concerns}")
+    after = decode_cursor(cursor)
+    limit = max(1, min(limit, RECOMMENDATIONS_MAX_PAGE_SIZE))
+    weather_conditions = get_weather_condition(weather_data) if weather_data else []
+    weights = rank_weights(skin_type, concerns, weather_conditions, baumann_score)
+    categories = [category] if category else None
 
-        # Base query
-        query = Product.query
+    if PRODUCT_INDEX_ENABLED:
+        ranked = product_index.match_top(
+            weights=weights, limit=limit + 1, skin_type=skin_type, categories=categories, after=after
+        )
+        items = _load_ranked(ranked[:limit], with_attributes)
+        has_more = len(ranked) > limit
+    else:
+        query, score = _ranked_query(skin_type, weights, categories, with_attributes)
+        if after is not None:
+            query = query.filter(db.or_(score < after[0], db.and_(score == after[0], Product.id > after[1])))
+        rows = query.order_by(score.desc(), Product.id).limit(limit + 1).all()
+        items = [(product, int(points)) for product, points in rows[:limit]]
+        has_more = len(rows) > limit
 
-        # Filter by skin type
-        query = query.filter(Product.skin_types.contains(skin_type))
+    next_cursor = encode_cursor(items[-1][1], items[-1][0].id) if has_more and items else None
+    return RankedPage(items, next_cursor)
 
-        # Filter by category if specified
-        if category:
-            query = query.filter_by(category=category)
 
-        # Get current weather conditions
+def get_ranked_recommendations_by_category(
+    skin_type: str,
+    concerns: List[str],
+    weather_data: Dict,
+    categories: List[str],
+    baumann_score=None,
+    per_category: int = RECOMMENDATIONS_PER_STEP
+) -> Dict[str, List[Product]]:
+    """
+    The top `per_category` ranked products for each category, in one query
+    (ROW_NUMBER() per category) or one index pass per category.
+    """
+    grouped = {category: [] for category in categories}
+    if not grouped:
+        return grouped
+    try:
         weather_conditions = get_weather_condition(weather_data)
-        if weather_conditions:
-            # Find products suitable for current weather
-            conditions_filter = [
-                Product.weather_conditions.contains(condition)
-                for condition in weather_conditions
-            ]
-            query = query.filter(db.or_(*conditions_filter))
-
-        # Consider skin concerns if any
-        if concerns:
-            concerns_filter = [
-                Product.concerns.contains(concern)
-                for concern in concerns
-            ]
-            query = query.filter(db.or_(*concerns_filter))
-
-        # Get results
-        products = query.all()
-        logger.debug(f"Found {len(products)} matching products")
-
-        return products
+        weights = rank_weights(skin_type, concerns, weather_conditions, baumann_score)
+
+        if PRODUCT_INDEX_ENABLED:
+            ranked = []
+            for category in grouped:
+                ranked.extend(product_index.match_top(
+                    weights=weights, limit=per_category, skin_type=skin_type, categories=[category]
+                ))
+            for product, _ in _load_ranked(ranked):
+                grouped[product.category].append(product)
+            return grouped
+
+        query, score = _ranked_query(skin_type, weights, list(grouped))
+        rank = db.func.row_number().over(
+            partition_by=Product.category, order_by=(score.desc(), Product.id)
+        ).label('rank')
+        ranked = query.with_entities(Product.id.label('id'), rank).subquery()
+        products = (
+            Product.query.options(lazyload(Product.attributes))
+            .join(ranked, ranked.c.id == Product.id)
+            .filter(ranked.c.rank <= per_category)
+            .order_by(Product.category, ranked.c.rank)
+        )
+        for product in products:
+            grouped[product.category].append(product)
+        return grouped
 
     except Exception as e:
-        logger.error(f"Error getting product recommendations: {str(e)}")
-        return []
\ No newline at end of file
+        logger.error(f"Error getting ranked recommendations: {str(e)}")
+        return {category: [] for category in categories}
@@ -0,0 +1,117 @@
+"""
+Rendered-page cache for /quiz/result.
+
+A result page depends only on the quiz answers, the city, whether the
+weather is live and which rule band the weather falls into, so repeat
+combinations are served as pre-rendered HTML. The exact readings are
+the one part that varies inside a band; pages are cached with a slot
+where `templates/_weather_readings.html` is rendered per request.
+
+Entries are tagged with the active rules fingerprint and the template
+modification times, and the cache is dropped when either changes.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from rules import get_rules
+
+QUIZ_RESULT_CACHE_MAX_ENTRIES = int(os.environ.get("QUIZ_RESULT_CACHE_MAX_ENTRIES", "2048"))  # 0 disables it
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+CACHED_TEMPLATES = ("base.html", "quiz_result.html")
+
+# Placeholder left in cached pages where the current readings go
+READINGS_SLOT = "<!--weather-readings-->"
+
+
+def template_version() -> Tuple:
+    """Modification times of the templates baked into cached pages"""
+    version = []
+    for name in CACHED_TEMPLATES:
+        try:
+            version.append(os.stat(os.path.join(TEMPLATES_DIR, name)).st_mtime_ns)
+        except OSError:
+            version.append(None)
+    return tuple(version)
+
+
+def cache_version() -> Tuple:
+    return (get_rules().fingerprint,) + template_version()
+
+
+def quiz_result_key(answers: Dict[int, int], city: str, weather, is_live: bool) -> Tuple:
+    """(answers, city, weather band, is_live) for a WeatherData reading"""
+    band = get_rules().weather_band(weather.humidity, weather.temperature, weather.uv_index)
+    return (tuple(sorted(answers.items())), city, band, is_live)
+
+
+class RenderedResultCache:
+    """In-process LRU of rendered pages, cleared when the cache version changes"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> html
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key, version) -> Optional[str]:
+        with self._lock:
+            self._check_version(version)
+            html = self._entries.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def put(self, key, version, html: str):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "rules": self._version[0] if self._version else None,
+            }
+
+
+quiz_result_cache = RenderedResultCache(QUIZ_RESULT_CACHE_MAX_ENTRIES)
+
+
+def get_quiz_cache_stats() -> Dict:
+    """Hit/miss/eviction counters for the quiz result page cache"""
+    return quiz_result_cache.stats()
@@ -0,0 +1,463 @@
+"""
+Declarative skincare rules compiled into banded lookup tables.
+
+The weather modifiers, skincare priorities and routine steps live in
+data/rules.json as lists of conditions `[field, op, value]`. Loading the
+file generates one Python function per section: the conditions become
+plain comparisons in an if/elif chain, like hand-written rules, and
+every output is built once up front and shared as a read-only mapping,
+so a call only compares and appends. Modifier sums are precomputed for
+each combination of matching cases.
+
+Numeric fields are also compiled into sorted threshold arrays (bands)
+for cache keys and the NumPy batch engine, which reads the modifier
+table per band triple.
+
+The active rule set is swapped atomically by a watcher thread when the
+file changes (checked every RULES_RELOAD_INTERVAL seconds), so reading
+it costs nothing per call. A file that fails to load or compile is
+logged and the previous rules stay active.
+"""
+
+import os
+import json
+import time
+import math
+import hashlib
+import logging
+import operator
+import itertools
+import threading
+from string import Formatter
+from bisect import bisect_left, bisect_right
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RULES_PATH = os.environ.get(
+    "RULES_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "rules.json"),
+)
+RULES_RELOAD_INTERVAL = float(os.environ.get("RULES_RELOAD_INTERVAL", "5"))  # 0 disables hot reload
+# Upper bound on precomputed modifier sums (product of case counts + 1 per factor)
+MODIFIER_COMBINATIONS_MAX = 100000
+
+AXES = ("oily", "sensitive", "pigmented", "wrinkle")
+WEATHER_FIELDS = ("humidity", "temperature", "uv_index")
+
+_NUMERIC_OPS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+_TEXT_OPS = {"==": operator.eq, "has": lambda field, value: value in field}
+_NUMERIC_FIELDS = {f"score.{axis}" for axis in AXES} | {f"weather.{field}" for field in WEATHER_FIELDS}
+_TEXT_FIELDS = {"skin_type", "sensitivity", "concerns"}
+_WEATHER_NUMERIC = {f"weather.{field}" for field in WEATHER_FIELDS}
+
+
+class RuleError(ValueError):
+    """Raised when a rules file cannot be compiled"""
+
+
+class FieldBands:
+    """
+    Sorted thresholds for one numeric field.
+
+    A value's band is the number of "<"/">=" thresholds it has reached plus
+    the number of "<="/">" thresholds it has passed, so every condition on
+    the field is constant within a band.
+    """
+
+    def __init__(self, thresholds: Iterable[Tuple[str, float]]):
+        thresholds = list(thresholds)
+        self.lower = tuple(sorted({value for op, value in thresholds if op in ("<", ">=")}))
+        self.upper = tuple(sorted({value for op, value in thresholds if op in ("<=", ">")}))
+        self.representatives, self.labels = self._describe()
+
+    def __len__(self):
+        return len(self.lower) + len(self.upper) + 1
+
+    def band(self, value) -> int:
+        return bisect_right(self.lower, value) + bisect_left(self.upper, value)
+
+    def _describe(self) -> Tuple[Tuple[float, ...], Tuple[str, ...]]:
+        """One value inside each band, plus a readable interval label per band"""
+        edges = sorted(set(self.lower + self.upper))
+        if not edges:
+            return (0,), ("(-inf, inf)",)
+
+        # Pieces are the open gaps between edges and the edges themselves
+        pieces = [(edges[0] - 1, "(-inf", f"{edges[0]})")]
+        for i, edge in enumerate(edges):
+            pieces.append((edge, f"[{edge}", f"{edge}]"))
+            if i + 1 < len(edges):
+                pieces.append(((edge + edges[i + 1]) / 2, f"({edge}", f"{edges[i + 1]})"))
+        pieces.append((edges[-1] + 1, f"({edges[-1]}", "inf)"))
+
+        representatives = [None] * len(self)
+        lows = [None] * len(self)
+        highs = [None] * len(self)
+        for value, low, high in pieces:
+            band = self.band(value)
+            if representatives[band] is None:
+                representatives[band] = value
+                lows[band] = low
+            highs[band] = high
+        return tuple(representatives), tuple(f"{low}, {high}" for low, high in zip(lows, highs))
+
+
+def _parse_condition(raw) -> Tuple[str, str, object]:
+    try:
+        field, op, value = raw
+    except (TypeError, ValueError):
+        raise RuleError(f"Condition must be [field, op, value]: {raw!r}")
+    if field in _NUMERIC_FIELDS:
+        if op not in _NUMERIC_OPS or not isinstance(value, (int, float)):
+            raise RuleError(f"Invalid numeric condition: {raw!r}")
+    elif field in _TEXT_FIELDS:
+        if op not in _TEXT_OPS:
+            raise RuleError(f"Invalid text condition: {raw!r}")
+    else:
+        raise RuleError(f"Unknown field in condition: {raw!r}")
+    return (field, op, value)
+
+
+def _conditions(rule: Dict, key: str = "when") -> Tuple:
+    return tuple(_parse_condition(raw) for raw in rule.get(key, ()))
+
+
+def _check_fields(conditions, allowed, section: str):
+    for condition in conditions:
+        if condition[0] not in allowed:
+            raise RuleError(f"Field not available in {section} rules: {condition!r}")
+
+
+class _Source:
+    """
+    Python source for one generated rule function. Values from the rules
+    file are bound as named constants, never pasted into the code, except
+    finite numbers, which are inlined as literals.
+    """
+
+    def __init__(self):
+        self.constants = {}
+
+    def constant(self, value) -> str:
+        name = f"_k{len(self.constants)}"
+        self.constants[name] = value
+        return name
+
+    def condition(self, conditions) -> str:
+        """Expression for all conditions holding; fields are the function's arguments"""
+        parts = []
+        for field, op, value in conditions:
+            name = field.split(".", 1)[-1]
+            if op == "has":
+                parts.append(f"{self.constant(value)} in {name}")
+            elif op == "==":
+                parts.append(f"{name} == {self.constant(value)}")
+            else:
+                literal = repr(value) if isinstance(value, (int, float)) and not isinstance(value, bool) \
+                    and math.isfinite(value) else self.constant(value)
+                parts.append(f"{name} {op} {literal}")
+        return " and ".join(parts) or "True"
+
+    def function(self, name: str, arguments: str, body: List[str]):
+        code = "\n".join([f"def {name}({arguments}):"] + body)
+        namespace = dict(self.constants)
+        exec(compile(code, f"<rules:{name}>", "exec"), namespace)
+        function = namespace[name]
+        function.source = code
+        return function
+
+
+class RuleSet:
+    """A compiled rules file"""
+
+    def __init__(self, spec: Dict, fingerprint: str = ""):
+        self.fingerprint = fingerprint
+        try:
+            self._compile(spec)
+        except RuleError:
+            raise
+        except (KeyError, TypeError, ValueError) as e:
+            raise RuleError(f"Malformed rules: {str(e)}")
+
+    def _compile(self, spec: Dict):
+        self._modifier_factors = []
+        for factor in spec["weather_modifiers"]:
+            cases = []
+            for case in factor["cases"]:
+                add = tuple(int(case.get("add", {}).get(axis, 0)) for axis in AXES)
+                unknown = set(case.get("add", {})) - set(AXES)
+                if unknown:
+                    raise RuleError(f"Unknown modifier axes: {sorted(unknown)}")
+                cases.append((_conditions(case), add))
+            self._modifier_factors.append(tuple(cases))
+
+        self._priority_rules = []
+        for rule in spec["priorities"]:
+            output = dict(rule["output"])
+            priority = output.get("priority")
+            if isinstance(priority, list):
+                output["priority"] = tuple((_conditions(case), case["value"]) for case in priority)
+            self._priority_rules.append((_conditions(rule), _conditions(rule, "when_any"), output))
+
+        self._routine_steps = []
+        for step in spec["routine"]:
+            cases = tuple(
+                (_conditions(case), case["product"], case["reason"])
+                for case in step["cases"]
+            )
+            self._routine_steps.append((step["step"], cases))
+
+        for cases in self._modifier_factors:
+            for conditions, _ in cases:
+                _check_fields(conditions, _WEATHER_NUMERIC, "weather modifier")
+        for when, when_any, output in self._priority_rules:
+            _check_fields(when + when_any, _NUMERIC_FIELDS, "priority")
+            for conditions, _ in output["priority"] if isinstance(output.get("priority"), tuple) else ():
+                _check_fields(conditions, _NUMERIC_FIELDS, "priority")
+        _check_fields(self._all_routine_conditions(), _WEATHER_NUMERIC | _TEXT_FIELDS, "routine")
+
+        thresholds = {field: [] for field in _WEATHER_NUMERIC}
+        for field, op, value in self._all_conditions():
+            if field in thresholds:
+                thresholds[field].append((op, value))
+        self.weather_bands = tuple(FieldBands(thresholds[f"weather.{field}"]) for field in WEATHER_FIELDS)
+        self._weather_edges = tuple((bands.lower, bands.upper) for bands in self.weather_bands)
+        self.modifier_table = self._build_modifier_table()
+
+        self.weather_modifier, self.weather_modifier_map = self._compile_modifiers()
+        self.priorities = self._compile_priorities()
+        self.routine = self._compile_routine()
+
+    def _all_conditions(self):
+        for cases in self._modifier_factors:
+            for conditions, _ in cases:
+                yield from conditions
+        for when, when_any, output in self._priority_rules:
+            yield from when
+            yield from when_any
+            if isinstance(output.get("priority"), tuple):
+                for conditions, _ in output["priority"]:
+                    yield from conditions
+        for _, cases in self._routine_steps:
+            for conditions, _, _ in cases:
+                yield from conditions
+
+    # Band table for the batch engine (conditions evaluated on one value per band)
+
+    def _weather_values(self, weather_band: Tuple[int, int, int]) -> Dict:
+        return {
+            f"weather.{field}": bands.representatives[band]
+            for field, bands, band in zip(WEATHER_FIELDS, self.weather_bands, weather_band)
+        }
+
+    def _build_modifier_table(self) -> Tuple:
+        table = []
+        for h in range(len(self.weather_bands[0])):
+            by_temperature = []
+            for t in range(len(self.weather_bands[1])):
+                by_uv = []
+                for u in range(len(self.weather_bands[2])):
+                    values = self._weather_values((h, t, u))
+                    total = [0, 0, 0, 0]
+                    for cases in self._modifier_factors:
+                        for conditions, add in cases:
+                            if all(_NUMERIC_OPS[op](values[field], value) for field, op, value in conditions):
+                                total = [a + b for a, b in zip(total, add)]
+                                break
+                    by_uv.append(tuple(total))
+                by_temperature.append(tuple(by_uv))
+            table.append(tuple(by_temperature))
+        return tuple(table)
+
+    # Generated request-time functions
+
+    def _compile_modifiers(self):
+        """(humidity, temperature, uv_index) -> modifier tuple in AXES order, and the same as a mapping"""
+        sizes = [len(cases) + 1 for cases in self._modifier_factors]  # + 1: no case matched
+        if math.prod(sizes) > MODIFIER_COMBINATIONS_MAX:
+            raise RuleError(f"Too many weather modifier combinations: {math.prod(sizes)}")
+
+        sums = []
+        for choice in itertools.product(*(range(size) for size in sizes)):
+            total = [0, 0, 0, 0]
+            for cases, i in zip(self._modifier_factors, choice):
+                if i < len(cases):
+                    total = [a + b for a, b in zip(total, cases[i][1])]
+            sums.append(tuple(total))
+
+        source = _Source()
+        body = []
+        for f, cases in enumerate(self._modifier_factors):
+            keyword = "if"
+            for i, (conditions, _) in enumerate(cases):
+                body.append(f"    {keyword} {source.condition(conditions)}:")
+                body.append(f"        i{f} = {i}")
+                keyword = "elif"
+            body.append(f"    {'else' if cases else 'if True'}:")
+            body.append(f"        i{f} = {len(cases)}")
+        stride = 1
+        terms = []
+        for f in reversed(range(len(sizes))):
+            terms.append(f"i{f} * {stride}" if stride > 1 else f"i{f}")
+            stride *= sizes[f]
+        index = " + ".join(reversed(terms)) or "0"
+        arguments = "humidity, temperature, uv_index"
+        tuples = source.constant(tuple(sums))
+        maps = source.constant(tuple(MappingProxyType(dict(zip(AXES, total))) for total in sums))
+        return (
+            source.function("weather_modifier", arguments, body + [f"    return {tuples}[{index}]"]),
+            source.function("weather_modifier_map", arguments, body + [f"    return {maps}[{index}]"]),
+        )
+
+    def _compile_priorities(self):
+        """(oily, sensitive, pigmented, wrinkle, humidity, temperature, uv_index) -> new list of priorities"""
+        source = _Source()
+        body = ["    out = []"]
+        for when, when_any, output in self._priority_rules:
+            parts = [source.condition(when)] if when else []
+            if when_any:
+                parts.append("(" + " or ".join(source.condition((c,)) for c in when_any) + ")")
+            body.append(f"    if {' and '.join(parts) or 'True'}:")
+            cases = output.get("priority")
+            if not isinstance(cases, tuple):
+                body.append(f"        out.append({source.constant(MappingProxyType(dict(output)))})")
+                continue
+            keyword = "if"
+            for conditions, value in cases:
+                item = source.constant(MappingProxyType(dict(output, priority=value)))
+                if not conditions:
+                    body.append(f"        {'else' if keyword == 'elif' else 'if True'}:")
+                    body.append(f"            out.append({item})")
+                    break
+                body.append(f"        {keyword} {source.condition(conditions)}:")
+                body.append(f"            out.append({item})")
+                keyword = "elif"
+            else:
+                # No case matched: the priority is left empty
+                body.append(f"        {'else' if keyword == 'elif' else 'if True'}:")
+                body.append(f"            out.append({source.constant(MappingProxyType(dict(output, priority=None)))})")
+        body.append("    return out")
+        return source.function("priorities", "oily, sensitive, pigmented, wrinkle, humidity, temperature, uv_index", body)
+
+    def _compile_routine(self):
+        """(skin_type, sensitivity, concerns, weather mapping) -> new list of routine steps"""
+        source = _Source()
+        used = {field for field, _, _ in self._all_routine_conditions() if field in _WEATHER_NUMERIC}
+        body = [
+            f"    {field.split('.', 1)[1]} = weather.get({field.split('.', 1)[1]!r}, 0)"
+            for field in sorted(used)
+        ]
+        body.append("    out = []")
+        for name, cases in self._routine_steps:
+            keyword = "if"
+            for conditions, product, reason in cases:
+                if conditions:
+                    body.append(f"    {keyword} {source.condition(conditions)}:")
+                else:
+                    body.append(f"    {'else' if keyword == 'elif' else 'if True'}:")
+                # Step texts may quote readings, e.g. "UV index is {uv_index}"; those are built per call
+                if any(field for _, field, _, _ in Formatter().parse(reason)):
+                    body.append(
+                        f"        out.append({{'step': {source.constant(name)}, 'product': {source.constant(product)}, "
+                        f"'reason': {source.constant(reason)}.format_map(weather)}})"
+                    )
+                else:
+                    step = MappingProxyType({"step": name, "product": product, "reason": reason})
+                    body.append(f"        out.append({source.constant(step)})")
+                if not conditions:
+                    break
+                keyword = "elif"
+        body.append("    return out")
+        return source.function("routine", "skin_type, sensitivity, concerns, weather", body)
+
+    def _all_routine_conditions(self):
+        for _, cases in self._routine_steps:
+            for conditions, _, _ in cases:
+                yield from conditions
+
+    def weather_band(self, humidity, temperature, uv_index) -> Tuple[int, int, int]:
+        """Band triple identifying every weather-dependent rule outcome"""
+        (hl, hu), (tl, tu), (ul, uu) = self._weather_edges
+        return (
+            bisect_right(hl, humidity) + bisect_left(hu, humidity),
+            bisect_right(tl, temperature) + bisect_left(tu, temperature),
+            bisect_right(ul, uv_index) + bisect_left(uu, uv_index),
+        )
+
+    def dump_modifier_table(self) -> List[Dict]:
+        """Every weather band triple with its modifiers, for auditing"""
+        rows = []
+        for h, humidity in enumerate(self.weather_bands[0].labels):
+            for t, temperature in enumerate(self.weather_bands[1].labels):
+                for u, uv_index in enumerate(self.weather_bands[2].labels):
+                    row = {"humidity": humidity, "temperature": temperature, "uv_index": uv_index}
+                    row.update(zip(AXES, self.modifier_table[h][t][u]))
+                    rows.append(row)
+        return rows
+
+
+def load_rules(path: str = RULES_PATH) -> RuleSet:
+    """Read and compile a rules file"""
+    with open(path, "rb") as f:
+        content = f.read()
+    try:
+        spec = json.loads(content)
+    except ValueError as e:
+        raise RuleError(f"Invalid JSON in {path}: {str(e)}")
+    return RuleSet(spec, fingerprint=hashlib.sha256(content).hexdigest()[:12])
+
+
+_active = load_rules()
+_active_mtime = os.path.getmtime(RULES_PATH)
+_reload_lock = threading.Lock()
+_watcher = None
+
+
+def reload_rules(path: str = RULES_PATH) -> Optional[RuleSet]:
+    """Compile the rules file and swap it in; on failure keep the current rules and return None"""
+    global _active, _active_mtime
+    with _reload_lock:
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError as e:
+            logger.error(f"Rules reload failed, keeping {_active.fingerprint}: {str(e)}")
+            return None
+        try:
+            rules = load_rules(path)
+        except (OSError, RuleError) as e:
+            # Remember the bad version so it is not retried until the file changes again
+            _active_mtime = mtime
+            logger.error(f"Rules reload failed, keeping {_active.fingerprint}: {str(e)}")
+            return None
+        _active, _active_mtime = rules, mtime
+        logger.info(f"Loaded rules {rules.fingerprint} from {path}")
+        return rules
+
+
+def _watch():
+    while True:
+        time.sleep(RULES_RELOAD_INTERVAL)
+        try:
+            changed = os.path.getmtime(RULES_PATH) != _active_mtime
+        except OSError:
+            changed = False
+        if changed:
+            reload_rules()
+
+
+def start_rules_watcher():
+    """Reload the rules in the background whenever the file changes (checked every RULES_RELOAD_INTERVAL seconds)"""
+    global _watcher
+    if RULES_RELOAD_INTERVAL <= 0:
+        return
+    with _reload_lock:
+        if _watcher is None or not _watcher.is_alive():
+            _watcher = threading.Thread(target=_watch, name="rules-reload", daemon=True)
+            _watcher.start()
+
+
+def get_rules() -> RuleSet:
+    """The active rule set; the watcher swaps in a new one when the file changes"""
+    return _active
@@ -0,0 +1,284 @@
+"""
+Benchmark and equivalence check for the compiled rules in rules.py.
+
+The legacy_* functions are verbatim copies of the hand-written if-chains
+the rule engine replaced (calculate_weather_modifier,
+get_skincare_priorities, generate_routine). They are kept only as the
+reference for `python rules_benchmark.py`, which checks that the shipped
+data/rules.json reproduces them and times both.
+"""
+
+import time
+import random
+import itertools
+from typing import Dict
+
+from baumann import BaumannScore, WeatherData, calculate_weather_modifier, get_skincare_priorities
+from skincare import generate_routine
+
+
+def legacy_weather_modifier(weather: WeatherData) -> Dict[str, int]:
+    """
+    Calculate how weather shifts each Baumann axis.
+    Returns modifier values (-30 to +30) for each axis.
+    """
+    modifiers = {
+        "oily": 0,
+        "sensitive": 0,
+        "pigmented": 0,
+        "wrinkle": 0
+    }
+    
+    # HUMIDITY affects oiliness
+    # Low humidity (<40%) = skin acts drier (-20)
+    # High humidity (>70%) = skin acts oilier (+20)
+    if weather.humidity < 30:
+        modifiers["oily"] = -25
+    elif weather.humidity < 40:
+        modifiers["oily"] = -15
+    elif weather.humidity > 80:
+        modifiers["oily"] = +20
+    elif weather.humidity > 70:
+        modifiers["oily"] = +10
+    
+    # TEMPERATURE affects sensitivity and oiliness
+    # Cold (<10°C) = more sensitive, less oily
+    # Hot (>30°C) = more oily, more sensitive (heat rash)
+    if weather.temperature < 5:
+        modifiers["sensitive"] += 15
+        modifiers["oily"] -= 10
+    elif weather.temperature < 10:
+        modifiers["sensitive"] += 10
+        modifiers["oily"] -= 5
+    elif weather.temperature > 35:
+        modifiers["oily"] += 15
+        modifiers["sensitive"] += 10
+    elif weather.temperature > 30:
+        modifiers["oily"] += 10
+        modifiers["sensitive"] += 5
+    
+    # UV INDEX affects pigmentation risk
+    # High UV = increased pigmentation risk
+    if weather.uv_index >= 8:
+        modifiers["pigmented"] = +25
+    elif weather.uv_index >= 6:
+        modifiers["pigmented"] = +15
+    elif weather.uv_index >= 3:
+        modifiers["pigmented"] = +5
+    
+    return modifiers
+
+
+def legacy_skincare_priorities(adjusted_score: BaumannScore, weather: WeatherData) -> list:
+    """
+    Get prioritized skincare concerns based on adjusted skin type.
+    """
+    priorities = []
+    
+    # Oily/Dry axis
+    if adjusted_score.oily >= 70:
+        priorities.append({
+            "concern": "excess_oil",
+            "priority": "high",
+            "recommendation_tr": "Yağ kontrolü ve gözenek temizliği öncelikli",
+            "recommendation_en": "Focus on oil control and pore cleansing"
+        })
+    elif adjusted_score.oily <= 30:
+        priorities.append({
+            "concern": "dryness",
+            "priority": "high", 
+            "recommendation_tr": "Yoğun nemlendirme ve bariyer onarımı",
+            "recommendation_en": "Intense hydration and barrier repair"
+        })
+    
+    # Sensitivity
+    if adjusted_score.sensitive >= 70:
+        priorities.append({
+            "concern": "sensitivity",
+            "priority": "high",
+            "recommendation_tr": "Yatıştırıcı ve parfümsüz ürünler kullanın",
+            "recommendation_en": "Use soothing, fragrance-free products"
+        })
+    
+    # Pigmentation (especially if high UV)
+    if adjusted_score.pigmented >= 60 or weather.uv_index >= 5:
+        priorities.append({
+            "concern": "pigmentation",
+            "priority": "high" if weather.uv_index >= 6 else "medium",
+            "recommendation_tr": "Güneş koruması ve leke karşıtı aktifler",
+            "recommendation_en": "Sun protection and anti-spot actives"
+        })
+    
+    # Wrinkle
+    if adjusted_score.wrinkle >= 60:
+        priorities.append({
+            "concern": "aging",
+            "priority": "medium",
+            "recommendation_tr": "Anti-aging aktifler ve antioksidanlar",
+            "recommendation_en": "Anti-aging actives and antioxidants"
+        })
+    
+    # Weather-specific
+    if weather.humidity < 40:
+        priorities.append({
+            "concern": "dehydration",
+            "priority": "high",
+            "recommendation_tr": "Hava çok kuru - ekstra nemlendirme gerekli",
+            "recommendation_en": "Air is very dry - extra hydration needed"
+        })
+    
+    return priorities
+
+
+def legacy_generate_routine(skin_type, sensitivity, concerns, weather):
+    """Generate skincare routine based on skin type and weather conditions"""
+    routine = []
+    
+    # Cleansing step
+    if skin_type == "oily":
+        routine.append({
+            "step": "Cleanse",
+            "product": "Gel or foam cleanser",
+            "reason": "For oily skin, use a gel cleanser to remove excess oil"
+        })
+    else:
+        routine.append({
+            "step": "Cleanse",
+            "product": "Cream or milk cleanser",
+            "reason": "For dry/normal skin, use a gentle cream cleanser"
+        })
+
+    # Toner step
+    if "sensitive" in sensitivity:
+        routine.append({
+            "step": "Tone",
+            "product": "Alcohol-free calming toner",
+            "reason": "Sensitive skin needs gentle, soothing ingredients"
+        })
+    else:
+        routine.append({
+            "step": "Tone",
+            "product": "Hydrating toner",
+            "reason": "Balance skin pH and prepare for next steps"
+        })
+
+    # Treatment step based on concerns
+    if "acne" in concerns:
+        routine.append({
+            "step": "Treat",
+            "product": "Salicylic acid serum",
+            "reason": "Target breakouts and unclog pores"
+        })
+    elif "aging" in concerns:
+        routine.append({
+            "step": "Treat",
+            "product": "Vitamin C serum",
+            "reason": "Protect from environmental damage and boost collagen"
+        })
+
+    # Moisturizer based on weather and skin type
+    if weather["humidity"] < 40:
+        routine.append({
+            "step": "Moisturize",
+            "product": "Rich cream moisturizer",
+            "reason": "Low humidity requires extra hydration"
+        })
+    elif weather["humidity"] > 70 and skin_type == "oily":
+        routine.append({
+            "step": "Moisturize",
+            "product": "Light gel moisturizer",
+            "reason": "High humidity means lighter hydration needed"
+        })
+    else:
+        routine.append({
+            "step": "Moisturize",
+            "product": "Medium-weight moisturizer",
+            "reason": "Balanced hydration for current conditions"
+        })
+
+    # Sunscreen based on UV index
+    if weather.get("uv_index", 0) > 2:
+        spf = "50+" if weather.get("uv_index", 0) > 5 else "30"
+        routine.append({
+            "step": "Protect",
+            "product": f"Broad-spectrum SPF {spf}",
+            "reason": f"UV index is {weather.get('uv_index')} - sun protection needed"
+        })
+
+    return routine
+
+
+HUMIDITY_VALUES = [0, 29, 29.5, 30, 39, 39.9, 40, 55, 70, 70.1, 71, 80, 80.5, 81, 100]
+TEMPERATURE_VALUES = [-10, 4, 4.9, 5, 9, 9.99, 10, 20, 30, 30.5, 31, 35, 35.2, 36]
+UV_VALUES = [0, 2, 2.5, 2.99, 3, 4, 4.99, 5, 5.5, 6, 7, 7.99, 8, 11]
+SCORE_VALUES = [0, 29, 30, 31, 59, 60, 61, 69, 70, 71, 100, 110]
+
+
+def verify_equivalence(seed: int = 3) -> int:
+    """Compare the compiled rules with the legacy functions; returns the number of mismatches"""
+    rng = random.Random(seed)
+    mismatches = 0
+    for humidity, temperature, uv_index in itertools.product(HUMIDITY_VALUES, TEMPERATURE_VALUES, UV_VALUES):
+        weather = WeatherData(humidity, temperature, uv_index)
+        if calculate_weather_modifier(weather) != legacy_weather_modifier(weather):
+            mismatches += 1
+
+        score = BaumannScore(*(rng.choice(SCORE_VALUES) for _ in range(4)))
+        compiled = [dict(p) for p in get_skincare_priorities(score, weather)]
+        if compiled != legacy_skincare_priorities(score, weather):
+            mismatches += 1
+
+        weather_dict = {"humidity": humidity, "temperature": temperature, "uv_index": uv_index}
+        skin_type = rng.choice(["oily", "dry", "normal", "combination"])
+        sensitivity = rng.choice(["sensitive", "not_sensitive", "resistant"])
+        concerns = rng.sample(["acne", "aging", "dryness", "pigmentation"], rng.randint(0, 3))
+        compiled = [dict(step) for step in generate_routine(skin_type, sensitivity, concerns, weather_dict)]
+        if compiled != legacy_generate_routine(skin_type, sensitivity, concerns, weather_dict):
+            mismatches += 1
+    return mismatches
+
+
+def _time(fn, calls) -> float:
+    start = time.perf_counter()
+    for args in calls:
+        fn(*args)
+    return (time.perf_counter() - start) / len(calls) * 1e6
+
+
+def benchmark(calls: int = 200000, seed: int = 5) -> Dict:
+    """Microseconds per call for the legacy functions versus the compiled rules"""
+    rng = random.Random(seed)
+    weathers = [
+        WeatherData(rng.uniform(10, 95), rng.uniform(-5, 40), rng.uniform(0, 11))
+        for _ in range(calls)
+    ]
+    scores = [BaumannScore(*(rng.randint(0, 100) for _ in range(4))) for _ in range(calls)]
+    weather_dicts = [
+        {"humidity": w.humidity, "temperature": w.temperature, "uv_index": round(w.uv_index)}
+        for w in weathers
+    ]
+    profiles = [
+        (rng.choice(["oily", "dry"]), rng.choice(["sensitive", "resistant"]), rng.choice([[], ["acne"], ["aging"]]))
+        for _ in range(calls)
+    ]
+
+    modifier_calls = [(w,) for w in weathers]
+    priority_calls = list(zip(scores, weathers))
+    routine_calls = [profile + (w,) for profile, w in zip(profiles, weather_dicts)]
+    results = {}
+    for name, legacy, compiled, args in (
+        ("weather_modifier", legacy_weather_modifier, calculate_weather_modifier, modifier_calls),
+        ("skincare_priorities", legacy_skincare_priorities, get_skincare_priorities, priority_calls),
+        ("generate_routine", legacy_generate_routine, generate_routine, routine_calls),
+    ):
+        results[name] = {
+            "legacy_us": round(_time(legacy, args), 3),
+            "compiled_us": round(_time(compiled, args), 3),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    print(f"Equivalence mismatches: {verify_equivalence()}")
+    for name, timing in benchmark().items():
+        print(f"{name}: {timing}")
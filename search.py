@@ -0,0 +1,283 @@
+"""
+Full-text search over product names, ingredients and descriptions.
+
+On SQLite the text lives in an external-content FTS5 table
+(`product_fts`) kept in sync with `product` by triggers, so ORM writes,
+bulk statements and imports are all covered. On PostgreSQL a generated
+`search_vector` tsvector column with a GIN index plays the same role.
+
+Queries take include terms (all must match, anywhere in the name,
+ingredients or description) and exclude terms (none may appear in the
+ingredients), and return products ranked by BM25 / ts_rank_cd.
+"""
+
+import os
+import re
+import time
+import random
+import logging
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MAX_RESULTS = 100
+# BM25 weights for name, ingredients and description (SQLite)
+SEARCH_COLUMN_WEIGHTS = (2.0, 4.0, 1.0)
+# Text search configuration for the tsvector column (PostgreSQL)
+SEARCH_TS_CONFIG = "simple"
+
+_TERM = re.compile(r"[\w-]+\*?", re.UNICODE)
+
+_SQLITE_DDL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+        name, ingredients, description,
+        content='product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_insert AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts(rowid, name, ingredients, description)
+        VALUES (new.id, new.name, new.ingredients, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_delete AFTER DELETE ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, ingredients, description)
+        VALUES ('delete', old.id, old.name, old.ingredients, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_update AFTER UPDATE OF name, ingredients, description ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, name, ingredients, description)
+        VALUES ('delete', old.id, old.name, old.ingredients, old.description);
+        INSERT INTO product_fts(rowid, name, ingredients, description)
+        VALUES (new.id, new.name, new.ingredients, new.description);
+    END
+    """,
+)
+
+_POSTGRES_DDL = (
+    f"""
+    ALTER TABLE product ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(name, '')), 'B') ||
+        setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(ingredients, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_product_search_vector ON product USING gin (search_vector)",
+    f"""
+    CREATE INDEX IF NOT EXISTS ix_product_ingredients_tsv ON product
+    USING gin (to_tsvector('{SEARCH_TS_CONFIG}', coalesce(ingredients, '')))
+    """,
+)
+
+
+def ensure_search_index(connection) -> bool:
+    """
+    Create the search table/column, triggers and indexes if missing.
+    Returns True if the SQLite index had to be (re)built from `product`.
+    """
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        for statement in _POSTGRES_DDL:
+            connection.exec_driver_sql(statement)
+        return False
+    if dialect != "sqlite":
+        logger.warning(f"Full-text search is not available on {dialect}")
+        return False
+
+    existed = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_fts'"
+    ).first() is not None
+    for statement in _SQLITE_DDL:
+        connection.exec_driver_sql(statement)
+    if not existed:
+        connection.exec_driver_sql("INSERT INTO product_fts(product_fts) VALUES ('rebuild')")
+    return not existed
+
+
+def parse_terms(values) -> List[str]:
+    """
+    Search terms from request values, one per comma-separated item:
+    "salicylic acid, tea tree oil" gives ["salicylic acid", "tea tree oil"],
+    each matched as a phrase; a trailing * keeps a prefix match
+    """
+    if isinstance(values, str):
+        values = [values]
+    terms = []
+    for value in values or []:
+        for item in value.lower().split(","):
+            words = [w for w in _TERM.findall(item) if w.strip("*-")]
+            if not words:
+                continue
+            term = " ".join(w.rstrip("*") for w in words) + ("*" if words[-1].endswith("*") else "")
+            if term not in terms:
+                terms.append(term)
+    return terms
+
+
+def _fts5_term(term: str) -> str:
+    prefix = term.endswith("*")
+    phrase = '"' + term.rstrip("*").replace('"', '""') + '"'
+    return phrase + ("*" if prefix else "")
+
+
+def _tsquery_term(term: str) -> str:
+    # Quoted lexeme; multi-word and hyphenated terms become a phrase
+    words = [w for w in re.split(r"[^\w]+", term.rstrip("*")) if w]
+    prefix = ":*" if term.endswith("*") else ""
+    return " <-> ".join(f"'{w}'{prefix if i == len(words) - 1 else ''}" for i, w in enumerate(words))
+
+
+class SearchHit(NamedTuple):
+    product_id: int
+    rank: float  # higher is better
+
+
+def search_product_ids(
+    connection,
+    include: List[str],
+    exclude: Optional[List[str]] = None,
+    category: Optional[str] = None,
+    limit: int = 20
+) -> List[SearchHit]:
+    """Best-ranked product ids containing every include term and no exclude term in their ingredients"""
+    limit = max(1, min(limit, SEARCH_MAX_RESULTS))
+    exclude = exclude or []
+    if not include and not exclude:
+        return []
+
+    if connection.dialect.name == "postgresql":
+        return _search_postgres(connection, include, exclude, category, limit)
+
+    params = {"limit": limit}
+    if include:
+        # Excluded ingredients are matched in the same FTS query: A AND B NOT ingredients:("c d" OR E)
+        match = " AND ".join(_fts5_term(t) for t in include)
+        if exclude:
+            match += " NOT ingredients : (" + " OR ".join(_fts5_term(t) for t in exclude) + ")"
+        params["match"] = match
+        weights = ", ".join(str(w) for w in SEARCH_COLUMN_WEIGHTS)
+        if category:
+            params["category"] = category
+            sql = (
+                f"SELECT p.id, -bm25(product_fts, {weights}) AS rank FROM product_fts "
+                "JOIN product p ON p.id = product_fts.rowid "
+                "WHERE product_fts MATCH :match AND p.category = :category"
+            )
+        else:
+            # The FTS rowid is the product id; skipping the join saves a lookup per match
+            sql = (
+                f"SELECT product_fts.rowid AS id, -bm25(product_fts, {weights}) AS rank FROM product_fts "
+                "WHERE product_fts MATCH :match"
+            )
+    else:
+        # Only exclusions: everything except the products whose ingredients match
+        params["exclude"] = "ingredients : (" + " OR ".join(_fts5_term(t) for t in exclude) + ")"
+        sql = (
+            "SELECT p.id, 0.0 AS rank FROM product p WHERE p.id NOT IN "
+            "(SELECT rowid FROM product_fts WHERE product_fts MATCH :exclude)"
+        )
+        if category:
+            params["category"] = category
+            sql += " AND p.category = :category"
+    sql += " ORDER BY rank DESC, id LIMIT :limit"
+    return [SearchHit(row[0], row[1]) for row in connection.execute(text(sql), params)]
+
+
+def _search_postgres(connection, include, exclude, category, limit) -> List[SearchHit]:
+    params = {"limit": limit, "config": SEARCH_TS_CONFIG}
+    where = []
+    rank = "0.0"
+    if include:
+        params["include"] = " & ".join(_tsquery_term(t) for t in include)
+        where.append("search_vector @@ to_tsquery(:config, :include)")
+        rank = "ts_rank_cd(search_vector, to_tsquery(:config, :include))"
+    if exclude:
+        params["exclude"] = " | ".join(_tsquery_term(t) for t in exclude)
+        where.append(
+            f"NOT (to_tsvector('{SEARCH_TS_CONFIG}', coalesce(ingredients, '')) @@ to_tsquery(:config, :exclude))"
+        )
+    if category:
+        params["category"] = category
+        where.append("category = :category")
+    sql = f"SELECT id, {rank} AS rank FROM product WHERE {' AND '.join(where)} ORDER BY rank DESC, id LIMIT :limit"
+    return [SearchHit(row[0], float(row[1])) for row in connection.execute(text(sql), params)]
+
+
+def search_products(include, exclude=None, category: Optional[str] = None, limit: int = 20):
+    """[(Product, rank)] for the search, best first (needs an app context)"""
+    from app import db
+    from models import Product
+
+    hits = search_product_ids(db.session.connection(), parse_terms(include), parse_terms(exclude), category, limit)
+    products = {p.id: p for p in Product.query.filter(Product.id.in_([h.product_id for h in hits]))}
+    return [(products[h.product_id], h.rank) for h in hits if h.product_id in products]
+
+
+def benchmark(size: int = 100000, queries: int = 200, seed: int = 5) -> Dict:
+    """
+    Build a synthetic catalog in a temporary SQLite file and time searches
+    for common ingredients (each in ~1 of 6 products) and long-tail ones
+    """
+    import tempfile
+    from sqlalchemy import create_engine
+
+    rng = random.Random(seed)
+    common = ["niacinamide", "retinol", "salicylic acid", "hyaluronic acid", "vitamin c", "ceramides",
+              "zinc oxide", "glycolic acid", "peptides", "squalane", "azelaic acid", "panthenol"]
+    tail = [f"extract{i}" for i in range(500)]
+    extras = ["fragrance", "alcohol", "parfum", "linalool", "glycerin", "aloe vera", "shea butter", "tea tree oil"]
+    words = ["gentle", "daily", "hydrating", "brightening", "soothing", "lightweight", "rich", "clarifying"]
+
+    path = os.path.join(tempfile.mkdtemp(), "search.db")
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE product (id INTEGER PRIMARY KEY, name TEXT, category TEXT, ingredients TEXT, description TEXT)"
+        )
+        conn.exec_driver_sql("CREATE INDEX ix_product_category ON product (category)")
+        ensure_search_index(conn)
+        rows = [
+            (
+                i,
+                f"{rng.choice(words).title()} {rng.choice(common).title()} {i}",
+                rng.choice(["cleanse", "tone", "treat", "moisturize", "protect"]),
+                ", ".join(rng.sample(common, 2) + rng.sample(tail, 3) + rng.sample(extras, rng.randint(0, 3))),
+                " ".join(rng.choices(words, k=8)),
+            )
+            for i in range(1, size + 1)
+        ]
+        start = time.perf_counter()
+        conn.exec_driver_sql("INSERT INTO product VALUES (?, ?, ?, ?, ?)", rows)
+        insert_seconds = time.perf_counter() - start
+
+    def timed(pool):
+        timings = []
+        with engine.connect() as conn:
+            for _ in range(queries):
+                include = rng.sample(pool, rng.randint(1, 2))
+                exclude = rng.sample(extras, rng.randint(0, 2))
+                category = rng.choice([None, "treat"])
+                start = time.perf_counter()
+                search_product_ids(conn, parse_terms(include), parse_terms(exclude), category)
+                timings.append(time.perf_counter() - start)
+        timings.sort()
+        return {"median_ms": round(timings[len(timings) // 2] * 1e3, 2), "p95_ms": round(timings[int(len(timings) * 0.95)] * 1e3, 2)}
+
+    result = {
+        "products": size,
+        "insert_with_triggers_seconds": round(insert_seconds, 2),
+        "common_terms": timed(common),
+        "tail_terms": timed(tail),
+    }
+    engine.dispose()
+    return result
+
+
+if __name__ == "__main__":
+    print(benchmark())
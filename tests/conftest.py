@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# app.py configures the database and background workers at import time:
+# point it at a throwaway SQLite file and keep it off the network
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ["WEATHERAPI_KEY"] = ""
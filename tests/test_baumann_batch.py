@@ -0,0 +1,79 @@
+"""
+The batch engine and the scalar functions both read the compiled rules,
+so they are checked against independent references: the original
+hand-written if-chains (rules_benchmark.legacy_*) and hard-coded values.
+"""
+
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+from baumann import BAUMANN_QUIZ, BaumannScore, WeatherData, calculate_baumann_from_quiz
+from baumann_batch import answers_to_matrix, calculate_weather_modifier_batch, score_batch
+from rules import AXES
+from rules_benchmark import legacy_weather_modifier
+
+# On and around every weather threshold in the rules
+HUMIDITY = [0, 29, 29.5, 30, 39, 39.9, 40, 70, 70.1, 71, 80, 80.5, 81, 100]
+TEMPERATURE = [-15, 4.9, 5, 9.9, 10, 30, 30.1, 35, 35.1, 45]
+UV_INDEX = [0, 2.9, 3, 5.9, 6, 7.9, 8, 11]
+
+
+def legacy_adjusted(base: BaumannScore, weather: WeatherData) -> list:
+    modifiers = legacy_weather_modifier(weather)
+    return [
+        max(0, min(100, base.oily + modifiers["oily"])),
+        max(0, min(100, base.sensitive + modifiers["sensitive"])),
+        max(0, min(100, base.pigmented + modifiers["pigmented"])),
+        base.wrinkle + modifiers["wrinkle"],
+    ]
+
+
+def random_answers(rng: random.Random) -> dict:
+    return {
+        q["id"]: rng.choice([a["score"] for a in q["answers"]] + [0, 100])
+        for q in BAUMANN_QUIZ if rng.random() < 0.9
+    }
+
+
+@pytest.mark.parametrize("humidity, temperature, uv_index, expected", [
+    (29.9, 4.9, 8, {"oily": -35, "sensitive": 15, "pigmented": 25, "wrinkle": 0}),
+    (30, 5, 7.9, {"oily": -20, "sensitive": 10, "pigmented": 15, "wrinkle": 0}),
+    (40, 10, 2.9, {"oily": 0, "sensitive": 0, "pigmented": 0, "wrinkle": 0}),
+    (70, 30, 3, {"oily": 0, "sensitive": 0, "pigmented": 5, "wrinkle": 0}),
+    (70.1, 30.1, 6, {"oily": 20, "sensitive": 5, "pigmented": 15, "wrinkle": 0}),
+    (80, 35, 5.9, {"oily": 20, "sensitive": 5, "pigmented": 5, "wrinkle": 0}),
+    (80.1, 35.1, 11, {"oily": 35, "sensitive": 10, "pigmented": 25, "wrinkle": 0}),
+])
+def test_weather_modifiers_at_boundaries(humidity, temperature, uv_index, expected):
+    modifiers = calculate_weather_modifier_batch([humidity], [temperature], [uv_index])[0]
+    assert dict(zip(AXES, modifiers.tolist())) == expected
+
+
+def test_weather_modifiers_match_legacy_rules():
+    grid = list(itertools.product(HUMIDITY, TEMPERATURE, UV_INDEX))
+    humidity, temperature, uv_index = (np.array(column, dtype=np.float64) for column in zip(*grid))
+    modifiers = calculate_weather_modifier_batch(humidity, temperature, uv_index)
+    for i, (h, t, uv) in enumerate(grid):
+        expected = legacy_weather_modifier(WeatherData(h, t, uv))
+        assert modifiers[i].tolist() == [expected[axis] for axis in AXES], (h, t, uv)
+
+
+def test_scores_and_codes_match_legacy_rules():
+    rng = random.Random(7)
+    grid = list(itertools.product(HUMIDITY, TEMPERATURE, UV_INDEX))
+    answers_list = [random_answers(rng) for _ in grid]
+    # Missing answers and extreme scores put axes on and around the 50 cut-off
+    answers_list[:6] = [{}] + [{q["id"]: score for q in BAUMANN_QUIZ} for score in (0, 49, 50, 51, 100)]
+    humidity, temperature, uv_index = (np.array(column, dtype=np.float64) for column in zip(*grid))
+
+    result = score_batch(answers_to_matrix(answers_list), humidity, temperature, uv_index)
+    for i, (answers, (h, t, uv)) in enumerate(zip(answers_list, grid)):
+        base = calculate_baumann_from_quiz(answers)
+        adjusted = legacy_adjusted(base, WeatherData(h, t, uv))
+        assert result["base_scores"][i].tolist() == [getattr(base, axis) for axis in AXES]
+        assert result["adjusted_scores"][i].tolist() == adjusted, (answers, h, t, uv)
+        assert result["base_codes"][i] == base.get_code()
+        assert result["adjusted_codes"][i] == BaumannScore(*adjusted).get_code()
@@ -0,0 +1,13 @@
+import pytest
+
+from geoindex import get_local_weather, resolve_point
+
+
+@pytest.mark.parametrize("lat, lon", [("inf", "29"), ("nan", "nan"), ("-inf", "0"), ("1e400", "0"), (91, 0), (0, 181), ("x", 0), (None, 0)])
+def test_invalid_coordinates_resolve_to_nothing(lat, lon):
+    assert resolve_point(lat, lon) is None
+    assert get_local_weather(lat, lon, use_normals=True) == (None, False)
+
+
+def test_city_coordinates_snap_to_the_city():
+    assert resolve_point("41.01", "28.97").key == "istanbul"
@@ -0,0 +1,10 @@
+from ingredients import validate_ingredient_lists
+
+
+def test_conflicts_inside_one_product_are_reported():
+    conflicts = validate_ingredient_lists(["Retinol, Salicylic Acid", "Glycerin"])["conflicts"]
+    assert [(c["items"], sorted(c["ingredients"])) for c in conflicts] == [([0, 0], ["bha", "retinoid"])]
+
+
+def test_citric_acid_is_not_an_exfoliant():
+    assert validate_ingredient_lists(["Retinol", "Aqua, Citric Acid"])["conflicts"] == []
@@ -0,0 +1,12 @@
+from app import app
+from init_db import init_products
+from migrations import check_query_plans, run_migrations
+
+
+def test_recommendation_queries_use_indexes():
+    with app.app_context():
+        init_products()
+        # Migrations are safe to repeat and must leave the indexes in place
+        run_migrations()
+        plan = check_query_plans()
+    assert plan
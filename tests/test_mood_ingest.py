@@ -0,0 +1,27 @@
+import pytest
+
+from app import app
+from mood_ingest import GroupCommitWriter, entry_values, parse_entry
+
+
+def test_parse_entry_rejects_long_moods_and_bad_coordinates():
+    assert parse_entry({"mood": "x" * 21}, "u")[1]
+    assert parse_entry({"mood": "dry", "latitude": "inf", "longitude": "0"}, "u")[1]
+    assert parse_entry({"mood": "dry", "latitude": "91", "longitude": "0"}, "u")[1]
+    row, error = parse_entry({"mood": " dry ", "latitude": "41.0", "longitude": "29.0"}, "u")
+    assert error is None
+    assert (row["mood"], row["latitude"], row["longitude"]) == ("dry", 41.0, 29.0)
+
+
+def test_group_commit_isolates_a_failing_entry():
+    with app.app_context():
+        writer = GroupCommitWriter(window=0.5, max_batch=3)
+        futures = [
+            writer.submit(entry_values("u", "happy")),
+            writer.submit(entry_values("u", None)),  # violates NOT NULL
+            writer.submit(entry_values("u", "dry")),
+        ]
+        assert futures[0].result(timeout=10) != futures[2].result(timeout=10)
+        with pytest.raises(Exception):
+            futures[1].result(timeout=10)
+    assert writer.entries == 2
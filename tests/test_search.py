@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy import create_engine
+
+from search import ensure_search_index, parse_terms, search_product_ids
+
+PRODUCTS = [
+    (1, "Clarifying Gel", "treat", "Salicylic Acid, Tea Tree Oil, Aloe Vera", "For breakouts"),
+    (2, "Hydrating Serum", "treat", "Hyaluronic Acid, Panthenol, Niacinamide", "Plumps dry skin"),
+    (3, "Balancing Toner", "tone", "Salicylic Acid, Niacinamide, Green Tea", "Unclogs pores"),
+    (4, "Calming Mist", "tone", "Niacinamide, Green Tea, Glycerin", "Soothes redness"),
+    (5, "Barrier Cream", "moisturize", "Ceramides, Squalane", "Rich overnight cream"),
+]
+
+
+@pytest.fixture
+def connection(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE product (id INTEGER PRIMARY KEY, name TEXT, category TEXT, ingredients TEXT, description TEXT)"
+        )
+        ensure_search_index(conn)
+        conn.exec_driver_sql("INSERT INTO product VALUES (?, ?, ?, ?, ?)", PRODUCTS)
+    with engine.connect() as conn:
+        yield conn
+    engine.dispose()
+
+
+def ids(connection, include, exclude=None):
+    return sorted(hit.product_id for hit in search_product_ids(connection, parse_terms(include), parse_terms(exclude)))
+
+
+def test_parse_terms_keeps_comma_separated_items_whole():
+    assert parse_terms("Salicylic Acid, tea tree oil") == ["salicylic acid", "tea tree oil"]
+    assert parse_terms(["vitamin c*", "niacinamide", "Niacinamide"]) == ["vitamin c*", "niacinamide"]
+    assert parse_terms(" , -, ") == []
+
+
+def test_multi_word_exclude_matches_the_phrase_only(connection):
+    # "acid" alone must not exclude Hyaluronic Acid, nor "tea tree oil" exclude Green Tea
+    assert ids(connection, "niacinamide", "salicylic acid") == [2, 4]
+    assert ids(connection, "niacinamide", "tea tree oil") == [2, 3, 4]
+    assert ids(connection, [], "salicylic acid, tea tree oil") == [2, 4, 5]
+
+
+def test_multi_word_include_is_a_phrase(connection):
+    assert ids(connection, "green tea") == [3, 4]
+    assert ids(connection, "tea oil") == []
+    assert ids(connection, "hyaluronic*") == [2]
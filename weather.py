@@ -1,6 +1,15 @@
 import os
+import time
+import random
 import logging
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional, Tuple
+
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,30 +17,555 @@ load_dotenv()
 logger = logging.getLogger(__name__)
 
 WEATHERAPI_KEY = os.environ.get("WEATHERAPI_KEY", "")
+WEATHERAPI_BASE_URL = os.environ.get("WEATHERAPI_BASE_URL", "http://api.weatherapi.com/v1")
+
+# Upstream client tuning
+WEATHERAPI_CONNECT_TIMEOUT = float(os.environ.get("WEATHERAPI_CONNECT_TIMEOUT", "2"))
+WEATHERAPI_READ_TIMEOUT = float(os.environ.get("WEATHERAPI_READ_TIMEOUT", "5"))
+WEATHERAPI_POOL_SIZE = int(os.environ.get("WEATHERAPI_POOL_SIZE", "10"))
+WEATHERAPI_MAX_RETRIES = int(os.environ.get("WEATHERAPI_MAX_RETRIES", "2"))
+WEATHERAPI_DEADLINE = float(os.environ.get("WEATHERAPI_DEADLINE", "5"))  # seconds across all attempts
+WEATHERAPI_BACKOFF = float(os.environ.get("WEATHERAPI_BACKOFF", "0.25"))
+WEATHER_BREAKER_THRESHOLD = int(os.environ.get("WEATHER_BREAKER_THRESHOLD", "5"))
+WEATHER_BREAKER_COOLDOWN = float(os.environ.get("WEATHER_BREAKER_COOLDOWN", "30"))
+WEATHERAPI_DAILY_BUDGET = int(os.environ.get("WEATHERAPI_DAILY_BUDGET", "0"))  # per process, 0 = unlimited
+
+# Cache tuning (seconds / degrees / entries)
+WEATHER_CACHE_TTL = float(os.environ.get("WEATHER_CACHE_TTL", "600"))
+WEATHER_CACHE_STALE_TTL = float(os.environ.get("WEATHER_CACHE_STALE_TTL", "1800"))
+WEATHER_CACHE_CELL_DEG = float(os.environ.get("WEATHER_CACHE_CELL_DEG", "0.1"))
+WEATHER_CACHE_MAX_ENTRIES = int(os.environ.get("WEATHER_CACHE_MAX_ENTRIES", "1024"))
+
+# Shared observation table (models.WeatherObservation) read by every worker
+WEATHER_STORE_ENABLED = os.environ.get("WEATHER_STORE_ENABLED", "1") == "1"
+WEATHER_STORE_RETENTION_HOURS = float(os.environ.get("WEATHER_STORE_RETENTION_HOURS", "48"))
+
+# Hourly forecasts are fetched once per cell per day
+WEATHER_FORECAST_MAX_ENTRIES = int(os.environ.get("WEATHER_FORECAST_MAX_ENTRIES", "256"))
+
+
+def cell_key(lat, lon, cell_deg: float = None) -> Tuple[int, int]:
+    """Snap coordinates to a lat/lon grid cell index"""
+    cell_deg = cell_deg or WEATHER_CACHE_CELL_DEG
+    return (round(float(lat) / cell_deg), round(float(lon) / cell_deg))
+
+
+def cell_center(key: Tuple[int, int], cell_deg: float = None) -> Tuple[float, float]:
+    """Coordinates of the centre of a grid cell"""
+    cell_deg = cell_deg or WEATHER_CACHE_CELL_DEG
+    return (round(key[0] * cell_deg, 4), round(key[1] * cell_deg, 4))
+
+
+def copy_weather(data: Dict) -> Dict:
+    """Copy a weather dict so callers can annotate it without touching the cache"""
+    copied = dict(data)
+    if isinstance(copied.get("location"), dict):
+        copied["location"] = dict(copied["location"])
+    return copied
+
+
+class WeatherCache:
+    """
+    In-process LRU cache of weather observations keyed by grid cell.
+
+    Entries younger than `ttl` are fresh. Entries between `ttl` and
+    `ttl + stale_ttl` are served as stale while a single background
+    refresh runs; older entries are treated as misses.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (stored_at, data)
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key) -> Tuple[Optional[Dict], bool]:
+        """Return (data, is_stale); data is None on a miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, False
+
+            age = now - entry[0]
+            if age > self.ttl + self.stale_ttl:
+                del self._entries[key]
+                self.misses += 1
+                return None, False
+
+            self._entries.move_to_end(key)
+            if age > self.ttl:
+                self.stale_hits += 1
+                return copy_weather(entry[1]), True
+
+            self.hits += 1
+            return copy_weather(entry[1]), False
+
+    def put(self, key, data: Dict, age: float = 0.0):
+        with self._lock:
+            self._entries[key] = (time.monotonic() - age, copy_weather(data))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def start_refresh(self, key) -> bool:
+        """Claim the background refresh for a key; False if one is already running"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def finish_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "stale_ttl": self.stale_ttl,
+                "cell_deg": WEATHER_CACHE_CELL_DEG,
+            }
+
+
+weather_cache = WeatherCache(
+    ttl=WEATHER_CACHE_TTL,
+    stale_ttl=WEATHER_CACHE_STALE_TTL,
+    max_entries=WEATHER_CACHE_MAX_ENTRIES,
+)
+
+
+def get_cache_stats() -> Dict:
+    """Hit/miss/eviction counters for the weather cache"""
+    return weather_cache.stats()
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing upstream for a cooldown period.
+
+    After `threshold` consecutive failures the breaker opens and every call
+    is rejected until `cooldown` seconds pass; then a single trial call is
+    let through (half-open) and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if now - self._opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.threshold:
+                if self._opened_at is None or self._trial_running:
+                    self.trips += 1
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self._state(time.monotonic()),
+                "consecutive_failures": self._failures,
+                "trips": self.trips,
+                "rejected": self.rejected,
+                "threshold": self.threshold,
+                "cooldown": self.cooldown,
+            }
+
+
+class DailyBudget:
+    """Caps upstream HTTP calls per calendar day; a limit of 0 disables the cap"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._day = date.today()
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def _roll(self):
+        today = date.today()
+        if today != self._day:
+            self._day = today
+            self.used = 0
+
+    def allow(self) -> bool:
+        if not self.limit:
+            return True
+        with self._lock:
+            self._roll()
+            return self.used < self.limit
+
+    def record(self):
+        with self._lock:
+            self._roll()
+            self.used += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._roll()
+            return {"limit": self.limit, "used": self.used}
+
+
+upstream_budget = DailyBudget(WEATHERAPI_DAILY_BUDGET)
+
+upstream_breaker = CircuitBreaker(
+    threshold=WEATHER_BREAKER_THRESHOLD,
+    cooldown=WEATHER_BREAKER_COOLDOWN,
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Shared keep-alive session so upstream calls reuse pooled connections"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=WEATHERAPI_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def get_upstream_stats() -> Dict:
+    """Circuit breaker state and daily call budget for the WeatherAPI client"""
+    stats = upstream_breaker.stats()
+    stats["budget"] = upstream_budget.stats()
+    return stats
+
+
+def _is_retryable(error: Exception) -> bool:
+    # A read timeout already spent the whole read budget; retrying it only stalls the request
+    if isinstance(error, requests.exceptions.ReadTimeout):
+        return False
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return False
+
+
+def _request_json(path: str, params: Dict) -> Dict:
+    """
+    GET a WeatherAPI endpoint with bounded, jittered retries. Every attempt
+    and backoff fits inside WEATHERAPI_DEADLINE seconds in total.
+    """
+    url = f"{WEATHERAPI_BASE_URL}/{path}"
+    deadline = time.monotonic() + WEATHERAPI_DEADLINE
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        try:
+            upstream_budget.record()
+            response = get_session().get(
+                url,
+                params=params,
+                timeout=(min(WEATHERAPI_CONNECT_TIMEOUT, remaining), min(WEATHERAPI_READ_TIMEOUT, remaining)),
+            )
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            if attempt >= WEATHERAPI_MAX_RETRIES or not _is_retryable(e):
+                raise
+            # Full jitter: sleep a random slice of the exponential window
+            delay = random.uniform(0, WEATHERAPI_BACKOFF * (2 ** attempt))
+            # Leave at least a connect timeout's worth of time for the next attempt
+            if time.monotonic() + delay + WEATHERAPI_CONNECT_TIMEOUT > deadline:
+                raise
+            logger.warning(f"Weather API attempt {attempt + 1} failed ({e}); retrying in {delay:.2f}s")
+            time.sleep(delay)
+            attempt += 1
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key.
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for and share its result instead of issuing their own.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.issued += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "issued": self.issued,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
+
+
+upstream_flight = SingleFlight()
+
+
+def get_coalescing_stats() -> Dict:
+    """Counters for upstream lookups issued versus coalesced onto an in-flight call"""
+    return upstream_flight.stats()
+
+
+def _store_key(key) -> str:
+    return f"{WEATHER_CACHE_CELL_DEG}:{key[0]}:{key[1]}"
+
+
+def _load_observation(key) -> Tuple[Optional[Dict], Optional[float]]:
+    """Latest shared observation for a cell that is still servable, with its age in seconds"""
+    if not WEATHER_STORE_ENABLED:
+        return None, None
+
+    try:
+        from app import app
+        from models import WeatherObservation
+
+        oldest = datetime.utcnow() - timedelta(seconds=WEATHER_CACHE_TTL + WEATHER_CACHE_STALE_TTL)
+        with app.app_context():
+            observation = (
+                WeatherObservation.query
+                .filter(WeatherObservation.cell == _store_key(key))
+                .filter(WeatherObservation.observed_at >= oldest)
+                .order_by(WeatherObservation.observed_at.desc())
+                .first()
+            )
+            if observation is None:
+                return None, None
+            age = (datetime.utcnow() - observation.observed_at).total_seconds()
+            return observation.to_weather(), max(age, 0.0)
+    except Exception as e:
+        logger.error(f"Weather store read error: {str(e)}")
+        return None, None
+
+
+def _save_observation(key, data: Dict):
+    """Record an upstream observation for other workers and prune old rows for the cell"""
+    if not WEATHER_STORE_ENABLED:
+        return
+
+    try:
+        from app import app, db
+        from models import WeatherObservation
+
+        location = data.get("location") or {}
+        cutoff = datetime.utcnow() - timedelta(hours=WEATHER_STORE_RETENTION_HOURS)
+        with app.app_context():
+            db.session.add(WeatherObservation(
+                cell=_store_key(key),
+                temperature=data["temperature"],
+                humidity=data["humidity"],
+                uv_index=data.get("uv_index"),
+                description=data.get("description"),
+                city=location.get("city"),
+                region=location.get("region"),
+                country=location.get("country")
+            ))
+            WeatherObservation.query.filter(
+                WeatherObservation.cell == _store_key(key),
+                WeatherObservation.observed_at < cutoff
+            ).delete(synchronize_session=False)
+            db.session.commit()
+    except Exception as e:
+        logger.error(f"Weather store write error: {str(e)}")
+
+
+def _fetch_cell(key, max_age: float = None):
+    """
+    Fetch a grid cell once across concurrent callers and store it in the cache.
+
+    The shared observation table is consulted first so a cell fetched by any
+    worker within `max_age` seconds (default: the cache TTL) is reused; an
+    older stored observation is still served if the upstream call fails.
+    """
+    max_age = WEATHER_CACHE_TTL if max_age is None else max_age
+
+    def fetch():
+        stored, age = _load_observation(key)
+        if stored is not None and age <= max_age:
+            weather_cache.put(key, stored, age=age)
+            return stored
+
+        data = _fetch_current(*cell_center(key))
+        if data:
+            weather_cache.put(key, data)
+            _save_observation(key, data)
+            return data
+
+        if stored is not None:
+            weather_cache.put(key, stored, age=age)
+        return stored
+
+    data = upstream_flight.do(key, fetch)
+    return copy_weather(data) if data else None
+
+
+def _refresh_in_background(key):
+    def refresh():
+        try:
+            _fetch_cell(key)
+        finally:
+            weather_cache.finish_refresh(key)
+
+    if weather_cache.start_refresh(key):
+        threading.Thread(target=refresh, name=f"weather-refresh-{key}", daemon=True).start()
+
+
+def is_api_key_configured() -> bool:
+    return bool(WEATHERAPI_KEY) and WEATHERAPI_KEY != "your_api_key_here"
 
 
 def get_weather_data(lat, lon):
-    """Fetch weather data from WeatherAPI.com"""
-    
+    """Fetch weather data for a location, served from the grid-cell cache when possible"""
+
     # Skip if no API key configured
-    if not WEATHERAPI_KEY or WEATHERAPI_KEY == "your_api_key_here":
+    if not is_api_key_configured():
         logger.warning("WeatherAPI key not configured - using defaults")
         return None
-    
+
+    try:
+        key = cell_key(lat, lon)
+    except (TypeError, ValueError, OverflowError):
+        logger.error(f"Invalid coordinates for weather lookup: ({lat}, {lon})")
+        return None
+
+    data, is_stale = weather_cache.get(key)
+    if data is not None:
+        if is_stale:
+            _refresh_in_background(key)
+        return data
+
+    return _fetch_cell(key)
+
+
+def refresh_weather(lat, lon, max_age: float = 0.0):
+    """
+    Refresh a location regardless of the in-process cache and store the result.
+
+    An observation another worker stored within `max_age` seconds is reused
+    instead of calling upstream.
+    """
+    if not is_api_key_configured():
+        return None
+
+    return _fetch_cell(cell_key(lat, lon), max_age=max_age)
+
+
+def _fetch_current(lat, lon):
+    """Fetch current weather from WeatherAPI.com"""
+    if not upstream_budget.allow():
+        logger.warning("Weather API daily budget spent - skipping upstream call")
+        return None
+    if not upstream_breaker.allow():
+        logger.warning("Weather API circuit open - skipping upstream call")
+        return None
+
     try:
-        url = "http://api.weatherapi.com/v1/current.json"
         params = {
             "key": WEATHERAPI_KEY,
             "q": f"{lat},{lon}",
             "aqi": "yes"  # Include air quality data
         }
 
-        response = requests.get(url, params=params, timeout=5)
-        response.raise_for_status()
-
-        data = response.json()
+        data = _request_json("current.json", params)
 
-        return {
+        result = {
             "temperature": round(data["current"]["temp_c"]),
             "humidity": data["current"]["humidity"],
             "description": data["current"]["condition"]["text"],
@@ -44,10 +578,136 @@ def get_weather_data(lat, lon):
         }
     except requests.exceptions.Timeout:
         logger.error("Weather API timeout")
+        upstream_breaker.record_failure()
         return None
     except requests.exceptions.RequestException as e:
         logger.error(f"Weather API request error: {str(e)}")
+        upstream_breaker.record_failure()
         return None
     except Exception as e:
         logger.error(f"Weather API error: {str(e)}")
-        return None
\ No newline at end of file
+        upstream_breaker.record_failure()
+        return None
+
+    upstream_breaker.record_success()
+    return result
+
+
+class HourlyForecast:
+    """
+    One day of hourly weather for a location, held in compact arrays.
+
+    Index `h` of each series is local hour `h`; `at_hour` answers lookups
+    in the same dict shape as `get_weather_data`.
+    """
+
+    __slots__ = ("day", "location", "temperature", "humidity", "uv_index", "descriptions")
+
+    def __init__(self, day: date, location: Dict, temperature, humidity, uv_index, descriptions):
+        self.day = day
+        self.location = location
+        self.temperature = array("f", temperature)
+        self.humidity = array("B", humidity)
+        self.uv_index = array("f", uv_index)
+        self.descriptions = tuple(descriptions)
+
+    def __len__(self):
+        return len(self.temperature)
+
+    def at_hour(self, hour: int) -> Dict:
+        """Weather at local hour `hour` (0-23), clamped to the series"""
+        hour = max(0, min(len(self) - 1, int(hour)))
+        return {
+            "temperature": round(self.temperature[hour]),
+            "humidity": self.humidity[hour],
+            "description": self.descriptions[hour],
+            "uv_index": round(self.uv_index[hour], 1),
+            "location": dict(self.location),
+            "hour": hour
+        }
+
+
+_forecasts = OrderedDict()  # (cell key, date) -> HourlyForecast
+_forecasts_lock = threading.Lock()
+
+
+def get_hourly_forecast(lat, lon) -> Optional[HourlyForecast]:
+    """Today's hourly forecast for a location, fetched at most once per cell per day"""
+    if not is_api_key_configured():
+        return None
+
+    try:
+        key = (cell_key(lat, lon), date.today())
+    except (TypeError, ValueError):
+        logger.error(f"Invalid coordinates for forecast lookup: ({lat}, {lon})")
+        return None
+
+    with _forecasts_lock:
+        forecast = _forecasts.get(key)
+        if forecast is not None:
+            _forecasts.move_to_end(key)
+            return forecast
+
+    def fetch():
+        forecast = _fetch_forecast(*cell_center(key[0]))
+        if forecast is not None:
+            with _forecasts_lock:
+                _forecasts[key] = forecast
+                while len(_forecasts) > WEATHER_FORECAST_MAX_ENTRIES:
+                    _forecasts.popitem(last=False)
+        return forecast
+
+    return upstream_flight.do(("forecast",) + key, fetch)
+
+
+def get_weather_at_hour(lat, lon, hour: int) -> Optional[Dict]:
+    """Forecast weather at a local hour today, answered from the cached forecast"""
+    forecast = get_hourly_forecast(lat, lon)
+    return forecast.at_hour(hour) if forecast is not None else None
+
+
+def _fetch_forecast(lat, lon) -> Optional[HourlyForecast]:
+    """Fetch today's hourly forecast from WeatherAPI.com"""
+    if not upstream_budget.allow():
+        logger.warning("Weather API daily budget spent - skipping forecast call")
+        return None
+    if not upstream_breaker.allow():
+        logger.warning("Weather API circuit open - skipping forecast call")
+        return None
+
+    try:
+        params = {
+            "key": WEATHERAPI_KEY,
+            "q": f"{lat},{lon}",
+            "days": 1,
+            "aqi": "no",
+            "alerts": "no"
+        }
+
+        data = _request_json("forecast.json", params)
+
+        day = data["forecast"]["forecastday"][0]
+        hours = day["hour"]
+        forecast = HourlyForecast(
+            day=date.fromisoformat(day["date"]),
+            location={
+                "city": data["location"]["name"],
+                "region": data["location"]["region"],
+                "country": data["location"]["country"]
+            },
+            temperature=[h["temp_c"] for h in hours],
+            humidity=[h["humidity"] for h in hours],
+            uv_index=[h["uv"] for h in hours],
+            descriptions=[h["condition"]["text"] for h in hours]
+        )
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Weather API forecast request error: {str(e)}")
+        upstream_breaker.record_failure()
+        return None
+    except Exception as e:
+        logger.error(f"Weather API forecast error: {str(e)}")
+        upstream_breaker.record_failure()
+        return None
+
+    upstream_breaker.record_success()
+    return forecast
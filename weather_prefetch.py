@@ -0,0 +1,149 @@
+"""
+Background refresher for the quiz cities.
+
+The quiz only ever needs weather at the fixed coordinates in
+`baumann.TURKISH_CITIES`, so a daemon thread refreshes all of them on a
+schedule and publishes an immutable snapshot. Requests read the snapshot
+and never wait on the network.
+"""
+
+import os
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
+
+from baumann import TURKISH_CITIES
+from weather import copy_weather, is_api_key_configured, refresh_weather
+
+logger = logging.getLogger(__name__)
+
+WEATHER_PREFETCH_INTERVAL = float(os.environ.get("WEATHER_PREFETCH_INTERVAL", "300"))
+WEATHER_SNAPSHOT_MAX_AGE = float(os.environ.get("WEATHER_SNAPSHOT_MAX_AGE", "1800"))
+
+
+@dataclass(frozen=True)
+class CityWeather:
+    """One city's published weather observation"""
+    city: str
+    data: Mapping
+    fetched_at: float  # time.time() of the successful refresh
+
+    def age(self, now: float = None) -> float:
+        return (now or time.time()) - self.fetched_at
+
+
+class CityWeatherPrefetcher:
+    """Refreshes every city on an interval and swaps in a new snapshot"""
+
+    def __init__(self, cities: Dict[str, Dict], interval: float, max_age: float):
+        self.cities = cities
+        self.interval = interval
+        self.max_age = max_age
+        self._snapshot = MappingProxyType({})
+        self._failures = {}
+        self._last_errors = {}
+        self._last_run = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> Mapping[str, CityWeather]:
+        return self._snapshot
+
+    def start(self):
+        """Start the refresher thread once per process"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="weather-prefetch", daemon=True)
+            self._thread.start()
+            logger.info(f"Weather prefetcher started for {len(self.cities)} cities every {self.interval}s")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh_all()
+            self._stop.wait(self.interval)
+
+    def refresh_all(self):
+        """Refresh every city and publish the result as a new snapshot"""
+        updated = dict(self._snapshot)
+        for key, city in self.cities.items():
+            try:
+                # Reuse another worker's refresh from this interval
+                data = refresh_weather(city["lat"], city["lon"], max_age=self.interval)
+            except Exception as e:
+                data = None
+                self._last_errors[key] = str(e)
+                logger.error(f"Weather prefetch error for {key}: {str(e)}")
+
+            if data:
+                updated[key] = CityWeather(
+                    city=key,
+                    data=MappingProxyType(data),
+                    fetched_at=time.time(),
+                )
+                self._last_errors.pop(key, None)
+            else:
+                self._failures[key] = self._failures.get(key, 0) + 1
+                self._last_errors.setdefault(key, "no data from upstream")
+
+        self._snapshot = MappingProxyType(updated)
+        self._last_run = time.time()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """A mutable copy of a city's weather, or None if missing or too old"""
+        entry = self._snapshot.get(key)
+        if entry is None or entry.age() > self.max_age:
+            return None
+        return copy_weather(entry.data)
+
+    def stats(self) -> Dict:
+        now = time.time()
+        snapshot = self._snapshot
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "interval": self.interval,
+            "max_age": self.max_age,
+            "last_run_age": round(now - self._last_run, 1) if self._last_run else None,
+            "cities": {
+                key: {
+                    "age": round(snapshot[key].age(now), 1) if key in snapshot else None,
+                    "failures": self._failures.get(key, 0),
+                    "last_error": self._last_errors.get(key),
+                }
+                for key in self.cities
+            },
+        }
+
+
+prefetcher = CityWeatherPrefetcher(
+    cities=TURKISH_CITIES,
+    interval=WEATHER_PREFETCH_INTERVAL,
+    max_age=WEATHER_SNAPSHOT_MAX_AGE,
+)
+
+
+def start_prefetcher():
+    """Start the background refresher when live weather is configured"""
+    if not is_api_key_configured():
+        logger.warning("WeatherAPI key not configured - weather prefetcher not started")
+        return
+    prefetcher.start()
+
+
+def get_city_weather(city: str) -> Optional[Dict]:
+    """Snapshot weather for a quiz city; None means fall back to the climate normals (climate.py)"""
+    return prefetcher.get(city)
+
+
+def get_prefetch_stats() -> Dict:
+    """Snapshot age and refresh failures per city"""
+    return prefetcher.stats()